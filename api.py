@@ -0,0 +1,173 @@
+"""Read-only JSON API (version 1) for kiosk and mobile clients.
+
+    GET /api/v1/<type>              quizzes, activities, worksheets, videos, library
+    GET /api/v1/<type>/<id>
+    GET /api/v1/assignments         the student assignment feed
+
+Query parameters: fields (comma-separated, default all), grade, cursor and
+page_size; search on videos and library; due_within on assignments.
+
+Lists come back in columnar form, the rows as arrays in "fields" order:
+
+    {"type": "videos", "fields": ["id", "title", ...], "items": [[1, "Cells", ...], ...],
+     "next_cursor": "...", "next": "/api/v1/videos?cursor=...", "media": {"filename": "/media/videos/"}}
+
+so the listing rows the query layer already returns are encoded as they
+are, with no per-row dict. Dates are ISO 8601 strings. "media" gives the URL
+prefix of each file-name field. The responses go through the same page
+cache as the student pages (ETag/304 until the table changes) and the
+compression middleware (gzip/br/zstd). Encoding uses orjson when it is
+installed, which also writes the datetimes natively, and the stdlib json
+module otherwise.
+"""
+import json
+from operator import itemgetter
+
+from flask import Blueprint, Response, jsonify, request, url_for
+
+from database_functions import FEED_REFRESH_SECONDS, get_assignment_feed, get_items_page, get_listing_item
+from listing_rows import ASSIGNMENT_COLUMNS, LISTING_COLUMNS
+from page_cache import cached_page
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+api = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+SEARCHABLE_TABLES = {'videos', 'library'}
+
+# URL prefix (the /media route) of the fields holding stored file names
+MEDIA_FIELDS = {
+    'videos': {'filename': 'videos'},
+    'library': {'pdf_filename': 'pdfs', 'picture_filename': 'pictures', 'cover_thumb': 'pictures',
+                'cover_webp': 'pictures'}
+}
+
+
+# ==================== ENCODING ====================
+def _json_default(value):
+    # Listing rows are namedtuples; orjson only encodes plain tuples, the stdlib only fails on datetimes
+    if isinstance(value, tuple):
+        return tuple(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(payload):
+    """Encode a response body as UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_json_default)
+    return json.dumps(payload, default=_json_default, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+def _error(message, status):
+    return jsonify({'error': message}), status
+
+
+# ==================== FIELD SELECTION ====================
+class FieldError(ValueError):
+    """Raised for a ?fields= list naming a column the resource does not have"""
+
+
+def _select_fields(columns):
+    """(fields, row projection) for the ?fields= parameter; the projection is None for all columns"""
+    requested = request.args.get('fields')
+    if not requested:
+        return list(columns), None
+    fields = list(dict.fromkeys(f.strip() for f in requested.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in columns]
+    if unknown or not fields:
+        raise FieldError(f"Unknown fields: {', '.join(unknown)}; available: {', '.join(columns)}")
+    if len(fields) == len(columns) and fields == list(columns):
+        return fields, None
+    indexes = [columns.index(f) for f in fields]
+    if len(indexes) == 1:
+        index = indexes[0]
+        return fields, lambda row: (row[index],)
+    return fields, itemgetter(*indexes)
+
+
+def _media_prefixes(table_name, fields):
+    # The portal's /media/<kind>/<path:filename> route; url_for cannot build it with an empty file name
+    return {field: f"{request.script_root}/media/{kind}/"
+            for field, kind in MEDIA_FIELDS.get(table_name, {}).items() if field in fields}
+
+
+def _page_payload(kind, fields, project, items, next_cursor):
+    payload = {
+        'type': kind,
+        'fields': fields,
+        'items': items if project is None else list(map(project, items)),
+        'next_cursor': next_cursor,
+        'next': None
+    }
+    if next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        payload['next'] = url_for(request.endpoint, **args)
+    return payload
+
+
+# ==================== ROUTES ====================
+def _list_view(table_name):
+    @cached_page(table_name)
+    def list_items():
+        try:
+            fields, project = _select_fields(LISTING_COLUMNS[table_name])
+        except FieldError as e:
+            return _error(str(e), 400)
+        search = request.args.get('search') if table_name in SEARCHABLE_TABLES else None
+        items, next_cursor = get_items_page(table_name, grade=request.args.get('grade'), title_query=search,
+                                            cursor=request.args.get('cursor'),
+                                            page_size=request.args.get('page_size', type=int))
+        payload = _page_payload(table_name, fields, project, items, next_cursor)
+        payload['media'] = _media_prefixes(table_name, fields)
+        return json_response(payload)
+    return list_items
+
+
+def _item_view(table_name):
+    @cached_page(table_name)
+    def get_item(item_id):
+        try:
+            fields, project = _select_fields(LISTING_COLUMNS[table_name])
+        except FieldError as e:
+            return _error(str(e), 400)
+        item = get_listing_item(table_name, item_id)
+        if item is None:
+            return _error('Not found', 404)
+        return json_response({
+            'type': table_name,
+            'fields': fields,
+            'item': item if project is None else project(item),
+            'media': _media_prefixes(table_name, fields)
+        })
+    return get_item
+
+
+for _table_name in LISTING_COLUMNS:
+    api.add_url_rule(f"/{_table_name}", endpoint=_table_name, view_func=_list_view(_table_name))
+    api.add_url_rule(f"/{_table_name}/<int:item_id>", endpoint=f"{_table_name}_item",
+                     view_func=_item_view(_table_name))
+
+
+@api.route("/assignments")
+@cached_page('quizzes', 'activities', 'worksheets', refresh_seconds=FEED_REFRESH_SECONDS)
+def assignments():
+    """The student assignment feed: open assignments, nearest deadline first"""
+    try:
+        fields, project = _select_fields(ASSIGNMENT_COLUMNS)
+    except FieldError as e:
+        return _error(str(e), 400)
+    items, next_cursor = get_assignment_feed(grade=request.args.get('grade'),
+                                             due_within=request.args.get('due_within', type=int),
+                                             cursor=request.args.get('cursor'),
+                                             page_size=request.args.get('page_size', type=int))
+    return json_response(_page_payload('assignments', fields, project, items, next_cursor))
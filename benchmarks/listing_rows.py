@@ -0,0 +1,109 @@
+"""Compare SELECT * dict rows with projected listing_rows rows.
+
+Builds synthetic rows shaped like the videos and quizzes tables (as the
+MySQL connector returns them) and measures, per row: the CPU to turn them
+into listing rows, the memory they hold, and their pickled size in the
+listing cache. Run from the repository root:
+
+    python -m benchmarks.listing_rows [--rows 10000]
+"""
+import argparse
+import json
+import pickle
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from listing_rows import LISTING_COLUMNS, make_rows
+
+# Full column lists, as SELECT * returned them
+ALL_COLUMNS = {
+    'quizzes': ('id', 'name', 'grade', 'end_date', 'upload_link', 'professor', 'created_at', 'updated_at'),
+    'videos': ('id', 'title', 'description', 'grade', 'filename', 'file_size', 'created_at', 'updated_at')
+}
+
+
+def _synthetic_rows(table_name, count):
+    base = datetime(2024, 1, 1, 8, 0, 0)
+    rows = []
+    for i in range(count):
+        created = base + timedelta(minutes=i)
+        values = {
+            'id': i + 1,
+            'name': f"Quiz {i}: fractions and decimals",
+            'title': f"Lesson {i}: fractions and decimals",
+            'description': "Worked examples and practice problems for the unit. " * 8,
+            'grade': f"Grade {7 + i % 6}",
+            'end_date': created + timedelta(days=7),
+            'upload_link': f"https://forms.example.com/d/e/{i:08d}/viewform",
+            'professor': "Ms. Rivera",
+            'filename': f"ab/cd/{i:064x}.mp4",
+            'file_size': 250_000_000 + i,
+            'created_at': created,
+            'updated_at': created + timedelta(hours=1)
+        }
+        rows.append(values)
+    return rows
+
+
+def _old_rows(table_name, records):
+    """dictionary=True cursor over SELECT *, then strftime rewritten into every row"""
+    columns = ALL_COLUMNS[table_name]
+    raw = [tuple(record[c] for c in columns) for record in records]
+    started = time.perf_counter()
+    items = [dict(zip(columns, row)) for row in raw]
+    for item in items:
+        if item['created_at']:
+            item['created_at'] = item['created_at'].strftime("%Y-%m-%d %H:%M:%S")
+        if item.get('updated_at'):
+            item['updated_at'] = item['updated_at'].strftime("%Y-%m-%d %H:%M:%S")
+        if item.get('end_date'):
+            item['end_date'] = item['end_date'].strftime("%Y-%m-%dT%H:%M")
+    return items, time.perf_counter() - started
+
+
+def _new_rows(table_name, records):
+    """Projected tuples wrapped in the table's row type; dates stay datetimes"""
+    columns = LISTING_COLUMNS[table_name]
+    raw = [tuple(record[c] for c in columns) for record in records]
+    started = time.perf_counter()
+    items = make_rows(table_name, raw)
+    return items, time.perf_counter() - started
+
+
+def _measure(build, table_name, records):
+    # Timed without tracemalloc, which slows allocation down
+    _, seconds = build(table_name, records)
+
+    tracemalloc.start()
+    items, _ = build(table_name, records)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(items)
+    return {
+        'cpu_us_per_row': round(seconds / count * 1e6, 3),
+        'bytes_per_row': round(retained / count, 1),
+        'pickled_bytes_per_row': round(len(pickle.dumps(items, pickle.HIGHEST_PROTOCOL)) / count, 1)
+    }
+
+
+def run(count):
+    results = {'rows': count}
+    for table_name in ALL_COLUMNS:
+        records = _synthetic_rows(table_name, count)
+        old = _measure(_old_rows, table_name, records)
+        new = _measure(_new_rows, table_name, records)
+        results[table_name] = {
+            'select_star_dicts': old,
+            'listing_rows': new,
+            'cpu_saved': f"{1 - new['cpu_us_per_row'] / old['cpu_us_per_row']:.0%}",
+            'memory_saved': f"{1 - new['bytes_per_row'] / old['bytes_per_row']:.0%}"
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows), indent=2))
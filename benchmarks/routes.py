@@ -0,0 +1,641 @@
+"""Load test every portal route against a seeded dataset.
+
+Seeds the five content tables with --rows rows each (1k to 1M) plus
+synthetic video, PDF and cover files, then sends --requests requests to
+each route from --concurrency threads and reports, per route, throughput
+and p50/p95/p99 latency. Everything runs offline: by default in a fresh
+working directory with the SQLite backend; --backend mysql seeds a separate
+local database (--database) instead of the portal's own. Run from the
+repository root:
+
+    python -m benchmarks.routes --rows 10000
+    python -m benchmarks.routes --rows 1000000 --groups student --concurrency 32
+    python -m benchmarks.routes --mode http --workers 4          # through server.py
+    python -m benchmarks.routes --compare benchmarks/results/routes-<old>.json
+
+--mode client calls the app in-process with Flask test clients (measures
+the app, limited by the GIL); --mode http starts server.py on a free port
+and sends real HTTP requests. Results are written as JSON to --output
+(default benchmarks/results/), named after the current commit.
+"""
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from http.client import HTTPConnection
+from urllib.parse import urlencode
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+
+GRADES = ['Grade 7', 'Grade 8', 'Grade 9', 'Grade 10', 'Grade 11', 'Grade 12', 'ALS 11', 'ALS 12']
+WORDS = ['fractions', 'algebra', 'photosynthesis', 'geometry', 'history', 'grammar', 'chemistry', 'ecology',
+         'poetry', 'statistics', 'reading', 'physics', 'cells', 'climate', 'probability', 'vocabulary',
+         'essay', 'equations', 'volcanoes', 'civics']
+CONTENT_TABLES = ['quizzes', 'activities', 'worksheets', 'videos', 'library']
+SEED_CHUNK = 5000
+REGRESSION_THRESHOLD = 0.10  # --compare flags routes whose p95 or throughput got this much worse
+
+
+# ==================== SETUP ====================
+def configure(backend, workdir, database=None, cache_mode=None):
+    """Point the portal at the benchmark's own database and files.
+
+    Must run before any portal module is imported: they copy settings from
+    config at import time. Relative paths (media folders, upload and job
+    directories) then resolve inside workdir.
+    """
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    import config
+    config.DB_BACKEND = backend
+    config.SQLITE_CONFIG['path'] = os.path.join(workdir, 'bench.sqlite3')
+    if database:
+        config.DB_CONFIG['database'] = database
+    if cache_mode:
+        config.CACHE_CONFIG['mode'] = cache_mode
+    config.SERVER_CONFIG['jinja_cache_dir'] = os.path.join(workdir, '.cache', 'jinja')
+
+
+def _synthetic_media(kind, count, size, extension):
+    from blob_store import save_stream
+    rng = random.Random(kind)
+    names = []
+    for i in range(count):
+        data = rng.randbytes(size)
+        name, file_size, _ = save_stream(io.BytesIO(data), kind, f"bench-{i}{extension}")
+        names.append((name, file_size))
+    return names
+
+
+def _content_rows(table_name, count, media):
+    """Rows for one table, newest first; every 30s back from now, so keyset pages look real"""
+    rng = random.Random(table_name)
+    now = datetime.now().replace(microsecond=0)
+    for i in range(count):
+        created = now - timedelta(seconds=30 * i)
+        title = f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {i}"
+        description = ' '.join(rng.choice(WORDS) for _ in range(24))
+        grade = GRADES[i % len(GRADES)]
+        if table_name == 'videos':
+            filename, size = media['videos'][i % len(media['videos'])]
+            yield title, description, grade, filename, size, created
+        elif table_name == 'library':
+            pdf, size = media['pdfs'][i % len(media['pdfs'])]
+            picture, _ = media['pictures'][i % len(media['pictures'])]
+            yield title, description, grade, pdf, picture, size, rng.randint(10, 400), created
+        else:
+            end_date = created + timedelta(days=rng.randint(-30, 60))
+            yield (title, grade, end_date, f"https://forms.example.com/d/{i:08d}/viewform",
+                   f"Teacher {i % 40}", created)
+
+
+SEED_COLUMNS = {
+    'quizzes': 'name, grade, end_date, upload_link, professor, created_at',
+    'activities': 'name, grade, end_date, upload_link, professor, created_at',
+    'worksheets': 'name, grade, end_date, upload_link, professor, created_at',
+    'videos': 'title, description, grade, filename, file_size, created_at',
+    'library': 'title, description, grade, pdf_filename, picture_filename, file_size, page_count, created_at'
+}
+
+
+def seed(rows, media_files, media_size):
+    """Replace all content with rows rows per table; returns timings and id ranges"""
+    from database_functions import init_database
+    from db_pool import get_pool
+    from migrations import _create_blobs, _create_content_counts
+
+    started = time.monotonic()
+    init_database()
+    media = {
+        'videos': _synthetic_media('videos', media_files, media_size, '.mp4'),
+        'pdfs': _synthetic_media('pdfs', media_files, max(media_size // 4, 1024), '.pdf'),
+        'pictures': _synthetic_media('pictures', media_files, 32 * 1024, '.png')
+    }
+    report = {'rows_per_table': rows, 'media_files': 3 * media_files, 'tables': {}}
+
+    connection = get_pool().get_connection()
+    cursor = connection.cursor()
+    try:
+        for table in CONTENT_TABLES + ['content_counts', 'blobs', 'trash']:
+            cursor.execute(f"DELETE FROM {table}")
+        connection.commit()
+
+        for table in CONTENT_TABLES:
+            table_started = time.monotonic()
+            columns = SEED_COLUMNS[table]
+            sql = f"INSERT INTO {table} ({columns}) VALUES ({', '.join(['%s'] * len(columns.split(', ')))})"
+            chunk = []
+            for row in _content_rows(table, rows, media):
+                chunk.append(row)
+                if len(chunk) >= SEED_CHUNK:
+                    cursor.executemany(sql, chunk)
+                    connection.commit()
+                    chunk = []
+            if chunk:
+                cursor.executemany(sql, chunk)
+                connection.commit()
+            report['tables'][table] = {'seconds': round(time.monotonic() - table_started, 2)}
+
+        # The maintained counters and media refcounts, rebuilt exactly as the migrations seed them
+        _create_content_counts(cursor)
+        _create_blobs(cursor)
+        connection.commit()
+
+        for table in CONTENT_TABLES:
+            cursor.execute(f"SELECT MIN(id), MAX(id) FROM {table}")
+            report['tables'][table]['ids'] = list(cursor.fetchone())
+    finally:
+        cursor.close()
+        connection.close()
+
+    report['media'] = {kind: [name for name, _ in files] for kind, files in media.items()}
+    report['seconds'] = round(time.monotonic() - started, 2)
+    return report
+
+
+def _deep_cursor(table_name, rows):
+    """Page token for the middle of a listing, to measure a deep keyset page"""
+    from database_functions import encode_page_cursor
+    from db_pool import get_pool
+    connection = get_pool().get_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT created_at, id FROM {table_name} ORDER BY created_at DESC, id DESC "
+                       f"LIMIT 1 OFFSET %s", (rows // 2,))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+        connection.close()
+    return encode_page_cursor(*row) if row else None
+
+
+# ==================== SESSIONS ====================
+class ClientSession:
+    """In-process requests through a Flask test client (one per thread)"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, data=body, headers=headers or {})
+        data = response.get_data()
+        return response.status_code, data
+
+
+class HTTPSession:
+    """Real HTTP requests, one connection per request, with the session cookie kept"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.cookie = None
+
+    def send(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        connection = HTTPConnection(self.host, self.port, timeout=120)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+            cookie = response.getheader('Set-Cookie')
+            if cookie:
+                self.cookie = cookie.split(';', 1)[0]
+            return response.status, data
+        finally:
+            connection.close()
+
+
+def _form(fields):
+    return urlencode(fields, doseq=True).encode(), {'Content-Type': 'application/x-www-form-urlencoded'}
+
+
+def _multipart(fields, files):
+    """multipart/form-data body for fields {name: value} and files {name: (filename, bytes)}"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode() + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+
+def _login(session):
+    from config import ADMIN_USERNAME, ADMIN_PASSWORD
+    body, headers = _form({'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD})
+    session.send('POST', '/login', body, headers)
+
+
+# ==================== ROUTES ====================
+def _get(path):
+    return lambda send, ctx, rng: send('GET', path(ctx, rng) if callable(path) else path)
+
+
+def _random_id(table_name):
+    def pick(ctx, rng):
+        low, high = ctx['ids'][table_name]
+        return rng.randint(low, high) if low is not None else 1
+    return pick
+
+
+def _add_quiz(send, ctx, rng):
+    body, headers = _form({'name': f"Bench quiz {rng.random()}", 'grade': rng.choice(GRADES),
+                           'end_date': '2030-01-01T08:00', 'upload_link': 'https://forms.example.com/x',
+                           'professor': 'Bench'})
+    return send('POST', '/add_quiz', body, headers)
+
+
+def _update_quiz(send, ctx, rng):
+    body, headers = _form({'name': f"Updated {rng.random()}", 'grade': rng.choice(GRADES), 'end_date': '',
+                           'upload_link': 'https://forms.example.com/y', 'professor': ''})
+    return send('POST', f"/update_quiz/{_random_id('quizzes')(ctx, rng)}", body, headers)
+
+
+def _bulk_grade(send, ctx, rng):
+    start = _random_id('activities')(ctx, rng)
+    body, headers = _form({'action': 'grade', 'grade': rng.choice(GRADES), 'ids': list(range(start, start + 50))})
+    return send('POST', '/bulk/activities', body, headers)
+
+
+def _import_dry_run(send, ctx, rng):
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(['name', 'grade', 'upload_link', 'end_date'])
+    for i in range(200):
+        writer.writerow([f"Imported {i}", rng.choice(GRADES), 'https://forms.example.com/z', '2030-01-01'])
+    body, headers = _multipart({'dry_run': '1'}, {'file': ('bench.csv', text.getvalue().encode())})
+    return send('POST', '/import/worksheets', body, headers)
+
+
+def _upload_video(send, ctx, rng):
+    body, headers = _multipart({'title': 'Bench upload', 'description': 'benchmark', 'grade': rng.choice(GRADES)},
+                               {'video_file': ('bench.mp4', rng.randbytes(256 * 1024))})
+    return send('POST', '/upload_video', body, headers)
+
+
+def _chunked_upload(send, ctx, rng):
+    data = rng.randbytes(512 * 1024)
+    upload = json.dumps({'kind': 'video', 'filename': 'bench.mp4', 'size': len(data)}).encode()
+    status, body = send('POST', '/uploads', upload, {'Content-Type': 'application/json'})
+    if status != 201:
+        return status, body
+    upload_id = json.loads(body)['upload_id']
+    half = len(data) // 2
+    for offset in (0, half):
+        status, body = send('PATCH', f"/uploads/{upload_id}", data[offset:offset + half] if offset == 0
+                            else data[half:], {'Upload-Offset': str(offset),
+                                               'Content-Type': 'application/offset+octet-stream'})
+        if status != 204:
+            return status, body
+    form, headers = _form({'title': 'Bench chunked', 'description': '', 'grade': rng.choice(GRADES)})
+    return send('POST', f"/uploads/{upload_id}/commit", form, headers)
+
+
+def build_routes(ctx):
+    """(group, name, scenario) for every route; a scenario sends one logical request"""
+    def word(ctx, rng):
+        return rng.choice(WORDS)
+
+    media = ctx['media']
+    routes = [
+        ('student', 'GET /', _get('/')),
+        ('student', 'GET /student_homepage', _get('/student_homepage')),
+        ('student', 'GET /student_homepage?grade', _get('/student_homepage?grade=Grade+8')),
+    ]
+    for table in CONTENT_TABLES:
+        endpoint = f"/student/{table}"
+        routes += [
+            ('student', f"GET {endpoint}", _get(endpoint)),
+            ('student', f"GET {endpoint}?grade", _get(f"{endpoint}?grade=Grade+9")),
+        ]
+        if ctx['cursors'].get(table):
+            routes.append(('student', f"GET {endpoint} (deep page)",
+                           _get(f"{endpoint}?cursor={ctx['cursors'][table]}")))
+    routes += [
+        ('student', 'GET /student/assignments', _get('/student/assignments')),
+        ('student', 'GET /student/assignments?grade&due_within',
+         _get('/student/assignments?grade=Grade+11&due_within=7')),
+        ('student', 'GET /student/videos?search', _get(lambda c, rng: f"/student/videos?search={word(c, rng)}")),
+        ('student', 'GET /student/library?search&grade',
+         _get(lambda c, rng: f"/student/library?search={word(c, rng)}&grade=Grade+10")),
+
+        ('api', 'GET /api/v1/videos', _get('/api/v1/videos')),
+        ('api', 'GET /api/v1/library?fields&grade', _get('/api/v1/library?fields=id,title,pdf_filename&grade=Grade+9')),
+        ('api', 'GET /api/v1/quizzes (deep page)',
+         _get(lambda c, rng: f"/api/v1/quizzes?cursor={c['cursors']['quizzes']}")),
+        ('api', 'GET /api/v1/videos?search', _get(lambda c, rng: f"/api/v1/videos?search={word(c, rng)}")),
+        ('api', 'GET /api/v1/<type>/<id>',
+         _get(lambda c, rng: f"/api/v1/activities/{_random_id('activities')(c, rng)}")),
+        ('api', 'GET /api/v1/assignments?due_within', _get('/api/v1/assignments?due_within=7&page_size=50')),
+
+        ('admin', 'GET /homepage', _get('/homepage')),
+        ('admin', 'GET /manage_quizzes', _get('/manage_quizzes')),
+        ('admin', 'GET /manage_activities', _get('/manage_activities')),
+        ('admin', 'GET /manage_worksheets', _get('/manage_worksheets')),
+        ('admin', 'GET /manage_videos', _get('/manage_videos')),
+        ('admin', 'GET /video_library', _get('/video_library')),
+        ('admin', 'GET /video_library?search', _get(lambda c, rng: f"/video_library?search={word(c, rng)}")),
+        ('admin', 'GET /manage_library', _get('/manage_library')),
+        ('admin', 'GET /library_books', _get('/library_books')),
+        ('admin', 'GET /edit_quiz/<id>', _get(lambda c, rng: f"/edit_quiz/{_random_id('quizzes')(c, rng)}")),
+        ('admin', 'GET /edit_activity/<id>', _get(lambda c, rng: f"/edit_activity/{_random_id('activities')(c, rng)}")),
+        ('admin', 'GET /edit_worksheet/<id>',
+         _get(lambda c, rng: f"/edit_worksheet/{_random_id('worksheets')(c, rng)}")),
+        ('admin', 'GET /edit_video/<id>', _get(lambda c, rng: f"/edit_video/{_random_id('videos')(c, rng)}")),
+        ('admin', 'GET /edit_book/<id>', _get(lambda c, rng: f"/edit_book/{_random_id('library')(c, rng)}")),
+        ('admin', 'GET /admin/pool_stats', _get('/admin/pool_stats')),
+        ('admin', 'GET /admin/cache_stats', _get('/admin/cache_stats')),
+        ('admin', 'GET /admin/jobs', _get('/admin/jobs')),
+        ('admin', 'GET /admin/trash', _get('/admin/trash')),
+        ('admin', 'GET /admin/search_latency',
+         _get(lambda c, rng: f"/admin/search_latency?table=videos&runs=1&q={word(c, rng)}")),
+        ('admin', 'GET /admin/storage_scan', _get('/admin/storage_scan')),
+        ('admin', 'GET /admin/slow_queries', _get('/admin/slow_queries')),
+        ('admin', 'GET /metrics', _get('/metrics')),
+
+        ('media', 'GET /media/videos (1 MB range)',
+         lambda send, c, rng: send('GET', f"/media/videos/{rng.choice(media['videos'])}",
+                                   headers={'Range': 'bytes=0-1048575'})),
+        ('media', 'GET /media/pdfs', _get(lambda c, rng: f"/media/pdfs/{rng.choice(media['pdfs'])}")),
+        ('media', 'GET /media/pictures', _get(lambda c, rng: f"/media/pictures/{rng.choice(media['pictures'])}")),
+        ('media', 'GET /download_video/<id>', _get(lambda c, rng: f"/download_video/{_random_id('videos')(c, rng)}")),
+        ('media', 'GET /download_book/<id>', _get(lambda c, rng: f"/download_book/{_random_id('library')(c, rng)}")),
+        ('media', 'GET /static (fingerprinted css)',
+         lambda send, c, rng: send('GET', c['static_css'], headers={'Accept-Encoding': 'br, gzip'})),
+
+        ('write', 'POST /login',
+         lambda send, c, rng: send('POST', '/login', *_form({'username': 'x', 'password': 'y'}))),
+        ('write', 'POST /add_quiz', _add_quiz),
+        ('write', 'POST /update_quiz/<id>', _update_quiz),
+        ('write', 'POST /bulk/activities (grade)', _bulk_grade),
+        ('write', 'POST /import/worksheets (dry run)', _import_dry_run),
+        ('write', 'POST /upload_video', _upload_video),
+        ('write', 'POST /uploads (create, 2 chunks, commit)', _chunked_upload),
+        ('write', 'GET /delete_quiz/<id>', _get(lambda c, rng: f"/delete_quiz/{_random_id('quizzes')(c, rng)}")),
+    ]
+    return routes
+
+
+# ==================== MEASUREMENT ====================
+def _percentile(ordered, percent):
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(percent / 100 * len(ordered)) - 1))]
+
+
+def _summarize(latencies, errors, elapsed, total_bytes):
+    ordered = sorted(latencies)
+    count = len(ordered)
+    return {
+        'requests': count,
+        'errors': errors,
+        'throughput_rps': round(count / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(_percentile(ordered, 50) * 1000, 2),
+        'p95_ms': round(_percentile(ordered, 95) * 1000, 2),
+        'p99_ms': round(_percentile(ordered, 99) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2),
+        'mean_ms': round(sum(ordered) / count * 1000, 2),
+        'bytes_per_request': round(total_bytes / count)
+    }
+
+
+def run_route(scenario, ctx, make_session, requests, concurrency, warmup):
+    """Send requests requests from concurrency threads; returns the route's summary"""
+    local = threading.local()
+    lock = threading.Lock()
+    latencies = []
+    counters = {'errors': 0, 'bytes': 0}
+
+    def one(seed):
+        if not hasattr(local, 'session'):
+            local.session = make_session()
+        rng = random.Random(seed)
+        started = time.perf_counter()
+        try:
+            status, body = scenario(local.session.send, ctx, rng)
+            failed = status >= 400
+        except Exception:
+            status, body, failed = None, b'', True
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            counters['bytes'] += len(body)
+            counters['errors'] += failed
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(-warmup, 0)))
+        latencies.clear()
+        counters.update(errors=0, bytes=0)
+
+        started = time.perf_counter()
+        list(pool.map(one, range(requests)))
+        elapsed = time.perf_counter() - started
+    return _summarize(latencies, counters['errors'], elapsed, counters['bytes'])
+
+
+# ==================== SERVER (--mode http) ====================
+_SERVER_BOOTSTRAP = """
+import json, sys
+sys.path.insert(0, {root!r})
+from benchmarks.routes import configure
+configure(**json.loads({settings!r}))
+import server
+server.serve(host='127.0.0.1', port={port}, workers={workers})
+"""
+
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def start_server(settings, workers):
+    port = _free_port()
+    code = _SERVER_BOOTSTRAP.format(root=REPO_ROOT, settings=json.dumps(settings), port=port, workers=workers)
+    process = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            status, _ = HTTPSession('127.0.0.1', port).send('GET', '/')
+            if status == 200:
+                return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('server.py did not start')
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+# ==================== REPORTING ====================
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results, baseline):
+    """Per-route p95/throughput change against an earlier results file; returns the regressions"""
+    regressions = []
+    for name, now in results['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if not before or not before['p95_ms'] or not before['throughput_rps']:
+            continue
+        p95_change = now['p95_ms'] / before['p95_ms'] - 1
+        rps_change = now['throughput_rps'] / before['throughput_rps'] - 1
+        flag = p95_change > REGRESSION_THRESHOLD or rps_change < -REGRESSION_THRESHOLD
+        print(f"{'!' if flag else ' '} {name:48} p95 {before['p95_ms']:>9} -> {now['p95_ms']:>9} ms "
+              f"({p95_change:+.0%})  rps {before['throughput_rps']:>8} -> {now['throughput_rps']:>8} "
+              f"({rps_change:+.0%})")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000, help='rows per content table')
+    parser.add_argument('--media-files', type=int, default=20, help='synthetic files per media kind')
+    parser.add_argument('--media-size', type=int, default=4 * 1024 * 1024, help='bytes per video file')
+    parser.add_argument('--backend', choices=['sqlite', 'mysql'], default='sqlite')
+    parser.add_argument('--database', default='ntvhs_portal_bench', help='MySQL database to seed (--backend mysql)')
+    parser.add_argument('--workdir', help='database and media location (default: a new temporary directory)')
+    parser.add_argument('--reseed', action='store_true', help='seed again even if --workdir already has this dataset')
+    parser.add_argument('--cache', choices=['off', 'local', 'shared'], help='override CACHE_CONFIG mode')
+    parser.add_argument('--mode', choices=['client', 'http'], default='client')
+    parser.add_argument('--workers', type=int, default=0, help='server.py workers for --mode http')
+    parser.add_argument('--groups', default='student,api,admin,media,write', help='comma-separated route groups')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per route')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per route')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/routes-<commit>-<time>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix='portal-bench-')
+    settings = {'backend': args.backend, 'workdir': workdir, 'database': args.database, 'cache_mode': args.cache}
+    configure(**settings)
+
+    # Portal modules only now, so they see the benchmark settings
+    from main import create_app
+
+    seed_params = {'backend': args.backend, 'database': args.database, 'rows': args.rows,
+                   'media_files': args.media_files, 'media_size': args.media_size}
+    marker = os.path.join(workdir, 'seed.json')
+    seeded = None
+    if not args.reseed and os.path.exists(marker):
+        with open(marker) as f:
+            seeded = json.load(f)
+        if seeded.get('params') != seed_params:
+            seeded = None
+    if seeded is None:
+        print(f"Seeding {args.rows} rows per table into {workdir} ...", file=sys.stderr)
+        seeded = {'params': seed_params, 'report': seed(args.rows, args.media_files, args.media_size)}
+        with open(marker, 'w') as f:
+            json.dump(seeded, f)
+
+    app = create_app()
+    with app.test_request_context():
+        from flask import url_for
+        static_css = url_for('static', filename='css/student_content.css')
+    ctx = {
+        'ids': {table: info['ids'] for table, info in seeded['report']['tables'].items()},
+        'media': seeded['report']['media'],
+        'cursors': {table: _deep_cursor(table, args.rows) for table in CONTENT_TABLES},
+        'static_css': static_css
+    }
+
+    server = None
+    if args.mode == 'http':
+        server, port = start_server(settings, args.workers)
+        make_plain = partial(HTTPSession, '127.0.0.1', port)
+    else:
+        make_plain = partial(ClientSession, app)
+
+    def make_admin():
+        session = make_plain()
+        _login(session)
+        return session
+
+    groups = set(args.groups.split(','))
+    results = {
+        'meta': {
+            'commit': _git_commit(),
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'mode': args.mode,
+            'backend': args.backend,
+            'cache': args.cache or 'config',
+            'concurrency': args.concurrency,
+            'requests_per_route': args.requests,
+            'workers': args.workers if args.mode == 'http' else None,
+            'python': platform.python_version(),
+            'cpus': os.cpu_count()
+        },
+        'seed': seeded['report'] | {'media': {kind: len(names) for kind, names in seeded['report']['media'].items()}},
+        'routes': {}
+    }
+    try:
+        for group, name, scenario in build_routes(ctx):
+            if group not in groups:
+                continue
+            make_session = make_plain if group in ('student', 'api') else make_admin
+            summary = run_route(scenario, ctx, make_session, args.requests, args.concurrency, args.warmup)
+            results['routes'][name] = dict(summary, group=group)
+            print(f"{name:48} {summary['throughput_rps']:>8} rps  p50 {summary['p50_ms']:>8} ms  "
+                  f"p95 {summary['p95_ms']:>8} ms  p99 {summary['p99_ms']:>8} ms  errors {summary['errors']}",
+                  file=sys.stderr)
+    finally:
+        if server:
+            stop_server(server)
+
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"routes-{results['meta']['commit']}-{stamp}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            print(f"{len(regressions)} routes regressed by more than {REGRESSION_THRESHOLD:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import re
+import uuid
+
+from werkzeug.utils import secure_filename
+
+# Content-addressed folders; stored names look like "ab/cd/<sha256>.<ext>"
+BLOB_FOLDERS = {
+    'videos': 'static/videos',
+    'pdfs': 'static/library/pdfs',
+    'pictures': 'static/library/pictures'
+}
+
+BLOB_NAME_PATTERN = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})(\.[a-z0-9]+)?$')
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+def blob_name(sha256, original_filename):
+    """Sharded relative name for a blob, keeping the original extension"""
+    ext = os.path.splitext(secure_filename(original_filename or ''))[1].lower()
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}"
+
+
+def blob_sha256(filename):
+    """The sha256 a stored name refers to, or None for legacy (pre-dedup) file names"""
+    match = BLOB_NAME_PATTERN.match(filename or '')
+    return match.group(1) if match else None
+
+
+def _place(temp_path, kind, sha256, original_filename, size):
+    """Move a hashed temp file to its content address and take a reference to it.
+
+    Whether the address is taken already is decided with the file's blobs row
+    locked (database_functions.reference_blob), so a purge of identical
+    content cannot remove the file under the new reference. The temp file is
+    dropped when the blob already exists.
+    """
+    from database_functions import reference_blob
+
+    name = blob_name(sha256, original_filename)
+    path = os.path.join(BLOB_FOLDERS[kind], name)
+
+    def place():
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        return True
+
+    try:
+        created = reference_blob(kind, name, size, place)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    if created is None:
+        raise OSError(f"Could not record the stored file {name}")
+    return name, created
+
+
+def save_stream(stream, kind, original_filename):
+    """Store an upload stream once, hashing it as it is written.
+
+    Returns (filename, size, created); created is False when identical
+    content was already stored and the new copy was discarded. The caller
+    holds one reference to the file: the row created with it must not add
+    another, and database_functions.release_blob() gives it back when no
+    row is created.
+    """
+    folder = BLOB_FOLDERS[kind]
+    os.makedirs(folder, exist_ok=True)
+    temp_path = os.path.join(folder, f".incoming-{uuid.uuid4().hex}")
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, 'wb') as f:
+            while True:
+                block = stream.read(COPY_BLOCK_SIZE)
+                if not block:
+                    break
+                digest.update(block)
+                size += len(block)
+                f.write(block)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    name, created = _place(temp_path, kind, digest.hexdigest(), original_filename, size)
+    return name, size, created
+
+
+def adopt_file(path, kind, original_filename):
+    """Move an already assembled file (e.g. a finished chunked upload) into the store.
+
+    The file must be on the same filesystem as the blob folder. Returns and
+    references the stored file like save_stream().
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(COPY_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            size += len(block)
+
+    name, created = _place(path, kind, digest.hexdigest(), original_filename, size)
+    return name, size, created
+
+
+def incoming_path(kind):
+    """Temp path inside a blob folder, for writers that assemble the file themselves"""
+    os.makedirs(BLOB_FOLDERS[kind], exist_ok=True)
+    return os.path.join(BLOB_FOLDERS[kind], f".incoming-{uuid.uuid4().hex}")
+
+
+def blob_path(kind, filename):
+    return os.path.join(BLOB_FOLDERS[kind], filename)
+
+
+def blob_size(kind, filename):
+    """Size of a stored file in bytes, or 0 if it is missing"""
+    try:
+        return os.path.getsize(blob_path(kind, filename))
+    except OSError:
+        return 0
+
+
+def remove_blob(kind, filename):
+    """Delete a stored file (only with its blobs row locked and unreferenced, see release_blob)"""
+    path = blob_path(kind, filename)
+    if os.path.exists(path):
+        os.remove(path)
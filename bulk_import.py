@@ -0,0 +1,176 @@
+"""Bulk import of quizzes, activities and worksheets from CSV or JSONL.
+
+Files are parsed as a stream and inserted in chunked transactions, so
+large files are never held in memory. Columns/keys: name, grade,
+upload_link, and optionally end_date and professor.
+
+    python bulk_import.py quizzes term1.csv
+    python bulk_import.py worksheets term1.jsonl --dry-run
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+from config import IMPORT_CONFIG
+from database_functions import bulk_insert_items
+from db_pool import Error
+from migrations import ASSIGNMENT_TABLES
+
+IMPORT_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+VALID_GRADES = {'Grade 7', 'Grade 8', 'Grade 9', 'Grade 10', 'Grade 11', 'Grade 12', 'ALS 11', 'ALS 12'}
+END_DATE_FORMATS = ('%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d')
+
+
+class ImportRowError(ValueError):
+    """A row that cannot be imported; the message goes into the report"""
+
+
+def detect_format(filename):
+    """'csv' or 'jsonl' from a file name, or None"""
+    return IMPORT_FORMATS.get(os.path.splitext(filename or '')[1].lower())
+
+
+# ==================== PARSING ====================
+def iter_records(stream, file_format):
+    """Yield (line number, record dict or ImportRowError) from a binary stream"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if file_format == 'csv' else None)
+
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            # line_num is the last physical line read, so quoted newlines keep numbers right
+            if None in record:
+                yield reader.line_num, ImportRowError('Too many columns')
+            else:
+                yield reader.line_num, record
+        return
+
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, ImportRowError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(record, dict):
+            yield line_number, ImportRowError('Expected a JSON object')
+        else:
+            yield line_number, record
+
+
+def _text(record, field, required=False, max_length=255):
+    value = record.get(field)
+    value = str(value).strip() if value is not None else ''
+    if required and not value:
+        raise ImportRowError(f"Missing {field}")
+    if len(value) > max_length:
+        raise ImportRowError(f"{field} is longer than {max_length} characters")
+    return value or None
+
+
+def validate_record(record):
+    """Turn one record into an insert tuple (name, grade, end_date, upload_link, professor)"""
+    name = _text(record, 'name', required=True)
+
+    grade = _text(record, 'grade', required=True)
+    if grade not in VALID_GRADES:
+        raise ImportRowError(f"Unknown grade {grade!r}")
+
+    upload_link = _text(record, 'upload_link', required=True, max_length=2048)
+    parsed = urlparse(upload_link)
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+        raise ImportRowError('upload_link must be an http(s) URL')
+
+    end_date = _text(record, 'end_date')
+    if end_date:
+        for date_format in END_DATE_FORMATS:
+            try:
+                end_date = datetime.strptime(end_date, date_format)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ImportRowError(f"Invalid end_date {end_date!r} (use YYYY-MM-DD or YYYY-MM-DDTHH:MM)")
+
+    return name, grade, end_date, upload_link, _text(record, 'professor')
+
+
+# ==================== IMPORT ====================
+def import_items(table_name, stream, file_format, chunk_size=None, dry_run=False):
+    """Validate and insert every row of a CSV/JSONL stream; returns a report dict.
+
+    Valid rows are inserted chunk_size at a time, each chunk in its own
+    transaction; a chunk the database rejects is reported row by row and
+    the import continues with the next one.
+    """
+    if table_name not in ASSIGNMENT_TABLES:
+        raise ValueError(f"Cannot import into {table_name}")
+    if file_format not in IMPORT_FORMATS.values():
+        raise ValueError('Format must be csv or jsonl')
+    chunk_size = chunk_size or IMPORT_CONFIG['chunk_size']
+
+    started = time.monotonic()
+    report = {'table': table_name, 'rows': 0, 'inserted': 0, 'failed': 0, 'dry_run': dry_run, 'errors': []}
+
+    def fail(line_number, message):
+        report['failed'] += 1
+        if len(report['errors']) < IMPORT_CONFIG['max_reported_errors']:
+            report['errors'].append({'line': line_number, 'error': message})
+
+    chunk = []
+    lines = []
+
+    def flush():
+        if not chunk:
+            return
+        if dry_run:
+            report['inserted'] += len(chunk)
+        else:
+            try:
+                report['inserted'] += bulk_insert_items(table_name, chunk)
+            except Error as e:
+                for line_number in lines:
+                    fail(line_number, f"Database error: {e}")
+        chunk.clear()
+        lines.clear()
+
+    for line_number, record in iter_records(stream, file_format):
+        report['rows'] += 1
+        try:
+            if isinstance(record, ImportRowError):
+                raise record
+            chunk.append(validate_record(record))
+            lines.append(line_number)
+        except ImportRowError as e:
+            fail(line_number, str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+
+    report['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('table', choices=ASSIGNMENT_TABLES)
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=sorted(set(IMPORT_FORMATS.values())),
+                        help='defaults to the file extension')
+    parser.add_argument('--chunk-size', type=int)
+    parser.add_argument('--dry-run', action='store_true', help='validate only, insert nothing')
+    args = parser.parse_args()
+
+    file_format = args.format or detect_format(args.path)
+    if not file_format:
+        parser.error('cannot tell the format from the file name; pass --format')
+    with open(args.path, 'rb') as f:
+        result = import_items(args.table, f, file_format, chunk_size=args.chunk_size, dry_run=args.dry_run)
+    print(json.dumps(result, indent=2))
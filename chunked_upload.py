@@ -0,0 +1,302 @@
+import base64
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+from config import UPLOAD_CONFIG
+
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+UPLOAD_KINDS = {'video', 'book'}
+
+_last_expiry_run = 0.0
+
+
+class UploadError(Exception):
+    """Chunked upload request that cannot be accepted; status is the HTTP code to return"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# ==================== STORAGE LAYOUT ====================
+# <dir>/<upload_id>/info.json      kind, filename, size, created_at
+# <dir>/<upload_id>/data.part      preallocated file, chunks written in place
+# <dir>/<upload_id>/chunks/<offset>-<length>  marker per received chunk (holds its sha256)
+# <dir>/<upload_id>/committing     present while a commit request creates the video/book row
+# <dir>/<upload_id>/committed      left by a successful commit, so a repeated commit gets a 409
+#
+# One marker file per chunk lets several PATCH requests for the same upload
+# run at once without sharing any mutable bookkeeping.
+
+def _upload_dir(upload_id):
+    if not UPLOAD_ID_PATTERN.match(upload_id or ''):
+        raise UploadError('Unknown upload', 404)
+    path = os.path.join(UPLOAD_CONFIG['dir'], upload_id)
+    if not os.path.isdir(path):
+        raise UploadError('Unknown upload', 404)
+    return path
+
+
+def _load_info(upload_dir):
+    with open(os.path.join(upload_dir, 'info.json')) as f:
+        return json.load(f)
+
+
+def _committing(upload_dir):
+    return any(os.path.exists(os.path.join(upload_dir, name)) for name in ('committing', 'committed'))
+
+
+def _received_ranges(upload_dir):
+    """Merged list of [start, end) byte ranges received so far"""
+    ranges = []
+    try:
+        names = os.listdir(os.path.join(upload_dir, 'chunks'))
+    except FileNotFoundError:
+        names = []  # Committed: the data has moved into the media store
+    for name in names:
+        start, length = name.split('-')
+        ranges.append((int(start), int(start) + int(length)))
+    ranges.sort()
+
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _contiguous_offset(ranges):
+    """Bytes received without gaps from the start (the tus-style Upload-Offset)"""
+    return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+
+def _missing_ranges(ranges, size):
+    missing = []
+    position = 0
+    for start, end in ranges:
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < size:
+        missing.append([position, size])
+    return missing
+
+
+# ==================== UPLOAD LIFECYCLE ====================
+def create_upload(kind, filename, size):
+    """Start a new upload and preallocate its data file"""
+    if kind not in UPLOAD_KINDS:
+        raise UploadError('Unknown upload kind')
+    if not filename:
+        raise UploadError('Missing filename')
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('Invalid upload size')
+    if size <= 0 or size > UPLOAD_CONFIG['max_upload_size']:
+        raise UploadError('Invalid upload size', 413 if size > 0 else 400)
+
+    expire_abandoned_uploads(throttle=True)
+
+    upload_id = uuid.uuid4().hex
+    upload_dir = os.path.join(UPLOAD_CONFIG['dir'], upload_id)
+    os.makedirs(os.path.join(upload_dir, 'chunks'))
+
+    # Sparse preallocation: chunks can then land at any offset in any order
+    with open(os.path.join(upload_dir, 'data.part'), 'wb') as f:
+        f.truncate(size)
+
+    info = {
+        'upload_id': upload_id,
+        'kind': kind,
+        'filename': filename,
+        'size': size,
+        'created_at': time.time()
+    }
+    with open(os.path.join(upload_dir, 'info.json'), 'w') as f:
+        json.dump(info, f)
+
+    return dict(info, chunk_size=UPLOAD_CONFIG['chunk_size'], offset=0)
+
+
+def write_chunk(upload_id, offset, data, checksum=None):
+    """Store one chunk at its byte offset after verifying its checksum.
+
+    checksum uses the tus format "sha256 <base64 digest>". Returns the
+    contiguous offset received so far.
+    """
+    upload_dir = _upload_dir(upload_id)
+    info = _load_info(upload_dir)
+    if _committing(upload_dir):
+        # data.part is linked into the media store by then; writing to it would change the stored file
+        raise UploadError('Upload is already committed', 409)
+
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        raise UploadError('Missing or invalid Upload-Offset')
+    if not data:
+        raise UploadError('Empty chunk')
+    if len(data) > UPLOAD_CONFIG['max_chunk_size']:
+        raise UploadError('Chunk too large', 413)
+    if offset < 0 or offset + len(data) > info['size']:
+        raise UploadError('Chunk outside the upload', 416)
+
+    digest = hashlib.sha256(data).digest()
+    if checksum:
+        algorithm, _, expected = checksum.partition(' ')
+        if algorithm.lower() != 'sha256':
+            raise UploadError('Unsupported checksum algorithm')
+        try:
+            expected = base64.b64decode(expected)
+        except ValueError:
+            raise UploadError('Malformed checksum')
+        if expected != digest:
+            # 460 is the tus "Checksum Mismatch" status
+            raise UploadError('Checksum mismatch', 460)
+    elif UPLOAD_CONFIG['require_checksum']:
+        raise UploadError('Missing Upload-Checksum')
+
+    fd = os.open(os.path.join(upload_dir, 'data.part'), os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        if hasattr(os, 'pwrite'):
+            os.pwrite(fd, data, offset)
+        else:
+            os.lseek(fd, offset, os.SEEK_SET)
+            os.write(fd, data)
+    finally:
+        os.close(fd)
+
+    # The marker is written only after the bytes are in place
+    with open(os.path.join(upload_dir, 'chunks', f"{offset:020d}-{len(data)}"), 'w') as f:
+        f.write(digest.hex())
+
+    return _contiguous_offset(_received_ranges(upload_dir))
+
+
+def upload_status(upload_id):
+    """Offset, size and still-missing byte ranges of an upload"""
+    upload_dir = _upload_dir(upload_id)
+    info = _load_info(upload_dir)
+    ranges = _received_ranges(upload_dir)
+    return dict(info,
+                committed=os.path.exists(os.path.join(upload_dir, 'committed')),
+                offset=_contiguous_offset(ranges),
+                missing=_missing_ranges(ranges, info['size']),
+                chunk_size=UPLOAD_CONFIG['chunk_size'])
+
+
+def complete_upload(upload_id, dest_folder, dest_filename):
+    """Link a fully received upload to dest_folder/dest_filename and mark it as committing.
+
+    The upload itself is kept until finish_upload() (the row was created) or
+    cancel_upload() (it was not, and the client may commit again). Returns
+    (info, path). Raises UploadError 409 while bytes are still missing, or
+    when another request is committing or has committed the upload.
+    """
+    upload_dir = _upload_dir(upload_id)
+    info = _load_info(upload_dir)
+    marker = os.path.join(upload_dir, 'committing')
+    try:
+        # O_EXCL: of two concurrent commits, only one gets to create the row
+        os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        raise UploadError('Upload is already being committed', 409)
+
+    try:
+        if os.path.exists(os.path.join(upload_dir, 'committed')):
+            raise UploadError('Upload is already committed', 409)
+        if _missing_ranges(_received_ranges(upload_dir), info['size']):
+            raise UploadError('Upload is incomplete', 409)
+
+        dest_path = os.path.join(dest_folder, dest_filename)
+        data_path = os.path.join(upload_dir, 'data.part')
+        try:
+            # Same filesystem, so this is a second name for the data rather than a copy
+            os.link(data_path, dest_path)
+        except OSError:
+            shutil.copyfile(data_path, dest_path)
+    except BaseException:
+        os.remove(marker)
+        raise
+    return info, dest_path
+
+
+def finish_upload(upload_id):
+    """Drop a committed upload's data, keeping a marker that answers repeated commits with a 409"""
+    upload_dir = os.path.join(UPLOAD_CONFIG['dir'], upload_id)
+    try:
+        with open(os.path.join(upload_dir, 'committed'), 'w'):
+            pass
+        os.remove(os.path.join(upload_dir, 'data.part'))
+        shutil.rmtree(os.path.join(upload_dir, 'chunks'), ignore_errors=True)
+        os.remove(os.path.join(upload_dir, 'committing'))
+    except OSError:
+        pass  # Aborted meanwhile; expire_abandoned_uploads() removes what is left
+
+
+def cancel_upload(upload_id):
+    """Undo complete_upload() after the row could not be created; the upload can be committed again.
+
+    The data file may still share its inode with the stored file (kept when
+    another row references the same content), so it gets a private copy
+    before chunks are accepted again; writing through the link would change
+    the stored file in place.
+    """
+    upload_dir = os.path.join(UPLOAD_CONFIG['dir'], upload_id)
+    data_path = os.path.join(upload_dir, 'data.part')
+    try:
+        if os.stat(data_path).st_nlink > 1:
+            copy_path = os.path.join(upload_dir, f"data.part.{uuid.uuid4().hex}")
+            shutil.copyfile(data_path, copy_path)
+            os.replace(copy_path, data_path)
+    except FileNotFoundError:
+        pass  # Aborted meanwhile
+    except OSError as e:
+        # Left marked as committing: it takes no chunks (and no commit) until it expires
+        print(f"Error reopening upload {upload_id}: {e}")
+        return
+    try:
+        os.remove(os.path.join(upload_dir, 'committing'))
+    except OSError:
+        pass
+
+
+def abort_upload(upload_id):
+    """Discard an upload and everything received for it"""
+    shutil.rmtree(_upload_dir(upload_id), ignore_errors=True)
+
+
+def expire_abandoned_uploads(max_age=None, throttle=False):
+    """Delete partial uploads with no activity for max_age seconds; returns how many"""
+    global _last_expiry_run
+    if max_age is None:
+        max_age = UPLOAD_CONFIG['expire_seconds']
+    now = time.time()
+    if throttle and now - _last_expiry_run < 600:
+        return 0
+    _last_expiry_run = now
+
+    if not os.path.isdir(UPLOAD_CONFIG['dir']):
+        return 0
+
+    removed = 0
+    for entry in os.scandir(UPLOAD_CONFIG['dir']):
+        if not entry.is_dir() or not UPLOAD_ID_PATTERN.match(entry.name):
+            continue
+        try:
+            # data.part's mtime moves with every chunk written
+            last_activity = os.path.getmtime(os.path.join(entry.path, 'data.part'))
+        except OSError:
+            last_activity = entry.stat().st_mtime
+        if now - last_activity > max_age:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
@@ -12,5 +12,130 @@ DB_CONFIG = {
     'database': 'ntvhs_portal'
 }
 
+# Storage backend: 'mysql' (DB_CONFIG) or 'sqlite' (SQLITE_CONFIG, a single file; for one node and tests)
+DB_BACKEND = 'mysql'
+
+SQLITE_CONFIG = {
+    'path': 'data/ntvhs_portal.sqlite3',
+    'busy_timeout': 5.0,          # Seconds a writer waits for the write lock before giving up
+    'synchronous': 'NORMAL',      # Safe with WAL: a power loss can only drop the last commits
+    'cache_size_kb': 64 * 1024,   # Page cache per connection
+    'mmap_size': 256 * 1024 * 1024
+}
+
+# Connection pool settings (MySQL)
+DB_POOL_CONFIG = {
+    'pool_size': 10,             # Max connections held open per process
+    'checkout_timeout': 5.0,     # Seconds to wait for a free connection
+    'recycle_seconds': 1800,     # Reconnect connections older than this
+    'validation_interval': 30    # Ping idle connections unused for this many seconds
+}
+
+# Listing cache settings ('off', 'local' for in-process, 'shared' for all workers on this host;
+# server.py uses 'shared' instead of 'local' when it runs more than one worker)
+CACHE_CONFIG = {
+    'mode': 'local',
+    'ttl_seconds': 300,               # Entries also expire after this many seconds
+    'max_bytes': 32 * 1024 * 1024,    # Memory (or disk, for 'shared') cap before LRU eviction
+    'shared_dir': '.cache/listings'   # Directory used by the 'shared' mode
+}
+
+# Listing pagination (rows per page, and the most a client may request)
+PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# Resumable chunked uploads (videos and library PDFs)
+UPLOAD_CONFIG = {
+    'dir': '.uploads',                           # Partial uploads; keep on the same disk as static/
+    'chunk_size': 8 * 1024 * 1024,               # Chunk size suggested to clients
+    'max_chunk_size': 32 * 1024 * 1024,          # Largest chunk accepted in one request
+    'max_upload_size': 20 * 1024 * 1024 * 1024,  # Largest file accepted
+    'expire_seconds': 24 * 60 * 60,              # Abandoned partial uploads are deleted after this
+    'require_checksum': False                    # Reject chunks without an Upload-Checksum header
+}
+
+# Browser cache lifetime for videos, PDFs and covers (file names never get reused)
+MEDIA_CACHE_SECONDS = 365 * 24 * 60 * 60
+
+# Background job queue (run the worker with: python job_queue.py)
+JOB_QUEUE_CONFIG = {
+    'path': '.jobs/jobs.sqlite3',   # Local SQLite file holding queued/finished jobs
+    'workers': 2,                   # Worker processes
+    'max_attempts': 3,              # Tries before a job is marked failed
+    'poll_interval': 1.0,           # Seconds between checks for new jobs
+    'stale_seconds': 3600           # Running jobs not updated for this long are retried
+}
+
+# Deferred deletion of media files (run the reaper with: python trash_reaper.py)
+TRASH_CONFIG = {
+    'retention_seconds': 24 * 60 * 60,          # Deleted videos/books can be restored for this long
+    'batch_size': 50,                           # Trash entries purged per batch
+    'max_bytes_per_second': 256 * 1024 * 1024,  # Purge rate limit, so unlinks do not stall the disk
+    'truncate_step': 1024 * 1024 * 1024,        # Big files are shrunk in steps of this size before unlink
+    'poll_interval': 60                         # Seconds between checks for expired entries
+}
+
+# Media storage consistency scanner (python storage_scanner.py)
+SCANNER_CONFIG = {
+    'manifest_path': '.cache/storage_manifest.json',  # Directory listings kept between runs
+    'workers': 8,                                     # Threads walking directories / hashing files
+    'grace_seconds': 60 * 60                          # Newer files may still be mid-upload, never orphans
+}
+
+# Bulk import of quizzes/activities/worksheets (python bulk_import.py)
+IMPORT_CONFIG = {
+    'chunk_size': 1000,          # Rows inserted per transaction
+    'max_reported_errors': 1000  # Row errors listed in the report (all are counted)
+}
+
+# Fingerprinted CSS/JS/images (rebuilt at startup when a source changes, or: python static_assets.py)
+STATIC_CONFIG = {
+    'fingerprint': True,                    # Rewrite url_for('static') to content-hashed names
+    'build_dir': 'dist',                    # Inside the static folder
+    'cache_seconds': 365 * 24 * 60 * 60     # Browser cache lifetime of fingerprinted files
+}
+
+# On-the-fly compression of HTML/JSON responses (media and precompressed assets are passed through)
+COMPRESSION_CONFIG = {
+    'enabled': True,
+    'min_size': 1024,                       # Smaller bodies are sent as they are
+    'encodings': ('br', 'zstd', 'gzip'),    # Server preference when the client accepts several
+    'gzip_level': 6,                        # 1 (fastest) - 9 (smallest)
+    'brotli_quality': 4,                    # 0 - 11; above ~5 costs more CPU than it saves in transfer
+    'zstd_level': 3                         # 1 - 19
+}
+
+# Production server (python server.py): prefork workers sharing one listening socket
+SERVER_CONFIG = {
+    'host': '0.0.0.0',
+    'port': 8000,
+    'workers': 0,                           # 0 = one per CPU core
+    'threaded': True,                       # Handle each request of a worker on its own thread
+    'graceful_timeout': 30,                 # Seconds a stopping worker gets to finish in-flight requests
+    'jinja_cache_dir': '.cache/jinja'       # Compiled templates, shared by the workers
+}
+
+# Per-request DB instrumentation: Server-Timing header and Prometheus histograms at /metrics
+METRICS_CONFIG = {
+    'enabled': True,
+    'server_timing': True,                  # Send query count, rows and DB time in a Server-Timing header
+    'allow_from': ('127.0.0.1', '::1'),     # Addresses that may scrape /metrics without an admin session
+    'buckets': (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),  # Seconds
+    'query_count_buckets': (0, 1, 2, 5, 10, 20, 50, 100, 250),
+    'shared_dir': '.cache/metrics',         # Per-worker snapshots summed by /metrics ('' = this process only)
+    'flush_seconds': 5                      # How often a worker rewrites its snapshot
+}
+
+# Slow-query log (JSON lines) with EXPLAIN of each new slow SELECT shape; top offenders at /admin/slow_queries
+SLOW_QUERY_CONFIG = {
+    'enabled': True,
+    'threshold_ms': 100,                    # Statements taking at least this long (incl. reading rows) are logged
+    'log_path': '.logs/slow_queries.log',
+    'max_bytes': 10 * 1024 * 1024,          # Rotate the log at this size
+    'backup_count': 5,                      # Rotated files kept (and read by the admin page)
+    'explain': True,                        # Capture the plan once per query shape and process
+    'max_param_length': 200                 # Longer parameter values are cut in the log
+}
+
 # Flask configuration
 SECRET_KEY = 'your-secret-key-here'  # Change this to a secure secret key
\ No newline at end of file
@@ -1,87 +1,559 @@
-import mysql.connector
-from mysql.connector import Error
 from flask import flash
-from config import DB_CONFIG
+from config import DB_BACKEND, PAGE_SIZE, MAX_PAGE_SIZE, TRASH_CONFIG
+from db_pool import Error, get_pool
+from db_metrics import instrument
+import listing_cache
+from listing_rows import LISTING_COLUMNS, AssignmentRow, listing_columns, make_rows
+from migrations import ASSIGNMENT_TABLES, migrate
+from blob_store import blob_path, blob_size, remove_blob
 import os
+import json
+import base64
+import re
+import time
+from datetime import datetime
 
 
 def get_db_connection():
-    """Get database connection"""
+    """Get database connection from the pool (close() returns it to the pool)"""
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
+        started = time.perf_counter()
+        return instrument(get_pool().get_connection(), started)
     except Error as e:
-        print(f"Error connecting to MySQL: {e}")
+        print(f"Error connecting to the database: {e}")
         return None
 
 
 def init_database():
-    """Initialize database and create tables"""
-    try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='1234'
-        )
-        cursor = connection.cursor()
-
-        # Create database if it doesn't exist
-        cursor.execute("CREATE DATABASE IF NOT EXISTS ntvhs_portal")
-        cursor.execute("USE ntvhs_portal")
-
-        # Create tables for quizzes, activities, and worksheets (same structure)
-        tables = ['quizzes', 'activities', 'worksheets']
-        for table in tables:
-            create_table_query = f"""
-            CREATE TABLE IF NOT EXISTS {table} (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(255) NOT NULL,
-                grade VARCHAR(50) NOT NULL,
-                end_date DATETIME NULL,
-                upload_link TEXT NOT NULL,
-                professor VARCHAR(255) NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP NULL ON UPDATE CURRENT_TIMESTAMP
-            )
-            """
-            cursor.execute(create_table_query)
-
-        # Create videos table
-        create_videos_table = """
-        CREATE TABLE IF NOT EXISTS videos (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            title VARCHAR(255) NOT NULL,
-            description TEXT NULL,
-            grade VARCHAR(50) NOT NULL,
-            filename VARCHAR(255) NOT NULL,
-            file_size BIGINT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP NULL ON UPDATE CURRENT_TIMESTAMP
-        )
-        """
-        cursor.execute(create_videos_table)
-
-        # Create library table
-        create_library_table = """
-        CREATE TABLE IF NOT EXISTS library (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            title VARCHAR(255) NOT NULL,
-            description TEXT NULL,
-            grade VARCHAR(50) NOT NULL,
-            pdf_filename VARCHAR(255) NOT NULL,
-            picture_filename VARCHAR(255) NULL,
-            file_size BIGINT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP NULL ON UPDATE CURRENT_TIMESTAMP
-        )
-        """
-        cursor.execute(create_library_table)
+    """Bring the database schema up to date (no-op when already current)"""
+    try:
+        version = migrate()
+        print(f"Database schema is at version {version}")
+    except Error as e:
+        print(f"Error initializing database: {e}")
 
-        connection.commit()
-        print("Database and tables created successfully!")
+
+# ==================== CONTENT COUNTS ====================
+# Tables counted on the student homepage, mapped to the template's key names
+COUNTED_TABLES = {
+    'quizzes': 'quizzes',
+    'activities': 'activities',
+    'worksheets': 'worksheets',
+    'videos': 'videos',
+    'library': 'books'
+}
+
+
+def _get_grade(cursor, table_name, item_id):
+    """Get the current grade of a row, locking it until the caller's transaction ends (keeps counters in sync)"""
+    cursor.execute(f"SELECT grade FROM {table_name} WHERE id = %s FOR UPDATE", (item_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return row['grade'] if isinstance(row, dict) else row[0]
+
+
+def _bump_count(cursor, table_name, grade, delta):
+    """Adjust the maintained counter for a table/grade inside the caller's transaction"""
+    if grade is None:
+        return
+    cursor.execute("""
+    INSERT INTO content_counts (table_name, grade, item_count) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE item_count = GREATEST(item_count + %s, 0)
+    """, (table_name, grade, max(delta, 0), delta))
+
+
+def _move_count(cursor, table_name, old_grade, new_grade):
+    """Move one row's count from its old grade to its new grade"""
+    if old_grade is not None and old_grade != new_grade:
+        _bump_count(cursor, table_name, old_grade, -1)
+        _bump_count(cursor, table_name, new_grade, 1)
+
+
+def get_content_counts(grade=None, by_grade=False):
+    """Get item counts for every content type in a single query.
+
+    Returns {'quizzes': n, 'activities': n, 'worksheets': n, 'videos': n, 'books': n}.
+    With grade, only that grade is counted; with by_grade, each value is a
+    {grade: n} dict instead of a total.
+    """
+    counts = {key: ({} if by_grade else 0) for key in COUNTED_TABLES.values()}
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor()
+            if grade:
+                cursor.execute("SELECT table_name, grade, item_count FROM content_counts WHERE grade = %s",
+                               (grade,))
+            else:
+                cursor.execute("SELECT table_name, grade, item_count FROM content_counts")
+
+            for table_name, row_grade, item_count in cursor.fetchall():
+                key = COUNTED_TABLES.get(table_name)
+                if key is None:
+                    continue
+                if by_grade:
+                    counts[key][row_grade] = item_count
+                else:
+                    counts[key] += item_count
 
     except Error as e:
-        print(f"Error initializing database: {e}")
+        print(f"Error fetching content counts: {e}")
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    return counts
+
+
+# ==================== MEDIA REFERENCE COUNTS ====================
+def _add_blob_ref(cursor, kind, filename, size=None):
+    """Count one more row using a stored file, inside the caller's transaction"""
+    if not filename:
+        return
+    cursor.execute("""
+    INSERT INTO blobs (kind, filename, size, refcount) VALUES (%s, %s, %s, 1)
+    ON DUPLICATE KEY UPDATE refcount = refcount + 1
+    """, (kind, filename, size))
+
+
+def _release_blob_ref(cursor, kind, filename):
+    """Drop one reference to a stored file; True when nothing uses the file any more"""
+    if not filename:
+        return False
+    cursor.execute("UPDATE blobs SET refcount = refcount - 1 WHERE kind = %s AND filename = %s",
+                   (kind, filename))
+    if cursor.rowcount == 0:
+        return True  # Not tracked, so this row was its only user
+
+    # The UPDATE holds the row lock, so this read cannot race another add/delete.
+    # An unused row stays (at 0) until the file is purged: purging locks it to check for new references.
+    cursor.execute("SELECT refcount FROM blobs WHERE kind = %s AND filename = %s", (kind, filename))
+    row = cursor.fetchone()
+    refcount = row['refcount'] if isinstance(row, dict) else row[0]
+    return refcount <= 0
+
+
+def reference_blob(kind, filename, size, place):
+    """Count one more reference to a stored file; place() puts the file there if it is missing.
+
+    place() runs with the file's blobs row locked, so a purge of the same
+    file (detach_unused_file) either happens first, and place() stores a new
+    copy, or sees this reference and leaves the file alone. Returns whether
+    place() created the file, or None on a database error.
+    """
+    created = None
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor()
+            _add_blob_ref(cursor, kind, filename, size)
+            created = place()
+            connection.commit()
+
+    except Error as e:
+        created = None
+        print(f"Error referencing stored file: {e}")
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    return created
+
+
+def release_blob(kind, filename):
+    """Give back the reference save_stream()/adopt_file() took, when no row was created with it.
+
+    The file is removed if nothing else uses it, while its blobs row is still
+    locked, so a concurrent upload of the same content cannot lose it.
+    """
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor()
+            if _release_blob_ref(cursor, kind, filename):
+                remove_blob(kind, filename)
+                cursor.execute("DELETE FROM blobs WHERE kind = %s AND filename = %s", (kind, filename))
+            connection.commit()
+            return True
+
+    except (Error, OSError) as e:
+        print(f"Error releasing stored file: {e}")
+        return False
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+# ==================== TRASH ====================
+# Deleting a video or book removes its row at once; the files are listed in
+# the trash table and unlinked later by trash_reaper.py, after
+# TRASH_CONFIG['retention_seconds'], during which the delete can be undone.
+
+# Tracked files of each trashable table: (blob kind, filename column, size column)
+TRASHED_TABLES = {
+    'videos': [('videos', 'filename', 'file_size')],
+    'library': [('pdfs', 'pdf_filename', 'file_size'), ('pictures', 'picture_filename', None)]
+}
+
+
+def _release_row_files(cursor, table_name, row):
+    """Drop a deleted row's file references; returns the (kind, filename, size) files now unused.
+
+    Files still shared with another row are left alone.
+    """
+    files = []
+    if table_name == 'videos':
+        if _release_blob_ref(cursor, 'videos', row['filename']):
+            files.append(('videos', row['filename'], row['file_size']))
+        return files
+
+    if _release_blob_ref(cursor, 'pdfs', row['pdf_filename']):
+        files.append(('pdfs', row['pdf_filename'], row['file_size']))
+    # Cover variants are named after the cover, so they go with it
+    if _release_blob_ref(cursor, 'pictures', row['picture_filename']):
+        for picture in (row['picture_filename'], row['cover_thumb'], row['cover_webp']):
+            if picture:
+                files.append(('pictures', picture, blob_size('pictures', picture)))
+    return files
+
+
+def _move_to_trash(cursor, table_name, row, files):
+    """Record a deleted row and its now-unused files, inside the caller's transaction"""
+    cursor.execute("""
+    INSERT INTO trash (table_name, item_id, title, row_data, files, bytes, purge_after)
+    VALUES (%s, %s, %s, %s, %s, %s, NOW() + INTERVAL %s SECOND)
+    """, (
+        table_name,
+        row['id'],
+        row.get('title'),
+        json.dumps(row, default=str),
+        json.dumps(files),
+        sum(size or 0 for _, _, size in files),
+        TRASH_CONFIG['retention_seconds']
+    ))
+
+
+def restore_from_trash(trash_id):
+    """Undo a delete whose files have not been purged yet; returns the table name or False"""
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("SELECT table_name, row_data FROM trash WHERE id = %s AND status = 'pending' FOR UPDATE",
+                           (trash_id,))
+            entry = cursor.fetchone()
+            if not entry or entry['table_name'] not in TRASHED_TABLES:
+                connection.rollback()
+                return False
+
+            table_name = entry['table_name']
+            row = json.loads(entry['row_data'])
+            columns = ', '.join(row)
+            placeholders = ', '.join(['%s'] * len(row))
+            cursor.execute(f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})", tuple(row.values()))
+            _bump_count(cursor, table_name, row['grade'], 1)
+            for kind, column, size_column in TRASHED_TABLES[table_name]:
+                _add_blob_ref(cursor, kind, row[column], row[size_column] if size_column else None)
+            cursor.execute("DELETE FROM trash WHERE id = %s", (trash_id,))
+
+            connection.commit()
+            listing_cache.invalidate(table_name)
+            return table_name
+
+    except Error as e:
+        print(f"Error restoring from trash: {e}")
+        return False
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def _file_in_use(cursor, kind, filename):
+    """True if a file queued for purging has been referenced again (e.g. re-uploaded).
+
+    Locks the file's blobs row until the caller's transaction ends.
+    """
+    cursor.execute("SELECT refcount FROM blobs WHERE kind = %s AND filename = %s FOR UPDATE", (kind, filename))
+    blob = cursor.fetchone()
+    if blob and blob['refcount'] > 0:
+        return True
+    if kind == 'pictures':
+        cursor.execute("SELECT 1 FROM library WHERE cover_thumb = %s OR cover_webp = %s LIMIT 1",
+                       (filename, filename))
+        return cursor.fetchone() is not None
+    return False
+
+
+def claim_due_trash(limit):
+    """Mark expired trash entries as purging; returns [(trash_id, files to unlink)].
+
+    Entries left in 'purging' by an interrupted reaper are returned again.
+    """
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("""
+            SELECT id, files FROM trash
+            WHERE status = 'purging' OR (status = 'pending' AND purge_after <= NOW())
+            ORDER BY purge_after
+            LIMIT %s
+            FOR UPDATE
+            """, (limit,))
+            entries = cursor.fetchall()
+
+            claimed = []
+            for entry in entries:
+                files = [(kind, filename, size) for kind, filename, size in json.loads(entry['files'])
+                         if not _file_in_use(cursor, kind, filename)]
+                claimed.append((entry['id'], files))
+
+            if claimed:
+                ids = [trash_id for trash_id, _ in claimed]
+                cursor.execute(f"UPDATE trash SET status = 'purging' WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                               tuple(ids))
+            connection.commit()
+            return claimed
+
+    except Error as e:
+        print(f"Error claiming trash: {e}")
+        return None
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def detach_unused_file(kind, filename, purge_path):
+    """Move a file claimed for purging to purge_path, unless it has been referenced again since.
+
+    The check and the move happen with the file's blobs row locked (see
+    reference_blob), and the row goes with the file. Returns True when the
+    file was moved or is already gone, False when it is in use again, None
+    on a database error.
+    """
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor(dictionary=True)
+            if _file_in_use(cursor, kind, filename):
+                connection.rollback()
+                return False
+            path = blob_path(kind, filename)
+            if os.path.exists(path):
+                os.replace(path, purge_path)
+            cursor.execute("DELETE FROM blobs WHERE kind = %s AND filename = %s", (kind, filename))
+            connection.commit()
+            return True
+
+    except (Error, OSError) as e:
+        print(f"Error detaching {kind}/{filename}: {e}")
+        return None
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def finish_trash(trash_id):
+    """Forget a trash entry once its files are gone"""
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor()
+            cursor.execute("DELETE FROM trash WHERE id = %s", (trash_id,))
+            connection.commit()
+            return True
+
+    except Error as e:
+        print(f"Error finishing trash entry: {e}")
+        return False
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def get_trash_stats(limit=50):
+    """Pending/due/purging counts and bytes, plus the most recent entries"""
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("""
+            SELECT status, COUNT(*) AS items, COALESCE(SUM(bytes), 0) AS bytes,
+                   COALESCE(SUM(purge_after <= NOW()), 0) AS due_items,
+                   COALESCE(SUM(CASE WHEN purge_after <= NOW() THEN bytes ELSE 0 END), 0) AS due_bytes,
+                   MIN(deleted_at) AS oldest
+            FROM trash GROUP BY status
+            """)
+            by_status = {row['status']: row for row in cursor.fetchall()}
+            pending = by_status.get('pending', {})
+            purging = by_status.get('purging', {})
+
+            cursor.execute("""
+            SELECT id, table_name, item_id, title, bytes, status, deleted_at, purge_after
+            FROM trash ORDER BY id DESC LIMIT %s
+            """, (limit,))
+            recent = cursor.fetchall()
+
+            return {
+                'pending_items': int(pending.get('items', 0)),
+                'pending_bytes': int(pending.get('bytes', 0)),
+                'due_items': int(pending.get('due_items', 0)),
+                'due_bytes': int(pending.get('due_bytes', 0)),
+                'purging_items': int(purging.get('items', 0)),
+                'purging_bytes': int(purging.get('bytes', 0)),
+                'oldest_deleted_at': pending.get('oldest'),
+                'retention_seconds': TRASH_CONFIG['retention_seconds'],
+                'recent': recent
+            }
+
+    except Error as e:
+        print(f"Error reading trash stats: {e}")
+        return None
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def trash_orphan_files(files):
+    """Queue files that no row references for purging, as one trash entry; returns its id"""
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor()
+            files = [list(f) for f in files]
+            cursor.execute("""
+            INSERT INTO trash (table_name, item_id, title, row_data, files, bytes, purge_after)
+            VALUES ('files', 0, %s, '{}', %s, %s, NOW() + INTERVAL %s SECOND)
+            """, (
+                f"{len(files)} orphaned files",
+                json.dumps(files),
+                sum(size or 0 for _, _, size in files),
+                TRASH_CONFIG['retention_seconds']
+            ))
+            connection.commit()
+            return cursor.lastrowid
+
+    except Error as e:
+        print(f"Error trashing orphaned files: {e}")
+        return False
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+# ==================== STORAGE CONSISTENCY ====================
+# Media columns per table: (blob kind, filename column, recorded size column)
+MEDIA_COLUMNS = {
+    'videos': [('videos', 'filename', 'file_size')],
+    'library': [('pdfs', 'pdf_filename', 'file_size'), ('pictures', 'picture_filename', None),
+                ('pictures', 'cover_thumb', None), ('pictures', 'cover_webp', None)]
+}
+
+
+def get_media_references():
+    """Every media file the database points at, for storage_scanner.py.
+
+    Returns {'rows': [{table, id, column, kind, filename, size}], 'trashed': [(kind, filename)]}
+    where size is the recorded file size (None when the table does not store one).
+    """
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor(dictionary=True)
+            rows = []
+            for table_name, columns in MEDIA_COLUMNS.items():
+                names = {column for _, column, _ in columns} | {size for _, _, size in columns if size}
+                cursor.execute(f"SELECT id, {', '.join(sorted(names))} FROM {table_name}")
+                for row in cursor.fetchall():
+                    for kind, column, size_column in columns:
+                        if row[column]:
+                            rows.append({
+                                'table': table_name,
+                                'id': row['id'],
+                                'column': column,
+                                'kind': kind,
+                                'filename': row[column],
+                                'size': row[size_column] if size_column else None
+                            })
+
+            # Files waiting in the trash are expected to exist until the reaper removes them
+            cursor.execute("SELECT files FROM trash")
+            trashed = [(kind, filename) for entry in cursor.fetchall()
+                       for kind, filename, _ in json.loads(entry['files'])]
+            return {'rows': rows, 'trashed': trashed}
+
+    except Error as e:
+        print(f"Error reading media references: {e}")
+        return None
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def repair_media_rows(missing, size_mismatches):
+    """Fix rows that disagree with the disk; returns counts of what was changed.
+
+    Videos and books whose main file is gone are deleted (through the trash,
+    so it can be undone); a missing cover clears the cover columns, a missing
+    cover variant clears just the variants, and wrong sizes are corrected.
+    """
+    repaired = {'deleted': 0, 'covers_cleared': 0, 'variants_cleared': 0, 'sizes_fixed': 0}
+
+    main_files = [ref for ref in missing if ref['column'] in ('filename', 'pdf_filename')]
+    for ref in main_files:
+        delete = delete_video_from_db if ref['table'] == 'videos' else delete_library_book_from_db
+        if delete(ref['id']):
+            repaired['deleted'] += 1
+    deleted = {(ref['table'], ref['id']) for ref in main_files}
+
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor()
+            for ref in missing:
+                if (ref['table'], ref['id']) in deleted:
+                    continue
+                if ref['column'] == 'picture_filename':
+                    cursor.execute("""
+                    UPDATE library
+                    SET picture_filename = NULL, cover_thumb = NULL, cover_webp = NULL, cover_placeholder = NULL
+                    WHERE id = %s AND picture_filename = %s
+                    """, (ref['id'], ref['filename']))
+                    if cursor.rowcount:
+                        _release_blob_ref(cursor, 'pictures', ref['filename'])
+                        repaired['covers_cleared'] += 1
+                elif ref['column'] in ('cover_thumb', 'cover_webp'):
+                    # The listing then falls back to the original cover
+                    cursor.execute(f"UPDATE library SET cover_thumb = NULL, cover_webp = NULL "
+                                   f"WHERE id = %s AND {ref['column']} = %s", (ref['id'], ref['filename']))
+                    repaired['variants_cleared'] += cursor.rowcount
+
+            for ref in size_mismatches:
+                if (ref['table'], ref['id']) in deleted:
+                    continue
+                cursor.execute(f"UPDATE {ref['table']} SET file_size = %s WHERE id = %s",
+                               (ref['actual'], ref['id']))
+                repaired['sizes_fixed'] += cursor.rowcount
+
+            connection.commit()
+            listing_cache.invalidate('videos')
+            listing_cache.invalidate('library')
+            return repaired
+
+    except Error as e:
+        print(f"Error repairing media rows: {e}")
+        return None
     finally:
         if connection and connection.is_connected():
             cursor.close()
@@ -90,25 +562,24 @@ def init_database():
 
 # ==================== GENERIC DATABASE FUNCTIONS ====================
 def get_all_items(table_name):
-    """Generic function to get all items from any table"""
+    """Generic function to get all items from any table (cached until the table changes)"""
+    items = listing_cache.get_or_load([table_name], f"all:{table_name}",
+                                      lambda: _load_all_items(table_name))
+    return items if items is not None else []
+
+
+def _load_all_items(table_name):
+    """Query all items from a table (returns None on error so it is not cached)"""
     items = []
     try:
         connection = get_db_connection()
         if connection:
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute(f"SELECT * FROM {table_name} ORDER BY created_at DESC")
-            items = cursor.fetchall()
-
-            # Format datetime fields for display
-            for item in items:
-                if item['created_at']:
-                    item['created_at'] = item['created_at'].strftime("%Y-%m-%d %H:%M:%S")
-                if item.get('updated_at'):
-                    item['updated_at'] = item['updated_at'].strftime("%Y-%m-%d %H:%M:%S")
-                if item.get('end_date'):
-                    item['end_date'] = item['end_date'].strftime("%Y-%m-%dT%H:%M")
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT {listing_columns(table_name)} FROM {table_name} ORDER BY created_at DESC")
+            items = make_rows(table_name, cursor.fetchall())
 
     except Error as e:
+        items = None
         print(f"Error fetching {table_name}: {e}")
         flash(f'Error loading {table_name} from database', 'error')
     finally:
@@ -119,6 +590,16 @@ def get_all_items(table_name):
     return items
 
 
+def _form_datetime(value):
+    """A datetime-local form value ('2024-05-01T14:30') as a datetime; None when empty"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return value  # Left for the database to reject
+
+
 def add_item_to_db(table_name, item_data):
     """Generic function to add item to any table"""
     try:
@@ -132,7 +613,7 @@ def add_item_to_db(table_name, item_data):
             """
 
             # Handle optional fields
-            end_date = item_data['end_date'] if item_data['end_date'] else None
+            end_date = _form_datetime(item_data['end_date'])
             professor = item_data['professor'] if item_data['professor'] else None
 
             cursor.execute(insert_query, (
@@ -142,8 +623,10 @@ def add_item_to_db(table_name, item_data):
                 item_data['upload_link'],
                 professor
             ))
+            _bump_count(cursor, table_name, item_data['grade'], 1)
 
             connection.commit()
+            listing_cache.invalidate(table_name)
             return True
 
     except Error as e:
@@ -155,6 +638,35 @@ def add_item_to_db(table_name, item_data):
             connection.close()
 
 
+def bulk_insert_items(table_name, rows):
+    """Insert many (name, grade, end_date, upload_link, professor) rows in one transaction.
+
+    Returns the number of rows inserted; raises Error so the caller can
+    report which rows failed.
+    """
+    started = time.perf_counter()
+    connection = instrument(get_pool().get_connection(), started)
+    cursor = connection.cursor()
+    try:
+        cursor.executemany(f"""
+        INSERT INTO {table_name} (name, grade, end_date, upload_link, professor)
+        VALUES (%s, %s, %s, %s, %s)
+        """, rows)
+
+        per_grade = {}
+        for row in rows:
+            per_grade[row[1]] = per_grade.get(row[1], 0) + 1
+        for grade, count in per_grade.items():
+            _bump_count(cursor, table_name, grade, count)
+
+        connection.commit()
+        listing_cache.invalidate(table_name)
+        return len(rows)
+    finally:
+        cursor.close()
+        connection.close()
+
+
 def get_item_by_id(table_name, item_id):
     """Generic function to get single item by ID from any table"""
     item = None
@@ -184,6 +696,7 @@ def update_item_in_db(table_name, item_id, item_data):
         connection = get_db_connection()
         if connection:
             cursor = connection.cursor()
+            old_grade = _get_grade(cursor, table_name, item_id)
 
             update_query = f"""
             UPDATE {table_name} 
@@ -192,7 +705,7 @@ def update_item_in_db(table_name, item_id, item_data):
             """
 
             # Handle optional fields
-            end_date = item_data['end_date'] if item_data['end_date'] else None
+            end_date = _form_datetime(item_data['end_date'])
             professor = item_data['professor'] if item_data['professor'] else None
 
             cursor.execute(update_query, (
@@ -203,8 +716,10 @@ def update_item_in_db(table_name, item_id, item_data):
                 professor,
                 item_id
             ))
+            _move_count(cursor, table_name, old_grade, item_data['grade'])
 
             connection.commit()
+            listing_cache.invalidate(table_name)
             return True
 
     except Error as e:
@@ -222,8 +737,12 @@ def delete_item_from_db(table_name, item_id):
         connection = get_db_connection()
         if connection:
             cursor = connection.cursor()
+            old_grade = _get_grade(cursor, table_name, item_id)
             cursor.execute(f"DELETE FROM {table_name} WHERE id = %s", (item_id,))
+            if cursor.rowcount:
+                _bump_count(cursor, table_name, old_grade, -1)
             connection.commit()
+            listing_cache.invalidate(table_name)
             return True
 
     except Error as e:
@@ -236,25 +755,558 @@ def delete_item_from_db(table_name, item_id):
 
 
 def get_items_by_grade(table_name, grade):
-    """Generic function to get items filtered by grade (for student access)"""
+    """Generic function to get items filtered by grade (for student access, cached)"""
+    items = listing_cache.get_or_load([table_name], f"grade:{table_name}:{grade}",
+                                      lambda: _load_items_by_grade(table_name, grade))
+    return items if items is not None else []
+
+
+def _load_items_by_grade(table_name, grade):
+    """Query items filtered by grade (returns None on error so it is not cached)"""
     items = []
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT {listing_columns(table_name)} FROM {table_name} "
+                           f"WHERE grade = %s ORDER BY created_at DESC", (grade,))
+            items = make_rows(table_name, cursor.fetchall())
+
+    except Error as e:
+        items = None
+        print(f"Error fetching {table_name} by grade: {e}")
+        flash(f'Error loading {table_name} from database', 'error')
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    return items
+
+
+# ==================== BULK OPERATIONS ====================
+# Each bulk operation is one set-based statement over "id IN (...)" inside a
+# single transaction, with the content counts adjusted in the same transaction.
+
+def _id_placeholders(ids):
+    return ', '.join(['%s'] * len(ids))
+
+
+def bulk_delete_items(table_name, ids):
+    """Delete many rows at once; returns how many were deleted, or False on error.
+
+    Video and book files go to the trash exactly like single deletes, so
+    the trash reaper removes them later, off the request path.
+    """
+    if not ids:
+        return 0
     try:
         connection = get_db_connection()
         if connection:
             cursor = connection.cursor(dictionary=True)
-            cursor.execute(f"SELECT * FROM {table_name} WHERE grade = %s ORDER BY created_at DESC", (grade,))
-            items = cursor.fetchall()
+            placeholders = _id_placeholders(ids)
 
-            # Format datetime fields for display
-            for item in items:
-                if item['created_at']:
-                    item['created_at'] = item['created_at'].strftime("%Y-%m-%d %H:%M:%S")
-                if item.get('end_date'):
-                    item['end_date'] = item['end_date'].strftime("%Y-%m-%dT%H:%M")
+            # Whole rows for videos/books so each delete can be undone from the trash
+            columns = '*' if table_name in TRASHED_TABLES else 'id, grade'
+            cursor.execute(f"SELECT {columns} FROM {table_name} WHERE id IN ({placeholders}) FOR UPDATE",
+                           tuple(ids))
+            rows = cursor.fetchall()
+            if not rows:
+                connection.rollback()
+                return 0
+
+            cursor.execute(f"DELETE FROM {table_name} WHERE id IN ({placeholders})", tuple(ids))
+
+            per_grade = {}
+            for row in rows:
+                per_grade[row['grade']] = per_grade.get(row['grade'], 0) + 1
+            for grade, count in per_grade.items():
+                _bump_count(cursor, table_name, grade, -count)
+
+            if table_name in TRASHED_TABLES:
+                for row in rows:
+                    _move_to_trash(cursor, table_name, row, _release_row_files(cursor, table_name, row))
+
+            connection.commit()
+            listing_cache.invalidate(table_name)
+            return len(rows)
 
     except Error as e:
-        print(f"Error fetching {table_name} by grade: {e}")
+        print(f"Error bulk deleting from {table_name}: {e}")
+        return False
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def bulk_update_grade(table_name, ids, grade):
+    """Move many rows to another grade; returns how many changed, or False on error"""
+    if not ids:
+        return 0
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor()
+            placeholders = _id_placeholders(ids)
+
+            cursor.execute(f"""
+            SELECT grade, COUNT(*) FROM {table_name}
+            WHERE id IN ({placeholders}) AND grade <> %s
+            GROUP BY grade
+            FOR UPDATE
+            """, (*ids, grade))
+            old_grades = cursor.fetchall()
+
+            cursor.execute(f"""
+            UPDATE {table_name} SET grade = %s, updated_at = CURRENT_TIMESTAMP
+            WHERE id IN ({placeholders}) AND grade <> %s
+            """, (grade, *ids, grade))
+            changed = cursor.rowcount
+
+            for old_grade, count in old_grades:
+                _bump_count(cursor, table_name, old_grade, -count)
+            if changed:
+                _bump_count(cursor, table_name, grade, changed)
+
+            connection.commit()
+            listing_cache.invalidate(table_name)
+            return changed
+
+    except Error as e:
+        print(f"Error bulk updating grade in {table_name}: {e}")
+        return False
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def bulk_extend_end_date(table_name, ids, days):
+    """Push the end_date of many quizzes/activities/worksheets back by days.
+
+    Rows without an end date are left open-ended. Returns how many changed,
+    or False on error.
+    """
+    if not ids:
+        return 0
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor()
+            cursor.execute(f"""
+            UPDATE {table_name} SET end_date = end_date + INTERVAL %s DAY, updated_at = CURRENT_TIMESTAMP
+            WHERE id IN ({_id_placeholders(ids)}) AND end_date IS NOT NULL
+            """, (days, *ids))
+            changed = cursor.rowcount
+
+            connection.commit()
+            listing_cache.invalidate(table_name)
+            return changed
+
+    except Error as e:
+        print(f"Error bulk extending end dates in {table_name}: {e}")
+        return False
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+# ==================== KEYSET PAGINATION ====================
+# Listing queries return listing_rows row objects with the dates left as
+# datetimes; templates format them with the datetime/date/due filters.
+
+def encode_page_cursor(created_at, item_id):
+    """Build an opaque "next page" token from the last row's (created_at, id)"""
+    raw = f"{created_at.strftime('%Y-%m-%d %H:%M:%S.%f')}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_page_cursor(cursor):
+    """Parse a page token back into (created_at, id); None if it is missing or invalid"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, item_id = raw.split('|')
+        return datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S.%f'), int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def clamp_page_size(page_size):
+    """Keep a requested page size between 1 and MAX_PAGE_SIZE"""
+    if not page_size:
+        return PAGE_SIZE
+    return max(1, min(int(page_size), MAX_PAGE_SIZE))
+
+
+def get_items_page(table_name, grade=None, title_query=None, cursor=None, page_size=None):
+    """Get one page of items, newest first, optionally filtered by grade or title.
+
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    Title searches are ranked by relevance, see search_items().
+    """
+    if title_query:
+        return search_items(table_name, title_query, grade=grade, cursor=cursor, page_size=page_size)
+
+    page_size = clamp_page_size(page_size)
+    key = f"page:{table_name}:{grade}:{cursor}:{page_size}"
+    page = listing_cache.get_or_load([table_name], key,
+                                     lambda: _load_items_page(table_name, grade, cursor, page_size))
+    return page if page is not None else ([], None)
+
+
+def _load_items_page(table_name, grade, cursor, page_size):
+    """Query one keyset page (returns None on error so it is not cached)"""
+    conditions = []
+    params = []
+    if grade:
+        conditions.append("grade = %s")
+        params.append(grade)
+    position = decode_page_cursor(cursor)
+    if position:
+        conditions.append("(created_at < %s OR (created_at = %s AND id < %s))")
+        params.extend([position[0], position[0], position[1]])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # Fetch one extra row to know whether a next page exists
+    params.append(page_size + 1)
+
+    page = ([], None)
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor_ = connection.cursor()
+            cursor_.execute(f"SELECT {listing_columns(table_name)} FROM {table_name} {where} "
+                            f"ORDER BY created_at DESC, id DESC LIMIT %s", tuple(params))
+            items = make_rows(table_name, cursor_.fetchall())
+
+            next_cursor = None
+            if len(items) > page_size:
+                items = items[:page_size]
+                next_cursor = encode_page_cursor(items[-1].created_at, items[-1].id)
+
+            page = (items, next_cursor)
+
+    except Error as e:
+        page = None
+        print(f"Error fetching {table_name} page: {e}")
         flash(f'Error loading {table_name} from database', 'error')
+    finally:
+        if connection and connection.is_connected():
+            cursor_.close()
+            connection.close()
+
+    return page
+
+
+def get_listing_item(table_name, item_id):
+    """Get one item as a listing row (the columns listings show); None if it does not exist"""
+    key = f"item:{table_name}:{item_id}"
+    return listing_cache.get_or_load([table_name], key, lambda: _load_listing_item(table_name, item_id))
+
+
+def _load_listing_item(table_name, item_id):
+    item = None
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor()
+            cursor.execute(f"SELECT {listing_columns(table_name)} FROM {table_name} WHERE id = %s", (item_id,))
+            rows = make_rows(table_name, cursor.fetchall())
+            item = rows[0] if rows else None
+
+    except Error as e:
+        print(f"Error fetching from {table_name}: {e}")
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    return item
+
+
+# ==================== ASSIGNMENT FEED ====================
+# Open quizzes, activities and worksheets in one list: the nearest deadline
+# first, then the assignments without a deadline (past-due ones stay on the
+# per-type pages). Every table contributes an indexed, LIMITed slice and the
+# slices are merged and ordered in one UNION ALL statement, so a page costs
+# one round trip whatever its position. Pages are keyset-paginated on
+# (undated, end_date, kind, id). What is open changes with the clock, not
+# only with writes, so cached pages are also keyed on the current period of
+# FEED_REFRESH_SECONDS.
+FEED_REFRESH_SECONDS = 60
+
+
+def encode_feed_cursor(item):
+    """Build the feed's "next page" token from the last row on a page"""
+    end_date = item.end_date.strftime('%Y-%m-%d %H:%M:%S.%f') if item.end_date else ''
+    raw = f"{int(item.end_date is None)}|{end_date}|{item.kind}|{item.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_feed_cursor(cursor):
+    """Parse a feed token into (undated, end_date, kind, id); None if it is missing or invalid"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        undated, end_date, kind, item_id = raw.split('|')
+        if kind not in ASSIGNMENT_TABLES or undated not in ('0', '1') or (undated == '0') != bool(end_date):
+            return None
+        return (int(undated), datetime.strptime(end_date, '%Y-%m-%d %H:%M:%S.%f') if end_date else None,
+                kind, int(item_id))
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _feed_slice(table_name, undated, grade, due_within, position, limit):
+    """One table's part of the feed as (sql, params); None when the cursor is already past it"""
+    conditions = []
+    params = []
+    if undated:
+        conditions.append("end_date IS NULL")
+    else:
+        conditions.append("end_date >= NOW()")
+        if due_within is not None:
+            conditions.append("end_date <= NOW() + INTERVAL %s DAY")
+            params.append(due_within)
+    if grade:
+        conditions.append("grade = %s")
+        params.append(grade)
+
+    if position:
+        after_undated, after_end_date, after_kind, after_id = position
+        if undated < after_undated:
+            return None
+        # Same part of the feed as the cursor: continue after it in (end_date, kind, id) order.
+        # kind is this slice's constant, so the comparison on it is settled here.
+        if undated == after_undated:
+            if undated and table_name < after_kind:
+                return None
+            if undated and table_name == after_kind:
+                conditions.append("id > %s")
+                params.append(after_id)
+            elif not undated and table_name < after_kind:
+                conditions.append("end_date > %s")
+                params.append(after_end_date)
+            elif not undated and table_name == after_kind:
+                conditions.append("(end_date > %s OR (end_date = %s AND id > %s))")
+                params.extend([after_end_date, after_end_date, after_id])
+            elif not undated:
+                conditions.append("end_date >= %s")
+                params.append(after_end_date)
+
+    params.append(limit)
+    order = "id" if undated else "end_date, id"
+    return f"""
+    SELECT * FROM (
+        SELECT '{table_name}' AS kind, {undated} AS undated, {listing_columns(table_name)}
+        FROM {table_name} WHERE {' AND '.join(conditions)}
+        ORDER BY {order} LIMIT %s
+    ) AS {table_name}_{'undated' if undated else 'dated'}""", params
+
+
+def get_assignment_feed(grade=None, due_within=None, cursor=None, page_size=None):
+    """Get one page of open assignments from all three tables, nearest deadline first.
+
+    due_within limits the feed to deadlines in the next N days (which leaves
+    out assignments without one). Returns (items, next_cursor) with
+    AssignmentRow items; item.kind is the table the row came from.
+    """
+    page_size = clamp_page_size(page_size)
+    if due_within is not None:
+        due_within = max(int(due_within), 0)
+    key = f"feed:{grade}:{due_within}:{cursor}:{page_size}:{int(time.time() // FEED_REFRESH_SECONDS)}"
+    page = listing_cache.get_or_load(ASSIGNMENT_TABLES, key,
+                                     lambda: _load_assignment_feed(grade, due_within, cursor, page_size))
+    return page if page is not None else ([], None)
+
+
+def _load_assignment_feed(grade, due_within, cursor, page_size):
+    """Query one feed page (returns None on error so it is not cached)"""
+    position = decode_feed_cursor(cursor)
+    slices = []
+    params = []
+    for undated in ((0,) if due_within is not None else (0, 1)):
+        for table_name in ASSIGNMENT_TABLES:
+            # Each slice needs at most one page (plus one row to detect a next page)
+            part = _feed_slice(table_name, undated, grade, due_within, position, page_size + 1)
+            if part:
+                slices.append(part[0])
+                params.extend(part[1])
+    if not slices:
+        return ([], None)
+    params.append(page_size + 1)
+
+    columns = ', '.join(('kind',) + LISTING_COLUMNS['quizzes'])
+    page = ([], None)
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor_ = connection.cursor()
+            cursor_.execute(f"SELECT {columns} FROM ({' UNION ALL '.join(slices)}) AS feed "
+                            f"ORDER BY undated, end_date, kind, id LIMIT %s", tuple(params))
+            items = list(map(AssignmentRow._make, cursor_.fetchall()))
+
+            next_cursor = None
+            if len(items) > page_size:
+                items = items[:page_size]
+                next_cursor = encode_feed_cursor(items[-1])
+
+            page = (items, next_cursor)
+
+    except Error as e:
+        page = None
+        print(f"Error fetching assignment feed: {e}")
+        flash('Error loading assignments from database', 'error')
+    finally:
+        if connection and connection.is_connected():
+            cursor_.close()
+            connection.close()
+
+    return page
+
+
+# ==================== FULL-TEXT SEARCH ====================
+# InnoDB ignores words shorter than innodb_ft_min_token_size (3) and its default
+# stopwords; requiring one of those with "+" would make every search return nothing.
+FULLTEXT_MIN_TOKEN = 3
+FULLTEXT_STOPWORDS = {
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for', 'from', 'how', 'i',
+    'in', 'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'what', 'when',
+    'where', 'who', 'will', 'with', 'und', 'www'
+}
+
+
+def _fulltext_terms(search_query):
+    """Split a search into words the FULLTEXT index can match (operators stripped)"""
+    words = re.findall(r'\w+', search_query.lower())
+    return [w for w in words if len(w) >= FULLTEXT_MIN_TOKEN and w not in FULLTEXT_STOPWORDS]
+
+
+def build_search_query(table_name, search_query, grade=None, mode='fulltext'):
+    """Build (sql, params) searching title and description, best matches first.
+
+    mode='fulltext' uses the FULLTEXT indexes (the FTS5 tables on SQLite); it
+    falls back to 'like' (a full scan) when the query has no indexable words,
+    e.g. only very short ones.
+    """
+    terms = _fulltext_terms(search_query)
+    columns = listing_columns(table_name)
+    grade_filter = "AND grade = %s" if grade else ""
+    params = []
+
+    if mode == 'fulltext' and terms and DB_BACKEND == 'sqlite':
+        # FTS5 table from migrations; bm25 is lower for better matches, title hits weigh double
+        match_query = ' '.join(f'"{term}"*' for term in terms)
+        sql = f"""
+        SELECT {', '.join(f't.{column}' for column in LISTING_COLUMNS[table_name])}
+        FROM {table_name}_fts JOIN {table_name} t ON t.id = {table_name}_fts.rowid
+        WHERE {table_name}_fts MATCH %s {grade_filter.replace('grade', 't.grade')}
+        ORDER BY bm25({table_name}_fts, 2.0, 1.0), t.created_at DESC, t.id DESC
+        """
+        params.append(match_query)
+        if grade:
+            params.append(grade)
+    elif mode == 'fulltext' and terms:
+        # Every word must appear; trailing * allows prefix matches while typing
+        boolean_query = ' '.join(f'+{term}*' for term in terms)
+        sql = f"""
+        SELECT {columns}
+        FROM {table_name}
+        WHERE MATCH(title, description) AGAINST (%s IN BOOLEAN MODE) {grade_filter}
+        ORDER BY (MATCH(title) AGAINST (%s IN BOOLEAN MODE) * 2
+                  + MATCH(title, description) AGAINST (%s IN BOOLEAN MODE)) DESC, created_at DESC, id DESC
+        """
+        params.append(boolean_query)
+        if grade:
+            params.append(grade)
+        params.extend([boolean_query, boolean_query])
+    else:
+        sql = f"""
+        SELECT {columns} FROM {table_name}
+        WHERE (title LIKE %s OR description LIKE %s) {grade_filter}
+        ORDER BY created_at DESC, id DESC
+        """
+        params.extend([f'%{search_query}%', f'%{search_query}%'])
+        if grade:
+            params.append(grade)
+    return sql, params
+
+
+def _encode_offset_cursor(offset):
+    return base64.urlsafe_b64encode(f"offset|{offset}".encode()).decode().rstrip('=')
+
+
+def _decode_offset_cursor(cursor):
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        label, offset = raw.split('|')
+        return max(int(offset), 0) if label == 'offset' else 0
+    except (ValueError, UnicodeDecodeError):
+        return 0
+
+
+def search_items(table_name, search_query, grade=None, cursor=None, page_size=None):
+    """Ranked search over title and description of videos or library books.
+
+    Returns (items, next_cursor) like get_items_page(). Relevance order has no
+    stable keyset, so search pages use an offset token instead.
+    """
+    page_size = clamp_page_size(page_size)
+    offset = _decode_offset_cursor(cursor)
+    key = f"search:{table_name}:{grade}:{search_query}:{offset}:{page_size}"
+    page = listing_cache.get_or_load([table_name], key,
+                                     lambda: _load_search_page(table_name, search_query, grade, offset, page_size))
+    return page if page is not None else ([], None)
+
+
+def search_all_items(table_name, search_query, grade=None):
+    """Every match of search_items(), best first, in one list (no page size cap)"""
+    key = f"search-all:{table_name}:{grade}:{search_query}"
+    items = listing_cache.get_or_load([table_name], key,
+                                      lambda: _load_all_search_results(table_name, search_query, grade))
+    return items if items is not None else []
+
+
+def _load_all_search_results(table_name, search_query, grade):
+    sql, params = build_search_query(table_name, search_query, grade)
+    return _run_search(table_name, sql, params)
+
+
+def _load_search_page(table_name, search_query, grade, offset, page_size):
+    """Query one page of search results (returns None on error so it is not cached)"""
+    sql, params = build_search_query(table_name, search_query, grade)
+    items = _run_search(table_name, sql + " LIMIT %s OFFSET %s", params + [page_size + 1, offset])
+    if items is None:
+        return None
+
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = _encode_offset_cursor(offset + page_size)
+    return items, next_cursor
+
+
+def _run_search(table_name, sql, params):
+    """Execute a search statement and wrap its rows (None on error)"""
+    items = []
+    try:
+        connection = get_db_connection()
+        if connection:
+            cursor = connection.cursor()
+            cursor.execute(sql, tuple(params))
+            items = make_rows(table_name, cursor.fetchall())
+
+    except Error as e:
+        items = None
+        print(f"Error searching {table_name}: {e}")
+        flash(f'Error searching {table_name}', 'error')
     finally:
         if connection and connection.is_connected():
             cursor.close()
@@ -263,9 +1315,32 @@ def get_items_by_grade(table_name, grade):
     return items
 
 
+def compare_search_latency(table_name, search_query, grade=None, runs=10):
+    """Time the FULLTEXT path against the old LIKE scan for one query (bypasses the cache)"""
+    results = {}
+    for mode in ('fulltext', 'like'):
+        sql, params = build_search_query(table_name, search_query, grade, mode=mode)
+        timings = []
+        rows = 0
+        for _ in range(runs):
+            started = time.perf_counter()
+            items = _run_search(table_name, sql, params)
+            timings.append((time.perf_counter() - started) * 1000)
+            rows = len(items or [])
+        timings.sort()
+        results[mode] = {
+            'rows': rows,
+            'median_ms': round(timings[len(timings) // 2], 3),
+            'min_ms': round(timings[0], 3),
+            'max_ms': round(timings[-1], 3)
+        }
+    results['fulltext_used'] = bool(_fulltext_terms(search_query))
+    return results
+
+
 # ==================== VIDEO-SPECIFIC FUNCTIONS ====================
 def add_video_to_db(video_data):
-    """Add new video to database"""
+    """Add new video to database (the file's reference was taken when it was stored)"""
     try:
         connection = get_db_connection()
         if connection:
@@ -285,8 +1360,10 @@ def add_video_to_db(video_data):
                 video_data['filename'],
                 video_data['file_size']
             ))
+            _bump_count(cursor, 'videos', video_data['grade'], 1)
 
             connection.commit()
+            listing_cache.invalidate('videos')
             return True
 
     except Error as e:
@@ -304,6 +1381,7 @@ def update_video_in_db(video_id, video_data):
         connection = get_db_connection()
         if connection:
             cursor = connection.cursor()
+            old_grade = _get_grade(cursor, 'videos', video_id)
 
             update_query = """
             UPDATE videos
@@ -319,8 +1397,10 @@ def update_video_in_db(video_id, video_data):
                 video_data['grade'],
                 video_id
             ))
+            _move_count(cursor, 'videos', old_grade, video_data['grade'])
 
             connection.commit()
+            listing_cache.invalidate('videos')
             return True
 
     except Error as e:
@@ -333,29 +1413,30 @@ def update_video_in_db(video_id, video_data):
 
 
 def delete_video_from_db(video_id):
-    """Delete video from database and file system"""
+    """Delete video from database; its file goes to the trash and is purged later"""
     try:
         connection = get_db_connection()
         if connection:
             cursor = connection.cursor(dictionary=True)
 
-            # Get video info first
-            cursor.execute("SELECT filename FROM videos WHERE id = %s", (video_id,))
+            # Get video info first (the whole row, so the delete can be undone), locked
+            # so a concurrent delete of the same video waits and then finds nothing
+            cursor.execute("SELECT * FROM videos WHERE id = %s FOR UPDATE", (video_id,))
             video = cursor.fetchone()
 
             if video:
                 # Delete from database
                 cursor.execute("DELETE FROM videos WHERE id = %s", (video_id,))
-                connection.commit()
+                if cursor.rowcount != 1:
+                    # Deleted by someone else: the counter, trash and file references are theirs
+                    connection.rollback()
+                    return False
+                _bump_count(cursor, 'videos', video['grade'], -1)
 
-                # Delete file from file system
-                try:
-                    file_path = os.path.join('static/videos', video['filename'])
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                except Exception as e:
-                    print(f"Error deleting video file: {e}")
+                _move_to_trash(cursor, 'videos', video, _release_row_files(cursor, 'videos', video))
 
+                connection.commit()
+                listing_cache.invalidate('videos')
                 return True
 
     except Error as e:
@@ -372,35 +1453,17 @@ def get_videos_by_grade(grade):
     return get_items_by_grade('videos', grade)
 
 
-def search_videos_by_title(title_query):
-    """Search videos by title"""
-    videos = []
-    try:
-        connection = get_db_connection()
-        if connection:
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM videos WHERE title LIKE %s ORDER BY created_at DESC", (f'%{title_query}%',))
-            videos = cursor.fetchall()
-
-            # Format datetime fields for display
-            for video in videos:
-                if video['created_at']:
-                    video['created_at'] = video['created_at'].strftime("%Y-%m-%d %H:%M:%S")
-
-    except Error as e:
-        print(f"Error searching videos: {e}")
-        flash('Error searching videos', 'error')
-    finally:
-        if connection and connection.is_connected():
-            cursor.close()
-            connection.close()
-
-    return videos
+def search_videos_by_title(title_query, grade=None):
+    """Search videos by title and description, best matches first (every match, cached)"""
+    return search_all_items('videos', title_query, grade=grade)
 
 
 # ==================== LIBRARY-SPECIFIC FUNCTIONS ====================
 def add_library_book_to_db(book_data):
-    """Add new book to library database"""
+    """Add new book to library database; returns the new book's id (truthy) or False.
+
+    The files' references were taken when they were stored (blob_store.save_stream).
+    """
     try:
         connection = get_db_connection()
         if connection:
@@ -422,9 +1485,12 @@ def add_library_book_to_db(book_data):
                 picture_filename,
                 book_data['file_size']
             ))
+            book_id = cursor.lastrowid
+            _bump_count(cursor, 'library', book_data['grade'], 1)
 
             connection.commit()
-            return True
+            listing_cache.invalidate('library')
+            return book_id
 
     except Error as e:
         print(f"Error adding book: {e}")
@@ -441,6 +1507,7 @@ def update_library_book_in_db(book_id, book_data):
         connection = get_db_connection()
         if connection:
             cursor = connection.cursor()
+            old_grade = _get_grade(cursor, 'library', book_id)
 
             update_query = """
             UPDATE library
@@ -456,8 +1523,10 @@ def update_library_book_in_db(book_id, book_data):
                 book_data['grade'],
                 book_id
             ))
+            _move_count(cursor, 'library', old_grade, book_data['grade'])
 
             connection.commit()
+            listing_cache.invalidate('library')
             return True
 
     except Error as e:
@@ -470,34 +1539,30 @@ def update_library_book_in_db(book_id, book_data):
 
 
 def delete_library_book_from_db(book_id):
-    """Delete book from database and file system"""
+    """Delete book from database; its files go to the trash and are purged later"""
     try:
         connection = get_db_connection()
         if connection:
             cursor = connection.cursor(dictionary=True)
 
-            # Get book info first
-            cursor.execute("SELECT pdf_filename, picture_filename FROM library WHERE id = %s", (book_id,))
+            # Get book info first (the whole row, so the delete can be undone), locked
+            # so a concurrent delete of the same book waits and then finds nothing
+            cursor.execute("SELECT * FROM library WHERE id = %s FOR UPDATE", (book_id,))
             book = cursor.fetchone()
 
             if book:
                 # Delete from database
                 cursor.execute("DELETE FROM library WHERE id = %s", (book_id,))
-                connection.commit()
-
-                # Delete files from file system
-                try:
-                    pdf_path = os.path.join('static/library/pdfs', book['pdf_filename'])
-                    if os.path.exists(pdf_path):
-                        os.remove(pdf_path)
+                if cursor.rowcount != 1:
+                    # Deleted by someone else: the counter, trash and file references are theirs
+                    connection.rollback()
+                    return False
+                _bump_count(cursor, 'library', book['grade'], -1)
 
-                    if book['picture_filename']:
-                        picture_path = os.path.join('static/library/pictures', book['picture_filename'])
-                        if os.path.exists(picture_path):
-                            os.remove(picture_path)
-                except Exception as e:
-                    print(f"Error deleting book files: {e}")
+                _move_to_trash(cursor, 'library', book, _release_row_files(cursor, 'library', book))
 
+                connection.commit()
+                listing_cache.invalidate('library')
                 return True
 
     except Error as e:
@@ -509,32 +1574,42 @@ def delete_library_book_from_db(book_id):
             connection.close()
 
 
-def get_library_books_by_grade(grade):
-    """Get library books filtered by grade"""
-    return get_items_by_grade('library', grade)
-
-
-def search_library_books_by_title(title_query):
-    """Search library books by title"""
-    books = []
+def update_library_book_assets(book_id, assets):
+    """Store cover variants and page count produced by the background job"""
     try:
         connection = get_db_connection()
         if connection:
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM library WHERE title LIKE %s ORDER BY created_at DESC", (f'%{title_query}%',))
-            books = cursor.fetchall()
+            cursor = connection.cursor()
+            cursor.execute("""
+            UPDATE library
+            SET page_count = %s, cover_thumb = %s, cover_webp = %s, cover_placeholder = %s
+            WHERE id = %s
+            """, (
+                assets.get('page_count'),
+                assets.get('cover_thumb'),
+                assets.get('cover_webp'),
+                assets.get('cover_placeholder'),
+                book_id
+            ))
 
-            # Format datetime fields for display
-            for book in books:
-                if book['created_at']:
-                    book['created_at'] = book['created_at'].strftime("%Y-%m-%d %H:%M:%S")
+            connection.commit()
+            listing_cache.invalidate('library')
+            return True
 
     except Error as e:
-        print(f"Error searching books: {e}")
-        flash('Error searching books', 'error')
+        print(f"Error saving book assets: {e}")
+        return False
     finally:
         if connection and connection.is_connected():
             cursor.close()
             connection.close()
 
-    return books
\ No newline at end of file
+
+def get_library_books_by_grade(grade):
+    """Get library books filtered by grade"""
+    return get_items_by_grade('library', grade)
+
+
+def search_library_books_by_title(title_query, grade=None):
+    """Search books by title and description, best matches first (every match, cached)"""
+    return search_all_items('library', title_query, grade=grade)
\ No newline at end of file
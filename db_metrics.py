@@ -0,0 +1,441 @@
+"""Per-request database instrumentation and Prometheus metrics.
+
+With METRICS_CONFIG['enabled'], connections handed out by
+database_functions are wrapped so their cursors time every statement
+(execute plus reading its rows) and count the rows it returned or changed.
+Within a request the totals - queries, rows, DB time and time spent waiting
+for a pooled connection - go back to the browser as a Server-Timing header,
+and requests and statements are folded into histograms:
+
+    portal_http_request_duration_seconds{route,method,status}
+    portal_http_request_db_seconds{route}
+    portal_http_request_queries{route}
+    portal_db_acquire_seconds{route}
+    portal_db_query_seconds{table,operation}
+    portal_db_rows_total{table,operation}
+
+which /metrics renders in the Prometheus text format. Each process keeps its
+own; with prefork workers they write a snapshot to shared_dir every
+flush_seconds and /metrics adds all snapshots up, so a scrape sees the whole
+server whichever worker answers it. Snapshots of exited workers are folded
+into a single retired.json. Disabled, connections are returned
+unwrapped and no request hooks are installed. Statements slower than the
+slow-query threshold are also handed to slow_queries, which keeps the
+wrapping on (without the histograms) even when metrics are off.
+"""
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from functools import lru_cache
+
+from flask import request
+
+import slow_queries
+from config import METRICS_CONFIG
+
+_lock = threading.Lock()
+
+
+# ==================== METRICS ====================
+class Histogram:
+    """Bucketed observations per label set (bucket counts are cumulated when rendered)"""
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [count per bucket..., overflow, sum, count]
+
+    def observe(self, label_values, value):
+        with _lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self, series):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, values in sorted(series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {round(values[-2], 6)}")
+            lines.append(f"{self.name}_count{{{labels}}} {values[-1]}")
+        return lines
+
+
+class Counter:
+    """Running total per label set"""
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.series = {}  # label values -> [total]
+
+    def inc(self, label_values, amount=1):
+        with _lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0]
+            series[0] += amount
+
+    def render(self, series):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, values in sorted(series.items()):
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {values[0]}")
+        return lines
+
+
+def _labels(names, values):
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for v in values)
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+REQUEST_SECONDS = Histogram('portal_http_request_duration_seconds', 'Time to build a response',
+                            ('route', 'method', 'status'), METRICS_CONFIG['buckets'])
+REQUEST_DB_SECONDS = Histogram('portal_http_request_db_seconds', 'Database time per request',
+                               ('route',), METRICS_CONFIG['buckets'])
+REQUEST_QUERIES = Histogram('portal_http_request_queries', 'Statements executed per request',
+                            ('route',), METRICS_CONFIG['query_count_buckets'])
+ACQUIRE_SECONDS = Histogram('portal_db_acquire_seconds', 'Time per request spent waiting for pooled connections',
+                            ('route',), METRICS_CONFIG['buckets'])
+QUERY_SECONDS = Histogram('portal_db_query_seconds', 'Time to execute a statement and read its rows',
+                          ('table', 'operation'), METRICS_CONFIG['buckets'])
+ROWS = Counter('portal_db_rows_total', 'Rows returned by reads or changed by writes', ('table', 'operation'))
+
+METRICS = [REQUEST_SECONDS, REQUEST_DB_SECONDS, REQUEST_QUERIES, ACQUIRE_SECONDS, QUERY_SECONDS, ROWS]
+
+
+# ==================== SHARED SNAPSHOTS ====================
+_snapshot = {'pid': None, 'path': None, 'flushed_at': 0.0}
+
+RETIRED_SNAPSHOT = 'retired.json'  # Totals of worker processes that have exited
+_SNAPSHOT_NAME = re.compile(r'^(\d+)-[0-9a-f]+\.json$')
+FOLD_LOCK_STALE_SECONDS = 60
+
+
+def _snapshot_path():
+    """This process's snapshot file; named per process start, so a reused pid never overwrites old totals"""
+    if _snapshot['pid'] != os.getpid():
+        _snapshot.update(pid=os.getpid(), path=os.path.join(
+            METRICS_CONFIG['shared_dir'], f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json"))
+    return _snapshot['path']
+
+
+def _local_series():
+    with _lock:
+        return {metric.name: {json.dumps(labels): list(values) for labels, values in metric.series.items()}
+                for metric in METRICS}
+
+
+def flush(force=False):
+    """Write this process's totals to shared_dir (at most every flush_seconds unless forced)"""
+    if not METRICS_CONFIG['shared_dir']:
+        return
+    now = time.monotonic()
+    if not force and now - _snapshot['flushed_at'] < METRICS_CONFIG['flush_seconds']:
+        return
+    _snapshot['flushed_at'] = now
+    path = _snapshot_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(_local_series(), f)
+    os.replace(tmp_path, path)
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':
+        return True  # os.kill(pid, 0) is not a liveness probe on Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _add_snapshot(total, snapshot):
+    """Add one snapshot ({metric name: {label values as JSON: values}}) into total"""
+    for name, series in snapshot.items():
+        merged = total.setdefault(name, {})
+        for labels, values in series.items():
+            current = merged.get(labels)
+            if current is None or len(current) != len(values):
+                merged[labels] = list(values)
+            else:
+                merged[labels] = [a + b for a, b in zip(current, values)]
+    return total
+
+
+def _fold_exited_snapshots(directory):
+    """Add the snapshots of exited workers into RETIRED_SNAPSHOT and delete them.
+
+    Every worker start (restart, HUP reload) leaves a new snapshot behind;
+    folding keeps the directory, and the work of a scrape, at one file per
+    live worker while the summed counters never go down. One process folds
+    at a time; a scrape that finds the lock taken just reads the snapshots
+    as they are.
+    """
+    exited = []
+    for entry in os.scandir(directory):
+        match = _SNAPSHOT_NAME.match(entry.name)
+        if match and not _pid_alive(int(match.group(1))):
+            exited.append(entry.path)
+    if not exited:
+        return
+
+    lock_path = os.path.join(directory, 'retired.lock')
+    try:
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        try:
+            # Left behind by a process that died while folding
+            if time.time() - os.path.getmtime(lock_path) > FOLD_LOCK_STALE_SECONDS:
+                os.remove(lock_path)
+        except OSError:
+            pass
+        return
+
+    try:
+        retired_path = os.path.join(directory, RETIRED_SNAPSHOT)
+        retired = _read_snapshot(retired_path) or {}
+        for path in exited:
+            snapshot = _read_snapshot(path)
+            if snapshot is not None:
+                _add_snapshot(retired, snapshot)
+        tmp_path = f"{retired_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(retired, f)
+        os.replace(tmp_path, retired_path)
+        for path in exited:
+            os.remove(path)
+    finally:
+        os.remove(lock_path)
+
+
+def _merged_series():
+    """{metric name: {label values: values}} summed over every process's snapshot"""
+    if not METRICS_CONFIG['shared_dir']:
+        total = _local_series()
+    else:
+        flush(force=True)
+        _fold_exited_snapshots(METRICS_CONFIG['shared_dir'])
+        total = {}
+        for entry in os.scandir(METRICS_CONFIG['shared_dir']):
+            if not entry.name.endswith('.json'):
+                continue
+            snapshot = _read_snapshot(entry.path)
+            if snapshot is not None:
+                _add_snapshot(total, snapshot)
+
+    return {metric.name: {tuple(json.loads(labels)): values for labels, values in total.get(metric.name, {}).items()}
+            for metric in METRICS}
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    merged = _merged_series()
+    lines = []
+    for metric in METRICS:
+        lines += metric.render(merged[metric.name])
+    return '\n'.join(lines) + '\n'
+
+
+# ==================== INSTRUMENTED CONNECTIONS ====================
+class RequestStats:
+    """Database totals of the request being handled"""
+
+    __slots__ = ('started', 'route', 'method', 'queries', 'rows', 'db_seconds', 'acquire_seconds')
+
+    def __init__(self, route, method):
+        self.started = time.perf_counter()
+        self.route = route
+        self.method = method
+        self.queries = 0
+        self.rows = 0
+        self.db_seconds = 0.0
+        self.acquire_seconds = 0.0
+
+
+_current = contextvars.ContextVar('db_metrics_request', default=None)
+
+# Whether connections are wrapped at all
+_ENABLED = METRICS_CONFIG['enabled'] or slow_queries.THRESHOLD_SECONDS != float('inf')
+
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN|TABLE)\s+`?(\w+)', re.I)
+_READS = {'select', 'with', 'show', 'pragma'}
+
+
+@lru_cache(maxsize=1024)
+def _statement_labels(sql):
+    """(table, operation) of a statement: its first table and its leading keyword"""
+    words = sql.split(None, 1)
+    match = _TABLE.search(sql)
+    return (match.group(1) if match else 'none'), (words[0].lower() if words else 'none')
+
+
+class InstrumentedCursor:
+    """Cursor wrapper that times each statement, including reading its results"""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+        self._labels = None
+        self._statement = None
+        self._seconds = 0.0
+        self._rows = 0
+
+    def _record(self):
+        """Book the previous statement once its results have been read (or abandoned)"""
+        if self._labels is None:
+            return
+        if METRICS_CONFIG['enabled']:
+            QUERY_SECONDS.observe(self._labels, self._seconds)
+            ROWS.inc(self._labels, self._rows)
+        if self._stats is not None:
+            self._stats.queries += 1
+            self._stats.rows += self._rows
+            self._stats.db_seconds += self._seconds
+        if self._seconds >= slow_queries.THRESHOLD_SECONDS:
+            sql, params = self._statement
+            stats = self._stats
+            slow_queries.record(sql, params, self._seconds, self._rows,
+                                stats.route if stats else None, stats.method if stats else None)
+        self._labels = None
+
+    def _run(self, method, sql, args, kwargs, params):
+        self._record()
+        started = time.perf_counter()
+        try:
+            return method(sql, *args, **kwargs)
+        finally:
+            self._labels = _statement_labels(sql)
+            self._statement = (sql, params)
+            self._seconds = time.perf_counter() - started
+            self._rows = 0 if self._labels[1] in _READS else max(self._cursor.rowcount, 0)
+
+    def execute(self, sql, *args, **kwargs):
+        return self._run(self._cursor.execute, sql, args, kwargs, args[0] if args else kwargs.get('params'))
+
+    def executemany(self, sql, *args, **kwargs):
+        # The parameter list of a batch is not kept; a slow batch is logged without it
+        return self._run(self._cursor.executemany, sql, args, kwargs, None)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._seconds += time.perf_counter() - started
+        self._rows += row is not None
+        return row
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._seconds += time.perf_counter() - started
+        self._rows += len(rows)
+        return rows
+
+    def close(self):
+        self._record()
+        if self._stats is None:
+            flush()
+        return self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """Connection wrapper handing out InstrumentedCursors; commits count as DB time"""
+
+    def __init__(self, connection, stats):
+        self._connection = connection
+        self._stats = stats
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs), self._stats)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return self._connection.commit()
+        finally:
+            elapsed = time.perf_counter() - started
+            if METRICS_CONFIG['enabled']:
+                QUERY_SECONDS.observe(('none', 'commit'), elapsed)
+            if self._stats is not None:
+                self._stats.db_seconds += elapsed
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def instrument(connection, acquire_started):
+    """Wrap a freshly borrowed connection (borrowing began at perf_counter() acquire_started)"""
+    if not _ENABLED:
+        return connection
+    stats = _current.get()
+    if stats is not None:
+        stats.acquire_seconds += time.perf_counter() - acquire_started
+    return InstrumentedConnection(connection, stats)
+
+
+# ==================== REQUEST HOOKS ====================
+def _start_request():
+    _current.set(RequestStats(request.url_rule.rule if request.url_rule else 'unmatched', request.method))
+
+
+def _finish_request(response):
+    stats = _current.get()
+    if stats is None or not METRICS_CONFIG['enabled']:
+        return response
+    elapsed = time.perf_counter() - stats.started
+    route = stats.route
+
+    REQUEST_SECONDS.observe((route, stats.method, str(response.status_code)), elapsed)
+    REQUEST_DB_SECONDS.observe((route,), stats.db_seconds)
+    REQUEST_QUERIES.observe((route,), stats.queries)
+    ACQUIRE_SECONDS.observe((route,), stats.acquire_seconds)
+
+    if METRICS_CONFIG['server_timing']:
+        response.headers.add('Server-Timing', ', '.join([
+            f'db;dur={stats.db_seconds * 1000:.3f};desc="{stats.queries} queries, {stats.rows} rows"',
+            f'db-acquire;dur={stats.acquire_seconds * 1000:.3f}',
+            f'app;dur={elapsed * 1000:.3f}'
+        ]))
+    flush()
+    return response
+
+
+def _end_request(exc=None):
+    _current.set(None)
+
+
+def init_metrics(app):
+    """Install the request hooks that collect per-request totals"""
+    if not _ENABLED:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
@@ -0,0 +1,232 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from mysql.connector import Error as MySQLError
+
+from config import DB_BACKEND, DB_CONFIG, DB_POOL_CONFIG, SQLITE_CONFIG
+from sqlite_backend import SQLitePool
+
+# What database helpers catch: errors of either backend
+Error = (MySQLError, sqlite3.Error)
+
+
+class PoolTimeoutError(MySQLError):
+    """Raised when no pooled connection becomes free within the checkout timeout"""
+
+
+class PooledConnection:
+    """Wrapper around a MySQL connection that goes back to the pool on close()"""
+
+    def __init__(self, pool, raw_connection):
+        self._pool = pool
+        self._raw = raw_connection
+        self._checked_out = False
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def is_connected(self):
+        # A checked-out connection was validated on borrow, so skip the
+        # server ping that mysql.connector's is_connected() would do.
+        return self._checked_out
+
+    def close(self):
+        if self._checked_out:
+            self._pool.release(self)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class ConnectionPool:
+    """Fixed-size pool of MySQL connections with validation, recycling and live counters"""
+
+    def __init__(self, db_config, pool_size=10, checkout_timeout=5.0,
+                 recycle_seconds=1800, validation_interval=30):
+        self.db_config = db_config
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.recycle_seconds = recycle_seconds
+        self.validation_interval = validation_interval
+        self.pid = os.getpid()
+
+        self._idle = deque()
+        self._in_use = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+        # Counters
+        self._created = 0
+        self._recycled = 0
+        self._failed_validations = 0
+        self._timeouts = 0
+        self._checkouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._recent_checkouts = deque()  # checkout timestamps in the last minute
+
+    def _connect(self):
+        return PooledConnection(self, mysql.connector.connect(**self.db_config))
+
+    def _is_usable(self, connection):
+        """Validate an idle connection before handing it out (called without the lock held)"""
+        now = time.monotonic()
+        if self.recycle_seconds and now - connection.created_at > self.recycle_seconds:
+            with self._lock:
+                self._recycled += 1
+            return False
+        if now - connection.last_used < self.validation_interval:
+            return True
+        try:
+            connection._raw.ping(reconnect=False)
+            return True
+        except MySQLError:
+            with self._lock:
+                self._failed_validations += 1
+            return False
+
+    @staticmethod
+    def _discard(connection):
+        try:
+            connection._raw.close()
+        except MySQLError:
+            pass
+
+    def get_connection(self):
+        """Borrow a connection, waiting up to checkout_timeout for one to be free"""
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+
+        while True:
+            with self._lock:
+                while True:
+                    # Take an idle connection, or a slot for a new one while under the pool size;
+                    # either way the slot is counted as in use until the connection is handed out
+                    connection = self._idle.pop() if self._idle else None
+                    if connection is not None or self._in_use < self.pool_size:
+                        self._in_use += 1
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            msg=f"No database connection available after {self.checkout_timeout}s")
+                    self._available.wait(remaining)
+
+            if connection is None:
+                break
+
+            # Validate outside the lock so a slow ping doesn't block other borrowers
+            if self._is_usable(connection):
+                with self._lock:
+                    self._in_use -= 1
+                    return self._checkout(connection, started)
+            self._discard(connection)
+            with self._lock:
+                self._in_use -= 1
+                self._available.notify()
+
+        # Connect outside the lock so slow handshakes don't block other borrowers
+        try:
+            connection = self._connect()
+        except MySQLError:
+            with self._lock:
+                self._in_use -= 1
+                self._available.notify()
+            raise
+
+        with self._lock:
+            self._created += 1
+            self._in_use -= 1
+            return self._checkout(connection, started)
+
+    def _checkout(self, connection, started):
+        """Mark a connection as borrowed and record wait time (lock must be held)"""
+        now = time.monotonic()
+        wait = now - started
+        connection._checked_out = True
+        self._in_use += 1
+        self._checkouts += 1
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+        self._recent_checkouts.append(now)
+        while self._recent_checkouts and now - self._recent_checkouts[0] > 60:
+            self._recent_checkouts.popleft()
+        return connection
+
+    def release(self, connection):
+        """Return a connection to the pool, ending any open transaction"""
+        keep = True
+        try:
+            # Reads also open a transaction; end it so the next borrower
+            # does not see a stale REPEATABLE READ snapshot.
+            if connection._raw.in_transaction:
+                connection._raw.rollback()
+        except MySQLError:
+            keep = False
+
+        with self._lock:
+            connection._checked_out = False
+            connection.last_used = time.monotonic()
+            self._in_use -= 1
+            if keep:
+                self._idle.append(connection)
+            self._available.notify()
+
+        if not keep:
+            self._discard(connection)
+
+    def close_all(self):
+        """Close every idle connection (borrowed ones close when released)"""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection in idle:
+            self._discard(connection)
+
+    def stats(self):
+        """Snapshot of the pool counters"""
+        with self._lock:
+            now = time.monotonic()
+            while self._recent_checkouts and now - self._recent_checkouts[0] > 60:
+                self._recent_checkouts.popleft()
+            return {
+                'pool_size': self.pool_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'created': self._created,
+                'recycled': self._recycled,
+                'failed_validations': self._failed_validations,
+                'timeouts': self._timeouts,
+                'checkouts': self._checkouts,
+                'checkouts_per_sec': round(len(self._recent_checkouts) / 60.0, 3),
+                'avg_wait_ms': round(self._total_wait / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                'max_wait_ms': round(self._max_wait * 1000, 3),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Get the process-wide connection pool, creating it on first use (and again after a fork)"""
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                # Connections inherited from the parent are dropped, not closed:
+                # closing would end the parent's sessions on the shared sockets
+                if DB_BACKEND == 'sqlite':
+                    _pool = SQLitePool(**SQLITE_CONFIG)
+                else:
+                    _pool = ConnectionPool(DB_CONFIG, **DB_POOL_CONFIG)
+    return _pool
+
+
+def get_pool_stats():
+    """Get live counters for the process-wide pool"""
+    return get_pool().stats()
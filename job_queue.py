@@ -0,0 +1,315 @@
+"""Persistent background job queue for post-upload processing.
+
+Jobs are rows in a local SQLite file, so queued work survives restarts of
+both the web server and the worker. Run the worker next to the web server:
+
+    python job_queue.py            # process jobs with a pool of worker processes
+    python job_queue.py status     # print job counts and recent failures
+"""
+import base64
+import io
+import json
+import os
+import re
+import socket
+import sqlite3
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from config import JOB_QUEUE_CONFIG
+
+LIBRARY_PICTURE_FOLDER = 'static/library/pictures'
+LIBRARY_PDF_FOLDER = 'static/library/pdfs'
+COVER_VARIANT_FOLDER = 'variants'  # inside LIBRARY_PICTURE_FOLDER
+COVER_THUMB_WIDTH = 320
+
+
+# ==================== QUEUE STORAGE ====================
+def _connect():
+    os.makedirs(os.path.dirname(JOB_QUEUE_CONFIG['path']) or '.', exist_ok=True)
+    connection = sqlite3.connect(JOB_QUEUE_CONFIG['path'], timeout=30, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("""
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        progress INTEGER NOT NULL DEFAULT 0,
+        result TEXT NULL,
+        error TEXT NULL,
+        locked_by TEXT NULL,
+        run_after REAL NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """)
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, run_after, id)")
+    return connection
+
+
+def enqueue(kind, payload):
+    """Queue a job; returns its id"""
+    if kind not in TASKS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    now = time.time()
+    connection = _connect()
+    try:
+        cursor = connection.execute(
+            "INSERT INTO jobs (kind, payload, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            (kind, json.dumps(payload), now, now))
+        return cursor.lastrowid
+    finally:
+        connection.close()
+
+
+def report_progress(job_id, progress):
+    """Record a running job's progress (0-100); callable from worker processes"""
+    connection = _connect()
+    try:
+        connection.execute("UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?",
+                           (int(progress), time.time(), job_id))
+    finally:
+        connection.close()
+
+
+def _claim_next(connection, worker_id):
+    """Atomically mark the oldest runnable job as running and return it"""
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        row = connection.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' AND run_after <= ? ORDER BY id LIMIT 1",
+            (time.time(),)).fetchone()
+        if row is None:
+            connection.execute("COMMIT")
+            return None
+        connection.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_by = ?, updated_at = ? "
+            "WHERE id = ?", (worker_id, time.time(), row['id']))
+        # Read it back so attempts counts this run
+        row = connection.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone()
+        connection.execute("COMMIT")
+        return row
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+
+
+def _finish(connection, job, result=None, error=None):
+    now = time.time()
+    if error is None:
+        connection.execute(
+            "UPDATE jobs SET status = 'done', progress = 100, result = ?, error = NULL, locked_by = NULL, "
+            "updated_at = ? WHERE id = ?", (json.dumps(result), now, job['id']))
+    elif job['attempts'] < JOB_QUEUE_CONFIG['max_attempts']:
+        # Retry later with exponential backoff
+        connection.execute(
+            "UPDATE jobs SET status = 'queued', error = ?, locked_by = NULL, run_after = ?, updated_at = ? "
+            "WHERE id = ?", (error, now + 30 * 2 ** job['attempts'], now, job['id']))
+    else:
+        connection.execute(
+            "UPDATE jobs SET status = 'failed', error = ?, locked_by = NULL, updated_at = ? WHERE id = ?",
+            (error, now, job['id']))
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':
+        return True  # os.kill(pid, 0) is not a liveness probe on Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _requeue_interrupted(connection, worker_id):
+    """Queue again the running jobs whose worker is gone.
+
+    That is jobs held by this worker, by a dead worker process on this host,
+    or not updated for JOB_QUEUE_CONFIG['stale_seconds'] (worker on another host).
+    """
+    host = worker_id.split(':')[0]
+    stale_before = time.time() - JOB_QUEUE_CONFIG['stale_seconds']
+    for row in connection.execute("SELECT id, locked_by, updated_at FROM jobs WHERE status = 'running'").fetchall():
+        owner_host, _, owner_pid = (row['locked_by'] or '').partition(':')
+        abandoned = (row['locked_by'] == worker_id
+                     or (owner_host == host and owner_pid.isdigit() and not _pid_alive(int(owner_pid)))
+                     or row['updated_at'] < stale_before)
+        if abandoned:
+            connection.execute("UPDATE jobs SET status = 'queued', locked_by = NULL "
+                               "WHERE id = ? AND status = 'running'", (row['id'],))
+
+
+def retry_job(job_id):
+    """Queue a failed job again"""
+    connection = _connect()
+    try:
+        connection.execute(
+            "UPDATE jobs SET status = 'queued', attempts = 0, run_after = 0, updated_at = ? "
+            "WHERE id = ? AND status = 'failed'", (time.time(), job_id))
+    finally:
+        connection.close()
+
+
+def get_job_summary(limit=50):
+    """Counts per status plus the most recent jobs, for the admin page and CLI"""
+    connection = _connect()
+    try:
+        counts = {row['status']: row['n'] for row in
+                  connection.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+        recent = [dict(row) for row in
+                  connection.execute("SELECT id, kind, payload, status, attempts, progress, error, "
+                                     "created_at, updated_at FROM jobs ORDER BY id DESC LIMIT ?", (limit,))]
+        return {'counts': counts, 'recent': recent}
+    finally:
+        connection.close()
+
+
+# ==================== TASKS ====================
+# Tasks run in worker processes and only touch files; they return a result
+# dict that the main worker process writes to MySQL via RESULT_HANDLERS.
+
+def _cover_variants(picture_filename):
+    """Resized JPEG and WebP covers plus a tiny blurred placeholder data URI"""
+    try:
+        from PIL import Image, ImageFilter, ImageOps
+    except ImportError:
+        return {}
+
+    source = os.path.join(LIBRARY_PICTURE_FOLDER, picture_filename)
+    stem = os.path.splitext(os.path.basename(picture_filename))[0]
+    variant_dir = os.path.join(LIBRARY_PICTURE_FOLDER, COVER_VARIANT_FOLDER)
+    os.makedirs(variant_dir, exist_ok=True)
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+        thumb = image.copy()
+        thumb.thumbnail((COVER_THUMB_WIDTH, COVER_THUMB_WIDTH * 2))
+        thumb_name = f"{COVER_VARIANT_FOLDER}/{stem}_{COVER_THUMB_WIDTH}.jpg"
+        webp_name = f"{COVER_VARIANT_FOLDER}/{stem}_{COVER_THUMB_WIDTH}.webp"
+        thumb.save(os.path.join(LIBRARY_PICTURE_FOLDER, thumb_name), 'JPEG', quality=80,
+                   optimize=True, progressive=True)
+        thumb.save(os.path.join(LIBRARY_PICTURE_FOLDER, webp_name), 'WEBP', quality=75, method=4)
+
+        tiny = image.copy()
+        tiny.thumbnail((16, 16))
+        tiny = tiny.filter(ImageFilter.GaussianBlur(1))
+        buffer = io.BytesIO()
+        tiny.save(buffer, 'JPEG', quality=40)
+        placeholder = 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+    return {'cover_thumb': thumb_name, 'cover_webp': webp_name, 'cover_placeholder': placeholder}
+
+
+def _pdf_page_count(pdf_filename):
+    """Number of pages in a PDF, or None if it cannot be determined"""
+    path = os.path.join(LIBRARY_PDF_FOLDER, pdf_filename)
+    try:
+        from pypdf import PdfReader
+        return len(PdfReader(path).pages)
+    except ImportError:
+        pass
+    except Exception:
+        return None
+
+    # Without pypdf, count page objects; misses pages hidden in compressed object streams
+    pattern = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+    count = 0
+    tail = b''
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(1024 * 1024)
+            if not block:
+                break
+            data = tail + block
+            # Matches ending inside the carried-over tail were counted with the previous block
+            count += sum(1 for match in pattern.finditer(data) if match.end() > len(tail))
+            tail = data[-32:]
+    return count or None
+
+
+def process_book_assets(job_id, payload):
+    """Cover variants and PDF page count for a newly uploaded library book"""
+    result = {'book_id': payload['book_id']}
+    if payload.get('picture_filename'):
+        result.update(_cover_variants(payload['picture_filename']))
+    report_progress(job_id, 50)
+    result['page_count'] = _pdf_page_count(payload['pdf_filename'])
+    return result
+
+
+def _save_book_assets(result):
+    from database_functions import update_library_book_assets
+    book_id = result.pop('book_id')
+    if not update_library_book_assets(book_id, result):
+        raise RuntimeError(f"Could not save assets for book {book_id}")
+
+
+TASKS = {
+    'process_book_assets': process_book_assets
+}
+
+RESULT_HANDLERS = {
+    'process_book_assets': _save_book_assets
+}
+
+
+def _run_task(kind, job_id, payload):
+    return TASKS[kind](job_id, payload)
+
+
+# ==================== WORKER ====================
+def run_worker(workers=None):
+    """Claim queued jobs and run them on a process pool until interrupted"""
+    workers = workers or JOB_QUEUE_CONFIG['workers']
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    connection = _connect()
+    _requeue_interrupted(connection, worker_id)
+    print(f"Job worker {worker_id} started with {workers} processes")
+
+    running = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            while True:
+                while len(running) < workers:
+                    job = _claim_next(connection, worker_id)
+                    if job is None:
+                        break
+                    future = pool.submit(_run_task, job['kind'], job['id'], json.loads(job['payload']))
+                    running[future] = job
+
+                if not running:
+                    time.sleep(JOB_QUEUE_CONFIG['poll_interval'])
+                    continue
+
+                done, _ = wait(running, timeout=JOB_QUEUE_CONFIG['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        result = future.result()
+                        handler = RESULT_HANDLERS.get(job['kind'])
+                        if handler:
+                            handler(dict(result))
+                        _finish(connection, job, result=result)
+                    except Exception as e:
+                        print(f"Job {job['id']} ({job['kind']}) failed: {e}")
+                        _finish(connection, job, error=f"{type(e).__name__}: {e}")
+        except KeyboardInterrupt:
+            print("Job worker stopping")
+        finally:
+            # Anything still running is picked up again on the next start
+            _requeue_interrupted(connection, worker_id)
+            connection.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'status':
+        print(json.dumps(get_job_summary(limit=20), indent=2, default=str))
+    else:
+        run_worker()
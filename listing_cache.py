@@ -0,0 +1,256 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from config import CACHE_CONFIG
+
+
+class LocalCache:
+    """In-process LRU cache with per-entry TTL and a memory cap"""
+
+    def __init__(self, ttl_seconds=300, max_bytes=32 * 1024 * 1024, **_):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._versions = {}
+        # Tables not written by this process may have changed before it started
+        self._initial_version = str(time.time_ns())
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_version(self, table_name):
+        return self._versions.get(table_name, self._initial_version)
+
+    def bump_version(self, table_name):
+        # Versions are bump times in ns (see version_time), kept strictly increasing
+        with self._lock:
+            previous = int(self.get_version(table_name))
+            self._versions[table_name] = str(max(time.time_ns(), previous + 1))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                return None, False
+            self._entries.move_to_end(key)
+            return entry[2], True
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return 0
+        evicted = 0
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+        return evicted
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def usage(self):
+        return {'entries': len(self._entries), 'bytes': self._bytes}
+
+
+class SharedFileCache:
+    """Cache shared by every worker process through a local directory.
+
+    Entries are pickle files named by key hash; table versions are small
+    files replaced atomically, so a write in one worker invalidates the
+    listings cached by all of them. LRU order follows file mtimes, which
+    are touched on every hit.
+    """
+
+    def __init__(self, ttl_seconds=300, max_bytes=128 * 1024 * 1024, shared_dir='.cache/listings', **_):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.entries_dir = os.path.join(shared_dir, 'entries')
+        self.versions_dir = os.path.join(shared_dir, 'versions')
+        os.makedirs(self.entries_dir, exist_ok=True)
+        os.makedirs(self.versions_dir, exist_ok=True)
+        self._written_since_prune = 0
+
+    def _atomic_write(self, path, data):
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get_version(self, table_name):
+        try:
+            with open(os.path.join(self.versions_dir, table_name), 'rb') as f:
+                return f.read().decode()
+        except FileNotFoundError:
+            return '0'
+
+    def bump_version(self, table_name):
+        # Bump time (see version_time) plus a random suffix, so concurrent bumps never collide
+        token = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        self._atomic_write(os.path.join(self.versions_dir, table_name), token.encode())
+
+    def _path(self, key):
+        return os.path.join(self.entries_dir, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None, False
+        if expires_at < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None, False
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value, True
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return 0
+        data = pickle.dumps((time.time() + self.ttl_seconds, value), pickle.HIGHEST_PROTOCOL)
+        self._atomic_write(self._path(key), data)
+        self._written_since_prune += len(data)
+        # Only walk the directory once enough new data has been written
+        if self._written_since_prune > self.max_bytes // 10:
+            self._written_since_prune = 0
+            return self._prune()
+        return 0
+
+    def _prune(self):
+        """Evict least recently used entries until the directory fits max_bytes"""
+        files = []
+        total = 0
+        for entry in os.scandir(self.entries_dir):
+            if entry.name.endswith('.tmp'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        evicted = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                evicted += 1
+            except OSError:
+                pass
+            total -= size
+        return evicted
+
+    def clear(self):
+        for entry in os.scandir(self.entries_dir):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def usage(self):
+        entries = 0
+        total = 0
+        for entry in os.scandir(self.entries_dir):
+            try:
+                total += entry.stat().st_size
+                entries += 1
+            except FileNotFoundError:
+                pass
+        return {'entries': entries, 'bytes': total}
+
+
+CACHE_BACKENDS = {
+    'local': LocalCache,
+    'shared': SharedFileCache
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+
+def get_backend():
+    """Get the configured cache backend, or None when caching is off"""
+    global _backend
+    if _backend is None and CACHE_CONFIG.get('mode', 'off') != 'off':
+        with _backend_lock:
+            if _backend is None:
+                options = {k: v for k, v in CACHE_CONFIG.items() if k != 'mode'}
+                _backend = CACHE_BACKENDS[CACHE_CONFIG['mode']](**options)
+    return _backend
+
+
+def version_time(version):
+    """When a table version was created (epoch seconds), or None if unknown"""
+    stamp = str(version).split('-')[0]
+    return int(stamp) / 1e9 if stamp.isdigit() and stamp != '0' else None
+
+
+def get_or_load(tables, key, loader):
+    """Return the cached value for key, calling loader() on a miss.
+
+    The key is combined with the current version of every table in tables,
+    so bumping a table's version makes its old entries unreachable. A
+    loader result of None (a failed query) is passed through uncached.
+    """
+    backend = get_backend()
+    if backend is None:
+        return loader()
+
+    versions = ','.join(f"{table}:{backend.get_version(table)}" for table in tables)
+    full_key = f"{key}|{versions}"
+
+    value, hit = backend.get(full_key)
+    if hit:
+        _stats['hits'] += 1
+        return value
+
+    _stats['misses'] += 1
+    value = loader()
+    if value is not None:
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        _stats['evictions'] += backend.set(full_key, value, size)
+    return value
+
+
+def invalidate(table_name):
+    """Bump a table's version so every cached listing of it is refetched"""
+    backend = get_backend()
+    if backend is not None:
+        backend.bump_version(table_name)
+        _stats['invalidations'] += 1
+
+
+def get_cache_stats():
+    """Hit/miss counters for this process plus current cache usage"""
+    backend = get_backend()
+    lookups = _stats['hits'] + _stats['misses']
+    stats = dict(_stats, mode=CACHE_CONFIG.get('mode', 'off'),
+                 hit_ratio=round(_stats['hits'] / lookups, 3) if lookups else 0.0)
+    if backend is not None:
+        stats.update(backend.usage())
+    return stats
@@ -0,0 +1,70 @@
+"""Compact rows for listing queries.
+
+Listings fetch only the columns their templates show, as plain tuples, and
+wrap them in namedtuple classes (no per-row dict, attribute access by
+index). Dates stay datetime objects; they are formatted by the template
+filters below, so only rows that are actually rendered pay for strftime.
+"""
+from collections import namedtuple
+
+# Columns each listing template reads, per table
+LISTING_COLUMNS = {
+    'quizzes': ('id', 'name', 'grade', 'end_date', 'upload_link', 'professor', 'created_at'),
+    'activities': ('id', 'name', 'grade', 'end_date', 'upload_link', 'professor', 'created_at'),
+    'worksheets': ('id', 'name', 'grade', 'end_date', 'upload_link', 'professor', 'created_at'),
+    'videos': ('id', 'title', 'description', 'grade', 'filename', 'file_size', 'created_at'),
+    'library': ('id', 'title', 'description', 'grade', 'pdf_filename', 'picture_filename', 'file_size',
+                'page_count', 'cover_thumb', 'cover_webp', 'cover_placeholder', 'created_at')
+}
+
+# Module-level names so cached pages can be pickled
+QuizRow = namedtuple('QuizRow', LISTING_COLUMNS['quizzes'])
+ActivityRow = namedtuple('ActivityRow', LISTING_COLUMNS['activities'])
+WorksheetRow = namedtuple('WorksheetRow', LISTING_COLUMNS['worksheets'])
+VideoRow = namedtuple('VideoRow', LISTING_COLUMNS['videos'])
+BookRow = namedtuple('BookRow', LISTING_COLUMNS['library'])
+
+# The student assignment feed: an assignment row plus the table it came from
+ASSIGNMENT_COLUMNS = ('kind',) + LISTING_COLUMNS['quizzes']
+AssignmentRow = namedtuple('AssignmentRow', ASSIGNMENT_COLUMNS)
+
+ROW_TYPES = {
+    'quizzes': QuizRow,
+    'activities': ActivityRow,
+    'worksheets': WorksheetRow,
+    'videos': VideoRow,
+    'library': BookRow
+}
+
+
+def listing_columns(table_name):
+    """Comma-separated column list for a listing SELECT"""
+    return ', '.join(LISTING_COLUMNS[table_name])
+
+
+def make_rows(table_name, rows):
+    """Wrap fetched tuples (in listing_columns() order) in the table's row type"""
+    return list(map(ROW_TYPES[table_name]._make, rows))
+
+
+# ==================== TEMPLATE FILTERS ====================
+def format_datetime(value):
+    """2024-05-01 14:30:00"""
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else ''
+
+
+def format_date(value):
+    """2024-05-01"""
+    return value.strftime("%Y-%m-%d") if value else ''
+
+
+def format_due(value):
+    """2024-05-01 at 14:30"""
+    return value.strftime("%Y-%m-%d at %H:%M") if value else ''
+
+
+TEMPLATE_FILTERS = {
+    'datetime': format_datetime,
+    'date': format_date,
+    'due': format_due
+}
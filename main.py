@@ -1,16 +1,32 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_from_directory
-from database_functions import (init_database, get_all_items, add_item_to_db, get_item_by_id,
+from flask import (Flask, Blueprint, Response, current_app, render_template, request, redirect, url_for, session,
+                   flash, jsonify, abort)
+from jinja2 import FileSystemBytecodeCache
+from database_functions import (init_database, add_item_to_db, get_item_by_id,
                                 update_item_in_db, delete_item_from_db, add_video_to_db,
-                                update_video_in_db, delete_video_from_db, get_videos_by_grade,
-                                search_videos_by_title, add_library_book_to_db, update_library_book_in_db,
-                                delete_library_book_from_db, get_library_books_by_grade, search_library_books_by_title)
-from config import SECRET_KEY, ADMIN_USERNAME, ADMIN_PASSWORD
+                                update_video_in_db, delete_video_from_db, add_library_book_to_db,
+                                update_library_book_in_db, delete_library_book_from_db,
+                                get_content_counts, get_items_page, compare_search_latency,
+                                get_trash_stats, restore_from_trash, bulk_delete_items, bulk_update_grade,
+                                bulk_extend_end_date, get_assignment_feed, release_blob,
+                                FEED_REFRESH_SECONDS)
+from db_pool import get_pool_stats
+from db_metrics import init_metrics, render_metrics
+from slow_queries import top_offenders
+from listing_cache import get_cache_stats
+from page_cache import cached_page, get_page_cache_stats
+from media_delivery import send_media
+from listing_rows import TEMPLATE_FILTERS
+from static_assets import init_static_assets
+from response_compression import CompressionMiddleware
+from api import api
+from blob_store import save_stream, adopt_file, incoming_path
+from storage_scanner import scan as scan_storage, repair as repair_storage
+from bulk_import import import_items, detect_format
+from job_queue import enqueue, get_job_summary, retry_job
+from chunked_upload import (UploadError, create_upload, write_chunk, upload_status, complete_upload,
+                            finish_upload, cancel_upload, abort_upload)
+from config import SECRET_KEY, ADMIN_USERNAME, ADMIN_PASSWORD, UPLOAD_CONFIG, SERVER_CONFIG, METRICS_CONFIG
 import os
-from werkzeug.utils import secure_filename
-from datetime import datetime
-
-app = Flask(__name__)
-app.secret_key = SECRET_KEY
 
 # File upload configuration
 UPLOAD_FOLDER = 'static/videos'
@@ -19,16 +35,42 @@ LIBRARY_PICTURE_FOLDER = 'static/library/pictures'
 ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'wmv', 'mkv', 'webm', 'flv', '3gp', 'm4v'}
 ALLOWED_PDF_EXTENSIONS = {'pdf'}
 ALLOWED_IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['LIBRARY_PDF_FOLDER'] = LIBRARY_PDF_FOLDER
-app.config['LIBRARY_PICTURE_FOLDER'] = LIBRARY_PICTURE_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = None  # No file size limit
 
-# Create upload folders if they don't exist
-folders = [UPLOAD_FOLDER, LIBRARY_PDF_FOLDER, LIBRARY_PICTURE_FOLDER]
-for folder in folders:
-    if not os.path.exists(folder):
-        os.makedirs(folder)
+# Every route of the portal; create_app() registers it on a new app
+portal = Blueprint('portal', __name__)
+
+
+def create_app(config=None):
+    """Build the portal app; config is a dict of Flask settings overriding the defaults"""
+    app = Flask(__name__)
+    app.secret_key = SECRET_KEY
+    app.config.update(
+        UPLOAD_FOLDER=UPLOAD_FOLDER,
+        LIBRARY_PDF_FOLDER=LIBRARY_PDF_FOLDER,
+        LIBRARY_PICTURE_FOLDER=LIBRARY_PICTURE_FOLDER,
+        MAX_CONTENT_LENGTH=None,  # No file size limit
+        TEMPLATES_AUTO_RELOAD=False,  # Templates only change on deploy; skip the mtime check per render
+        JINJA_BYTECODE_CACHE_DIR=SERVER_CONFIG['jinja_cache_dir']
+    )
+    app.config.update(config or {})
+
+    # Create upload folders if they don't exist
+    for folder in (app.config['UPLOAD_FOLDER'], app.config['LIBRARY_PDF_FOLDER'],
+                   app.config['LIBRARY_PICTURE_FOLDER']):
+        os.makedirs(folder, exist_ok=True)
+
+    # Compiled templates are shared by all workers and survive restarts
+    if app.config['JINJA_BYTECODE_CACHE_DIR']:
+        os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'])
+    app.jinja_env.filters.update(TEMPLATE_FILTERS)
+
+    app.register_blueprint(portal)
+    app.register_blueprint(api)
+    init_static_assets(app)
+    init_metrics(app)
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app)
+    return app
 
 
 def allowed_video_file(filename):
@@ -43,13 +85,31 @@ def allowed_image_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_IMAGE_EXTENSIONS
 
 
+def get_page_args():
+    """Read keyset pagination params (?cursor=...&page_size=...) from the query string"""
+    return {
+        'cursor': request.args.get('cursor'),
+        'page_size': request.args.get('page_size', type=int)
+    }
+
+
+@portal.app_template_global()
+def page_url(cursor):
+    """URL of the current listing with a different page cursor (None for the first page)"""
+    args = request.args.to_dict()
+    args.pop('cursor', None)
+    if cursor:
+        args['cursor'] = cursor
+    return url_for(request.endpoint, **args)
+
+
 # ==================== AUTHENTICATION ROUTES ====================
-@app.route("/")
+@portal.route("/")
 def login():
     return render_template("index.html")
 
 
-@app.route("/login", methods=['POST'])
+@portal.route("/login", methods=['POST'])
 def handle_login():
     username = request.form.get('username')
     password = request.form.get('password')
@@ -57,39 +117,138 @@ def handle_login():
     if username == ADMIN_USERNAME and password == ADMIN_PASSWORD:
         session['logged_in'] = True
         session['username'] = username
-        return redirect(url_for('homepage'))
+        return redirect(url_for('.homepage'))
     else:
         flash('Invalid username or password', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
 
-@app.route("/homepage")
+@portal.route("/homepage")
 def homepage():
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
     return render_template("admin_homepage.html")
 
 
-@app.route("/logout")
+@portal.route("/admin/pool_stats")
+def pool_stats():
+    if not session.get('logged_in'):
+        return redirect(url_for('.login'))
+    return jsonify(get_pool_stats())
+
+
+@portal.route("/admin/cache_stats")
+def cache_stats():
+    if not session.get('logged_in'):
+        return redirect(url_for('.login'))
+    return jsonify(dict(get_cache_stats(), pages=get_page_cache_stats()))
+
+
+@portal.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint (for admins, or the addresses in METRICS_CONFIG['allow_from'])"""
+    if not METRICS_CONFIG['enabled']:
+        abort(404)
+    if not session.get('logged_in') and request.remote_addr not in METRICS_CONFIG['allow_from']:
+        abort(403)
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+@portal.route("/admin/slow_queries")
+def slow_queries():
+    """Slowest query shapes by total time, with their EXPLAIN plans"""
+    if not session.get('logged_in'):
+        return redirect(url_for('.login'))
+    return jsonify(top_offenders(limit=min(request.args.get('limit', 20, type=int), 200)))
+
+
+@portal.route("/admin/jobs")
+def job_status():
+    """Background job counts, progress and recent failures"""
+    if not session.get('logged_in'):
+        return redirect(url_for('.login'))
+    return jsonify(get_job_summary(limit=min(request.args.get('limit', 50, type=int), 500)))
+
+
+@portal.route("/admin/jobs/<int:job_id>/retry", methods=['POST'])
+def retry_failed_job(job_id):
+    if not session.get('logged_in'):
+        return redirect(url_for('.login'))
+    retry_job(job_id)
+    return jsonify({'queued': job_id})
+
+
+@portal.route("/admin/trash")
+def trash_status():
+    """Deleted videos/books awaiting purge, with pending bytes"""
+    if not session.get('logged_in'):
+        return redirect(url_for('.login'))
+    stats = get_trash_stats(limit=min(request.args.get('limit', 50, type=int), 500))
+    if stats is None:
+        return jsonify({'error': 'Could not read the trash'}), 500
+    return jsonify(stats)
+
+
+@portal.route("/admin/trash/<int:trash_id>/restore", methods=['POST'])
+def restore_trashed_item(trash_id):
+    """Undo a video/book delete while its files are still in the trash"""
+    if not session.get('logged_in'):
+        return redirect(url_for('.login'))
+    table_name = restore_from_trash(trash_id)
+    if not table_name:
+        return jsonify({'error': 'Nothing to restore (already purged or restored)'}), 404
+    return jsonify({'restored': trash_id, 'table': table_name})
+
+
+@portal.route("/admin/storage_scan", methods=['GET', 'POST'])
+def storage_scan():
+    """Media files vs database rows; POST also repairs (?verify=1 re-hashes changed files)"""
+    if not session.get('logged_in'):
+        return redirect(url_for('.login'))
+    try:
+        report = scan_storage(verify=request.args.get('verify') == '1')
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 500
+    if request.method == 'POST':
+        report['repaired'] = repair_storage(report)
+    return jsonify(report)
+
+
+@portal.route("/admin/search_latency")
+def search_latency():
+    """Compare FULLTEXT and LIKE search timings, e.g. ?table=videos&q=algebra"""
+    if not session.get('logged_in'):
+        return redirect(url_for('.login'))
+
+    table = request.args.get('table', 'videos')
+    if table not in ('videos', 'library'):
+        return jsonify({'error': 'table must be videos or library'}), 400
+
+    return jsonify(compare_search_latency(table, request.args.get('q', ''),
+                                          grade=request.args.get('grade'),
+                                          runs=min(request.args.get('runs', 10, type=int), 100)))
+
+
+@portal.route("/logout")
 def logout():
     session.clear()
     flash('You have been logged out', 'success')
-    return redirect(url_for('login'))
+    return redirect(url_for('.login'))
 
 
 # ==================== QUIZ ROUTES ====================
-@app.route("/manage_quizzes")
+@portal.route("/manage_quizzes")
 def manage_quizzes():
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
-    quizzes = get_all_items('quizzes')
-    return render_template("manage_quizzes.html", quizzes=quizzes)
+        return redirect(url_for('.login'))
+    quizzes, next_cursor = get_items_page('quizzes', **get_page_args())
+    return render_template("manage_quizzes.html", quizzes=quizzes, next_cursor=next_cursor)
 
 
-@app.route("/add_quiz", methods=['POST'])
+@portal.route("/add_quiz", methods=['POST'])
 def add_quiz():
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     quiz_data = {
         'name': request.form.get('name'),
@@ -104,26 +263,26 @@ def add_quiz():
     else:
         flash('Error adding quiz. Please try again.', 'error')
 
-    return redirect(url_for('manage_quizzes'))
+    return redirect(url_for('.manage_quizzes'))
 
 
-@app.route("/edit_quiz/<int:quiz_id>")
+@portal.route("/edit_quiz/<int:quiz_id>")
 def edit_quiz(quiz_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     quiz = get_item_by_id('quizzes', quiz_id)
     if not quiz:
         flash('Quiz not found!', 'error')
-        return redirect(url_for('manage_quizzes'))
+        return redirect(url_for('.manage_quizzes'))
 
     return render_template("edit_quiz.html", quiz=quiz)
 
 
-@app.route("/update_quiz/<int:quiz_id>", methods=['POST'])
+@portal.route("/update_quiz/<int:quiz_id>", methods=['POST'])
 def update_quiz(quiz_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     quiz_data = {
         'name': request.form.get('name'),
@@ -138,35 +297,35 @@ def update_quiz(quiz_id):
     else:
         flash('Error updating quiz. Please try again.', 'error')
 
-    return redirect(url_for('manage_quizzes'))
+    return redirect(url_for('.manage_quizzes'))
 
 
-@app.route("/delete_quiz/<int:quiz_id>")
+@portal.route("/delete_quiz/<int:quiz_id>")
 def delete_quiz(quiz_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     if delete_item_from_db('quizzes', quiz_id):
         flash('Quiz deleted successfully!', 'success')
     else:
         flash('Error deleting quiz. Please try again.', 'error')
 
-    return redirect(url_for('manage_quizzes'))
+    return redirect(url_for('.manage_quizzes'))
 
 
 # ==================== ACTIVITY ROUTES ====================
-@app.route("/manage_activities")
+@portal.route("/manage_activities")
 def manage_activities():
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
-    activities = get_all_items('activities')
-    return render_template("manage_activity.html", activities=activities)
+        return redirect(url_for('.login'))
+    activities, next_cursor = get_items_page('activities', **get_page_args())
+    return render_template("manage_activity.html", activities=activities, next_cursor=next_cursor)
 
 
-@app.route("/add_activity", methods=['POST'])
+@portal.route("/add_activity", methods=['POST'])
 def add_activity():
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     activity_data = {
         'name': request.form.get('name'),
@@ -181,26 +340,26 @@ def add_activity():
     else:
         flash('Error adding activity. Please try again.', 'error')
 
-    return redirect(url_for('manage_activities'))
+    return redirect(url_for('.manage_activities'))
 
 
-@app.route("/edit_activity/<int:activity_id>")
+@portal.route("/edit_activity/<int:activity_id>")
 def edit_activity(activity_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     activity = get_item_by_id('activities', activity_id)
     if not activity:
         flash('Activity not found!', 'error')
-        return redirect(url_for('manage_activities'))
+        return redirect(url_for('.manage_activities'))
 
     return render_template("edit_activity.html", activity=activity)
 
 
-@app.route("/update_activity/<int:activity_id>", methods=['POST'])
+@portal.route("/update_activity/<int:activity_id>", methods=['POST'])
 def update_activity(activity_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     activity_data = {
         'name': request.form.get('name'),
@@ -215,35 +374,35 @@ def update_activity(activity_id):
     else:
         flash('Error updating activity. Please try again.', 'error')
 
-    return redirect(url_for('manage_activities'))
+    return redirect(url_for('.manage_activities'))
 
 
-@app.route("/delete_activity/<int:activity_id>")
+@portal.route("/delete_activity/<int:activity_id>")
 def delete_activity(activity_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     if delete_item_from_db('activities', activity_id):
         flash('Activity deleted successfully!', 'success')
     else:
         flash('Error deleting activity. Please try again.', 'error')
 
-    return redirect(url_for('manage_activities'))
+    return redirect(url_for('.manage_activities'))
 
 
 # ==================== WORKSHEET ROUTES ====================
-@app.route("/manage_worksheets")
+@portal.route("/manage_worksheets")
 def manage_worksheets():
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
-    worksheets = get_all_items('worksheets')
-    return render_template("manage_worksheets.html", worksheets=worksheets)
+        return redirect(url_for('.login'))
+    worksheets, next_cursor = get_items_page('worksheets', **get_page_args())
+    return render_template("manage_worksheets.html", worksheets=worksheets, next_cursor=next_cursor)
 
 
-@app.route("/add_worksheet", methods=['POST'])
+@portal.route("/add_worksheet", methods=['POST'])
 def add_worksheet():
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     worksheet_data = {
         'name': request.form.get('name'),
@@ -258,26 +417,26 @@ def add_worksheet():
     else:
         flash('Error adding worksheet. Please try again.', 'error')
 
-    return redirect(url_for('manage_worksheets'))
+    return redirect(url_for('.manage_worksheets'))
 
 
-@app.route("/edit_worksheet/<int:worksheet_id>")
+@portal.route("/edit_worksheet/<int:worksheet_id>")
 def edit_worksheet(worksheet_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     worksheet = get_item_by_id('worksheets', worksheet_id)
     if not worksheet:
         flash('Worksheet not found!', 'error')
-        return redirect(url_for('manage_worksheets'))
+        return redirect(url_for('.manage_worksheets'))
 
-    return render_template("edit_worksheet.html", worksheet=worksheet)
+    return render_template("edit_worksheets.html", worksheet=worksheet)
 
 
-@app.route("/update_worksheet/<int:worksheet_id>", methods=['POST'])
+@portal.route("/update_worksheet/<int:worksheet_id>", methods=['POST'])
 def update_worksheet(worksheet_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     worksheet_data = {
         'name': request.form.get('name'),
@@ -292,54 +451,47 @@ def update_worksheet(worksheet_id):
     else:
         flash('Error updating worksheet. Please try again.', 'error')
 
-    return redirect(url_for('manage_worksheets'))
+    return redirect(url_for('.manage_worksheets'))
 
 
-@app.route("/delete_worksheet/<int:worksheet_id>")
+@portal.route("/delete_worksheet/<int:worksheet_id>")
 def delete_worksheet(worksheet_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     if delete_item_from_db('worksheets', worksheet_id):
         flash('Worksheet deleted successfully!', 'success')
     else:
         flash('Error deleting worksheet. Please try again.', 'error')
 
-    return redirect(url_for('manage_worksheets'))
+    return redirect(url_for('.manage_worksheets'))
 
 
 # ==================== VIDEO ROUTES ====================
-@app.route("/manage_videos")
+@portal.route("/manage_videos")
 def manage_videos():
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
     return render_template("manage_videos.html")
 
 
-@app.route("/upload_video", methods=['POST'])
+@portal.route("/upload_video", methods=['POST'])
 def upload_video():
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     # Check if file was uploaded
     if 'video_file' not in request.files:
         flash('No video file selected!', 'error')
-        return redirect(url_for('manage_videos'))
+        return redirect(url_for('.manage_videos'))
 
     file = request.files['video_file']
     if file.filename == '' or not allowed_video_file(file.filename):
         flash('Please select a valid video file!', 'error')
-        return redirect(url_for('manage_videos'))
-
-    # Save file with timestamp
-    filename = secure_filename(file.filename)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_")
-    filename = timestamp + filename
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(file_path)
+        return redirect(url_for('.manage_videos'))
 
-    # Get file size
-    file_size = os.path.getsize(file_path)
+    # Store the file by content (hashed while streaming), once per unique video
+    filename, file_size, _ = save_stream(file.stream, 'videos', file.filename)
 
     video_data = {
         'title': request.form.get('title'),
@@ -353,50 +505,43 @@ def upload_video():
         flash('Video uploaded successfully!', 'success')
     else:
         flash('Error uploading video. Please try again.', 'error')
-        # Clean up file if database insert failed
-        try:
-            os.remove(file_path)
-        except:
-            pass
+        # Give back the file's reference; it is removed if no other video uses it
+        release_blob('videos', filename)
 
-    return redirect(url_for('video_library'))
+    return redirect(url_for('.video_library'))
 
 
-@app.route("/video_library")
+@portal.route("/video_library")
 def video_library():
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     grade = request.args.get('grade')
     search = request.args.get('search')
 
-    if search:
-        videos = search_videos_by_title(search)
-    elif grade:
-        videos = get_videos_by_grade(grade)
-    else:
-        videos = get_all_items('videos')
+    # Searches are ranked by relevance and can be combined with the grade filter
+    videos, next_cursor = get_items_page('videos', grade=grade, title_query=search, **get_page_args())
 
-    return render_template("video_library.html", videos=videos, selected_grade=grade)
+    return render_template("video_library.html", videos=videos, selected_grade=grade, next_cursor=next_cursor)
 
 
-@app.route("/edit_video/<int:video_id>")
+@portal.route("/edit_video/<int:video_id>")
 def edit_video(video_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     video = get_item_by_id('videos', video_id)
     if not video:
         flash('Video not found!', 'error')
-        return redirect(url_for('video_library'))
+        return redirect(url_for('.video_library'))
 
     return render_template("edit_video.html", video=video)
 
 
-@app.route("/update_video/<int:video_id>", methods=['POST'])
+@portal.route("/update_video/<int:video_id>", methods=['POST'])
 def update_video(video_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     video_data = {
         'title': request.form.get('title'),
@@ -409,86 +554,90 @@ def update_video(video_id):
     else:
         flash('Error updating video. Please try again.', 'error')
 
-    return redirect(url_for('video_library'))
+    return redirect(url_for('.video_library'))
 
 
-@app.route("/delete_video/<int:video_id>")
+@portal.route("/delete_video/<int:video_id>")
 def delete_video(video_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     if delete_video_from_db(video_id):
         flash('Video deleted successfully!', 'success')
     else:
         flash('Error deleting video. Please try again.', 'error')
 
-    return redirect(url_for('video_library'))
+    return redirect(url_for('.video_library'))
 
 
-@app.route("/download_video/<int:video_id>")
+@portal.route("/download_video/<int:video_id>")
 def download_video(video_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     video = get_item_by_id('videos', video_id)
     if not video:
         flash('Video not found!', 'error')
-        return redirect(url_for('video_library'))
+        return redirect(url_for('.video_library'))
 
     try:
-        return send_from_directory(
-            app.config['UPLOAD_FOLDER'],
+        return send_media(
+            current_app.config['UPLOAD_FOLDER'],
             video['filename'],
             as_attachment=True,
             download_name=f"{video['title']}.{video['filename'].split('.')[-1]}"
         )
     except Exception as e:
         flash('Error downloading video. Please try again.', 'error')
-        return redirect(url_for('video_library'))
+        return redirect(url_for('.video_library'))
 
 
 # ==================== LIBRARY ROUTES ====================
-@app.route("/manage_library")
+@portal.route("/manage_library")
 def manage_library():
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
     return render_template("manage_library.html")
 
 
-@app.route("/upload_book", methods=['POST'])
+def queue_book_processing(book_id, book_data):
+    """Hand cover resizing and PDF page counting to the background job worker"""
+    try:
+        enqueue('process_book_assets', {
+            'book_id': book_id,
+            'pdf_filename': book_data['pdf_filename'],
+            'picture_filename': book_data['picture_filename']
+        })
+    except Exception as e:
+        # The book is saved; it just keeps showing the full-size cover
+        print(f"Error queueing book processing: {e}")
+
+
+@portal.route("/upload_book", methods=['POST'])
 def upload_book():
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     # Check if PDF was uploaded
     if 'pdf_file' not in request.files:
         flash('No PDF file selected!', 'error')
-        return redirect(url_for('manage_library'))
+        return redirect(url_for('.manage_library'))
 
     pdf_file = request.files['pdf_file']
     if pdf_file.filename == '' or not allowed_pdf_file(pdf_file.filename):
         flash('Please select a valid PDF file!', 'error')
-        return redirect(url_for('manage_library'))
-
-    # Save PDF file with timestamp
-    pdf_filename = secure_filename(pdf_file.filename)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_")
-    pdf_filename = timestamp + pdf_filename
-    pdf_path = os.path.join(app.config['LIBRARY_PDF_FOLDER'], pdf_filename)
-    pdf_file.save(pdf_path)
+        return redirect(url_for('.manage_library'))
 
-    # Get PDF file size
-    file_size = os.path.getsize(pdf_path)
+    # Store PDF by content (hashed while streaming), once per unique file
+    pdf_filename, file_size, _ = save_stream(pdf_file.stream, 'pdfs', pdf_file.filename)
 
     # Handle optional picture file
     picture_filename = None
     if 'picture_file' in request.files:
         picture_file = request.files['picture_file']
         if picture_file.filename != '' and allowed_image_file(picture_file.filename):
-            picture_filename = secure_filename(picture_file.filename)
-            picture_filename = timestamp + picture_filename
-            picture_path = os.path.join(app.config['LIBRARY_PICTURE_FOLDER'], picture_filename)
-            picture_file.save(picture_path)
+            picture_filename, _, _ = save_stream(
+                picture_file.stream, 'pictures', picture_file.filename)
 
     book_data = {
         'title': request.form.get('title'),
@@ -499,56 +648,51 @@ def upload_book():
         'file_size': file_size
     }
 
-    if add_library_book_to_db(book_data):
+    book_id = add_library_book_to_db(book_data)
+    if book_id:
+        queue_book_processing(book_id, book_data)
         flash('Book uploaded successfully!', 'success')
     else:
         flash('Error uploading book. Please try again.', 'error')
-        # Clean up files if database insert failed
-        try:
-            os.remove(pdf_path)
-            if picture_filename:
-                os.remove(picture_path)
-        except:
-            pass
+        # Give back the files' references; they are removed if no other book uses them
+        release_blob('pdfs', pdf_filename)
+        if picture_filename:
+            release_blob('pictures', picture_filename)
 
-    return redirect(url_for('library_books'))
+    return redirect(url_for('.library_books'))
 
 
-@app.route("/library_books")
+@portal.route("/library_books")
 def library_books():
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     grade = request.args.get('grade')
     search = request.args.get('search')
 
-    if search:
-        books = search_library_books_by_title(search)
-    elif grade:
-        books = get_library_books_by_grade(grade)
-    else:
-        books = get_all_items('library')
+    # Searches are ranked by relevance and can be combined with the grade filter
+    books, next_cursor = get_items_page('library', grade=grade, title_query=search, **get_page_args())
 
-    return render_template("library_books.html", books=books, selected_grade=grade)
+    return render_template("library_books.html", books=books, selected_grade=grade, next_cursor=next_cursor)
 
 
-@app.route("/edit_book/<int:book_id>")
+@portal.route("/edit_book/<int:book_id>")
 def edit_book(book_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     book = get_item_by_id('library', book_id)
     if not book:
         flash('Book not found!', 'error')
-        return redirect(url_for('library_books'))
+        return redirect(url_for('.library_books'))
 
     return render_template("edit_book.html", book=book)
 
 
-@app.route("/update_book/<int:book_id>", methods=['POST'])
+@portal.route("/update_book/<int:book_id>", methods=['POST'])
 def update_book(book_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     book_data = {
         'title': request.form.get('title'),
@@ -561,120 +705,334 @@ def update_book(book_id):
     else:
         flash('Error updating book. Please try again.', 'error')
 
-    return redirect(url_for('library_books'))
+    return redirect(url_for('.library_books'))
 
 
-@app.route("/delete_book/<int:book_id>")
+@portal.route("/delete_book/<int:book_id>")
 def delete_book(book_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     if delete_library_book_from_db(book_id):
         flash('Book deleted successfully!', 'success')
     else:
         flash('Error deleting book. Please try again.', 'error')
 
-    return redirect(url_for('library_books'))
+    return redirect(url_for('.library_books'))
 
 
-@app.route("/download_book/<int:book_id>")
+@portal.route("/download_book/<int:book_id>")
 def download_book(book_id):
     if not session.get('logged_in'):
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     book = get_item_by_id('library', book_id)
     if not book:
         flash('Book not found!', 'error')
-        return redirect(url_for('library_books'))
+        return redirect(url_for('.library_books'))
 
     try:
-        return send_from_directory(
-            app.config['LIBRARY_PDF_FOLDER'],
+        return send_media(
+            current_app.config['LIBRARY_PDF_FOLDER'],
             book['pdf_filename'],
             as_attachment=True,
             download_name=f"{book['title']}.pdf"
         )
     except Exception as e:
         flash('Error downloading book. Please try again.', 'error')
-        return redirect(url_for('library_books'))
+        return redirect(url_for('.library_books'))
+
+
+# ==================== MEDIA DELIVERY ====================
+MEDIA_FOLDERS = {
+    'videos': 'UPLOAD_FOLDER',
+    'pdfs': 'LIBRARY_PDF_FOLDER',
+    'pictures': 'LIBRARY_PICTURE_FOLDER'
+}
+
+
+@portal.route("/media/<kind>/<path:filename>")
+def media(kind, filename):
+    """Videos, PDFs and covers with Range, ETag and long-lived caching (public, like /static)"""
+    if kind not in MEDIA_FOLDERS:
+        abort(404)
+    return send_media(current_app.config[MEDIA_FOLDERS[kind]], filename)
+
+
+# ==================== CHUNKED UPLOAD ROUTES ====================
+# Resumable uploads in tus style: create, PATCH chunks at byte offsets (in any
+# order, several at once), check progress, then commit with the form fields.
+@portal.errorhandler(UploadError)
+def handle_upload_error(error):
+    return jsonify({'error': str(error)}), error.status
+
+
+@portal.route("/uploads", methods=['POST'])
+def start_chunked_upload():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'Not logged in'}), 401
+
+    data = request.get_json(silent=True) or request.form
+    kind = data.get('kind')
+    filename = data.get('filename', '')
+    if kind == 'video' and not allowed_video_file(filename):
+        raise UploadError('Please select a valid video file!')
+    if kind == 'book' and not allowed_pdf_file(filename):
+        raise UploadError('Please select a valid PDF file!')
+
+    upload = create_upload(kind, filename, data.get('size'))
+    response = jsonify(upload)
+    response.status_code = 201
+    response.headers['Location'] = url_for('.chunked_upload', upload_id=upload['upload_id'])
+    response.headers['Upload-Offset'] = '0'
+    response.headers['Upload-Length'] = str(upload['size'])
+    return response
+
+
+@portal.route("/uploads/<upload_id>", methods=['GET', 'PATCH', 'DELETE'])
+def chunked_upload(upload_id):
+    if not session.get('logged_in'):
+        return jsonify({'error': 'Not logged in'}), 401
+
+    if request.method == 'PATCH':
+        if (request.content_length or 0) > UPLOAD_CONFIG['max_chunk_size']:
+            raise UploadError('Chunk too large', 413)
+        offset = write_chunk(upload_id, request.headers.get('Upload-Offset'),
+                             request.get_data(cache=False), request.headers.get('Upload-Checksum'))
+        return '', 204, {'Upload-Offset': str(offset)}
+
+    if request.method == 'DELETE':
+        abort_upload(upload_id)
+        return '', 204
+
+    status = upload_status(upload_id)
+    response = jsonify(status)
+    response.headers['Upload-Offset'] = str(status['offset'])
+    response.headers['Upload-Length'] = str(status['size'])
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@portal.route("/uploads/<upload_id>/commit", methods=['POST'])
+def commit_chunked_upload(upload_id):
+    """Move the assembled file into place and create the video or book row"""
+    if not session.get('logged_in'):
+        return jsonify({'error': 'Not logged in'}), 401
+
+    upload = upload_status(upload_id)
+    kind = 'videos' if upload['kind'] == 'video' else 'pdfs'
+
+    # Assemble next to the blob folder, then hash it into its content address. The upload
+    # is kept until the row is committed, so a failed commit can be retried.
+    temp_path = incoming_path(kind)
+    complete_upload(upload_id, os.path.dirname(temp_path), os.path.basename(temp_path))
+    try:
+        filename, file_size, _ = adopt_file(temp_path, kind, upload['filename'])
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        cancel_upload(upload_id)
+        raise
+
+    if kind == 'videos':
+        video_data = {
+            'title': request.form.get('title'),
+            'description': request.form.get('description'),
+            'grade': request.form.get('grade'),
+            'filename': filename,
+            'file_size': file_size
+        }
+        if add_video_to_db(video_data):
+            finish_upload(upload_id)
+            flash('Video uploaded successfully!', 'success')
+            return jsonify({'redirect': url_for('.video_library')})
+        release_blob('videos', filename)
+        cancel_upload(upload_id)
+        raise UploadError('Error uploading video. Please try again.', 500)
+
+    # The optional cover picture is small, so it comes with the commit request
+    picture_filename = None
+    picture_file = request.files.get('picture_file')
+    if picture_file and picture_file.filename != '' and allowed_image_file(picture_file.filename):
+        picture_filename, _, _ = save_stream(
+            picture_file.stream, 'pictures', picture_file.filename)
+
+    book_data = {
+        'title': request.form.get('title'),
+        'description': request.form.get('description'),
+        'grade': request.form.get('grade'),
+        'pdf_filename': filename,
+        'picture_filename': picture_filename,
+        'file_size': file_size
+    }
+    book_id = add_library_book_to_db(book_data)
+    if book_id:
+        finish_upload(upload_id)
+        queue_book_processing(book_id, book_data)
+        flash('Book uploaded successfully!', 'success')
+        return jsonify({'redirect': url_for('.library_books')})
+    release_blob('pdfs', filename)
+    if picture_filename:
+        release_blob('pictures', picture_filename)
+    cancel_upload(upload_id)
+    raise UploadError('Error uploading book. Please try again.', 500)
+
+
+# ==================== BULK OPERATIONS ====================
+# Table -> (page to return to, plural noun for messages)
+BULK_TABLES = {
+    'quizzes': ('manage_quizzes', 'quizzes'),
+    'activities': ('manage_activities', 'activities'),
+    'worksheets': ('manage_worksheets', 'worksheets'),
+    'videos': ('video_library', 'videos'),
+    'library': ('library_books', 'books')
+}
+MAX_BULK_ITEMS = 1000
+
+
+@portal.route("/bulk/<table_name>", methods=['POST'])
+def bulk_action(table_name):
+    """Delete, change the grade of, or extend the end date of the selected items"""
+    if not session.get('logged_in'):
+        return redirect(url_for('.login'))
+    if table_name not in BULK_TABLES:
+        abort(404)
+
+    page, noun = BULK_TABLES[table_name]
+    ids = sorted({int(i) for i in request.form.getlist('ids') if i.isdigit()})[:MAX_BULK_ITEMS]
+    action = request.form.get('action')
+
+    if not ids:
+        flash('No items selected.', 'error')
+    elif action == 'delete':
+        count = bulk_delete_items(table_name, ids)
+        if count is False:
+            flash(f'Error deleting {noun}. Please try again.', 'error')
+        else:
+            flash(f'{count} {noun} deleted successfully!', 'success')
+    elif action == 'grade' and request.form.get('grade'):
+        count = bulk_update_grade(table_name, ids, request.form['grade'])
+        if count is False:
+            flash(f'Error updating {noun}. Please try again.', 'error')
+        else:
+            flash(f"{count} {noun} moved to {request.form['grade']}.", 'success')
+    elif action == 'extend' and table_name in ('quizzes', 'activities', 'worksheets'):
+        days = request.form.get('days', type=int)
+        if not days or not 1 <= days <= 365:
+            flash('Enter between 1 and 365 days.', 'error')
+        else:
+            count = bulk_extend_end_date(table_name, ids, days)
+            if count is False:
+                flash(f'Error updating {noun}. Please try again.', 'error')
+            else:
+                flash(f'Extended the end date of {count} {noun} by {days} days.', 'success')
+    else:
+        flash('Choose a bulk action.', 'error')
+
+    # Back to the same filtered page the selection was made on
+    next_url = request.form.get('next', '')
+    if not next_url.startswith('/') or next_url.startswith('//'):
+        next_url = url_for(f'.{page}')
+    return redirect(next_url)
+
+
+# ==================== BULK IMPORT ====================
+@portal.route("/import/<table_name>", methods=['POST'])
+def bulk_import(table_name):
+    """Import quizzes/activities/worksheets from an uploaded CSV or JSONL file.
+
+    Form fields: file, optional format (csv/jsonl) and dry_run=1. Returns
+    the import report as JSON, with one entry per rejected row.
+    """
+    if not session.get('logged_in'):
+        return redirect(url_for('.login'))
+    if table_name not in ('quizzes', 'activities', 'worksheets'):
+        abort(404)
+
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    file_format = request.form.get('format') or detect_format(file.filename)
+    if file_format not in ('csv', 'jsonl'):
+        return jsonify({'error': 'Upload a .csv or .jsonl file'}), 400
+
+    # The upload is spooled to disk by Werkzeug and parsed as a stream
+    report = import_items(table_name, file.stream, file_format, dry_run=request.form.get('dry_run') == '1')
+    return jsonify(report)
 
 
 # ==================== STUDENT ROUTES ====================
-@app.route("/student_homepage")
+@portal.route("/student_homepage")
+@cached_page('quizzes', 'activities', 'worksheets', 'videos', 'library')
 def student_homepage():
     """Student homepage - shows all available content sections"""
-    # Get counts for each content type
-    quizzes = get_all_items('quizzes')
-    activities = get_all_items('activities')
-    worksheets = get_all_items('worksheets')
-    videos = get_all_items('videos')
-    books = get_all_items('library')
-
-    counts = {
-        'quizzes': len(quizzes),
-        'activities': len(activities),
-        'worksheets': len(worksheets),
-        'videos': len(videos),
-        'books': len(books)
-    }
+    # Get counts for each content type (one query against the maintained counters)
+    counts = get_content_counts(grade=request.args.get('grade'))
 
     return render_template("student_homepage.html", counts=counts)
 
 
 # ==================== STUDENT CONTENT VIEW ROUTES ====================
-@app.route("/student/quizzes")
+@portal.route("/student/quizzes")
+@cached_page('quizzes')
 def student_quizzes():
     """View available quizzes for student"""
-    quizzes = get_all_items('quizzes')
-    return render_template("student_quizzes.html", quizzes=quizzes)
+    quizzes, next_cursor = get_items_page('quizzes', **get_page_args())
+    return render_template("student_quizzes.html", quizzes=quizzes, next_cursor=next_cursor)
 
 
-@app.route("/student/activities")
+@portal.route("/student/activities")
+@cached_page('activities')
 def student_activities():
     """View available activities for student"""
-    activities = get_all_items('activities')
-    return render_template("student_activities.html", activities=activities)
+    activities, next_cursor = get_items_page('activities', **get_page_args())
+    return render_template("student_activities.html", activities=activities, next_cursor=next_cursor)
 
 
-@app.route("/student/worksheets")
+@portal.route("/student/worksheets")
+@cached_page('worksheets')
 def student_worksheets():
     """View available worksheets for student"""
-    worksheets = get_all_items('worksheets')
-    return render_template("student_worksheets.html", worksheets=worksheets)
+    worksheets, next_cursor = get_items_page('worksheets', **get_page_args())
+    return render_template("student_worksheets.html", worksheets=worksheets, next_cursor=next_cursor)
+
+
+@portal.route("/student/assignments")
+@cached_page('quizzes', 'activities', 'worksheets', refresh_seconds=FEED_REFRESH_SECONDS)
+def student_assignments():
+    """Open quizzes, activities and worksheets in one list, nearest deadline first"""
+    assignments, next_cursor = get_assignment_feed(grade=request.args.get('grade'),
+                                                   due_within=request.args.get('due_within', type=int),
+                                                   **get_page_args())
+    return render_template("student_assignments.html", assignments=assignments, next_cursor=next_cursor)
 
 
-@app.route("/student/videos")
+@portal.route("/student/videos")
+@cached_page('videos')
 def student_videos():
     """View available videos for student"""
     search = request.args.get('search')
     grade = request.args.get('grade')
 
-    if search:
-        videos = search_videos_by_title(search)
-    elif grade:
-        videos = get_videos_by_grade(grade)
-    else:
-        videos = get_all_items('videos')
+    # Searches are ranked by relevance and can be combined with the grade filter
+    videos, next_cursor = get_items_page('videos', grade=grade, title_query=search, **get_page_args())
 
-    return render_template("student_videos.html", videos=videos)
+    return render_template("student_videos.html", videos=videos, next_cursor=next_cursor)
 
 
-@app.route("/student/library")
+@portal.route("/student/library")
+@cached_page('library')
 def student_library():
     """View available library books for student"""
     search = request.args.get('search')
     grade = request.args.get('grade')
 
-    if search:
-        books = search_library_books_by_title(search)
-    elif grade:
-        books = get_library_books_by_grade(grade)
-    else:
-        books = get_all_items('library')
+    # Searches are ranked by relevance and can be combined with the grade filter
+    books, next_cursor = get_items_page('library', grade=grade, title_query=search, **get_page_args())
 
-    return render_template("student_library.html", books=books)
+    return render_template("student_library.html", books=books, next_cursor=next_cursor)
 
 if __name__ == "__main__":
-    # Initialize database on startup
+    # Development server; production runs the prefork server (python server.py)
     init_database()
-    app.run(debug=True)
\ No newline at end of file
+    create_app({'TEMPLATES_AUTO_RELOAD': True}).run(debug=True)
\ No newline at end of file
@@ -0,0 +1,160 @@
+import hashlib
+import mimetypes
+import os
+import uuid
+from urllib.parse import quote
+
+from flask import Response, abort, request
+from werkzeug.http import http_date, parse_date, parse_range_header, quote_etag
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+from config import MEDIA_CACHE_SECONDS
+
+READ_BLOCK_SIZE = 256 * 1024
+MAX_RANGES = 16  # More ranges than this are served as the full file
+
+
+def _media_etag(filename, stat):
+    """Strong validator: media files are never rewritten in place, so name+size+mtime identify the bytes"""
+    token = f"{filename}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha1(token.encode()).hexdigest()
+
+
+def _satisfiable_ranges(range_header, size):
+    """Turn a parsed Range header into sorted, merged [start, end) pairs within the file"""
+    ranges = []
+    for begin, end in range_header.ranges:
+        if begin < 0:
+            start, stop = max(size + begin, 0), size
+        else:
+            start, stop = begin, min(end if end is not None else size, size)
+        if start < stop:
+            ranges.append([start, stop])
+    ranges.sort()
+
+    merged = []
+    for start, stop in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], stop)
+        else:
+            merged.append([start, stop])
+    return merged
+
+
+def _if_range_matches(etag, last_modified):
+    """A Range is honoured only if If-Range (when sent) still names this version"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # Weak validators never match for If-Range
+        return if_range == quote_etag(etag)
+    date = parse_date(if_range)
+    return date is not None and int(last_modified) <= date.timestamp()
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since:
+        return int(last_modified) <= request.if_modified_since.timestamp()
+    return False
+
+
+def _read_span(path, start, stop):
+    """Pure-Python fallback: stream bytes [start, stop) in blocks"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            block = f.read(min(READ_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def _read_multipart(path, ranges, size, mimetype, boundary):
+    for start, stop in ranges:
+        yield (f"\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n"
+               f"Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n").encode()
+        yield from _read_span(path, start, stop)
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
+def _multipart_length(ranges, size, mimetype, boundary):
+    length = len(f"\r\n--{boundary}--\r\n")
+    for start, stop in ranges:
+        length += len(f"\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n"
+                      f"Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n")
+        length += stop - start
+    return length
+
+
+def _file_body(path, start=0):
+    """Body running from start to EOF, handed to the server's wsgi.file_wrapper (sendfile) when it has one"""
+    f = open(path, 'rb')
+    if start:
+        f.seek(start)
+    return wrap_file(request.environ, f, READ_BLOCK_SIZE)
+
+
+def send_media(directory, filename, as_attachment=False, download_name=None, mimetype=None):
+    """Serve a video or PDF with byte ranges, strong ETags and conditional GET.
+
+    Handles If-None-Match / If-Modified-Since (304), If-Range, single ranges
+    (206) and multi-range requests (multipart/byteranges).
+    """
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = _media_etag(filename, stat)
+    mimetype = mimetype or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    headers = {
+        'ETag': quote_etag(etag),
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': f'public, max-age={MEDIA_CACHE_SECONDS}, immutable'
+    }
+    if as_attachment:
+        name = download_name or os.path.basename(filename)
+        ascii_name = name.encode('ascii', 'ignore').decode().replace('"', '') or 'download'
+        headers['Content-Disposition'] = f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(name)}"
+
+    if _not_modified(etag, stat.st_mtime):
+        return Response(status=304, headers=headers)
+
+    range_header = parse_range_header(request.headers.get('Range'))
+    if range_header is None or range_header.units != 'bytes' or not _if_range_matches(etag, stat.st_mtime):
+        headers['Content-Length'] = str(size)
+        return Response(_file_body(path), status=200, mimetype=mimetype, headers=headers,
+                        direct_passthrough=True)
+
+    ranges = _satisfiable_ranges(range_header, size)
+    if not ranges:
+        headers['Content-Range'] = f'bytes */{size}'
+        return Response(status=416, headers=headers)
+
+    if len(ranges) == 1:
+        start, stop = ranges[0]
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+        headers['Content-Length'] = str(stop - start)
+        # Seeking requests are usually open-ended ("bytes=N-"), which can go through sendfile
+        body = _file_body(path, start) if stop == size else _read_span(path, start, stop)
+        return Response(body, status=206, mimetype=mimetype, headers=headers, direct_passthrough=True)
+
+    if len(ranges) > MAX_RANGES:
+        headers['Content-Length'] = str(size)
+        return Response(_file_body(path), status=200, mimetype=mimetype, headers=headers,
+                        direct_passthrough=True)
+
+    boundary = uuid.uuid4().hex
+    headers['Content-Length'] = str(_multipart_length(ranges, size, mimetype, boundary))
+    return Response(_read_multipart(path, ranges, size, mimetype, boundary), status=206,
+                    content_type=f'multipart/byteranges; boundary={boundary}', headers=headers,
+                    direct_passthrough=True)
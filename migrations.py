@@ -0,0 +1,296 @@
+import sqlite3
+
+import mysql.connector
+from mysql.connector import Error, errorcode
+
+from config import DB_BACKEND, DB_CONFIG, SQLITE_CONFIG
+from sqlite_backend import connect as sqlite_connect
+
+CONTENT_TABLES = ['quizzes', 'activities', 'worksheets', 'videos', 'library']
+ASSIGNMENT_TABLES = ['quizzes', 'activities', 'worksheets']
+
+
+# ==================== MIGRATION STEPS ====================
+# Each step must be safe to re-run: a crash between the step and the
+# schema_version insert leaves it applied but unrecorded.
+
+def _create_content_tables(cursor):
+    """Create the quizzes/activities/worksheets/videos/library tables"""
+    for table in ASSIGNMENT_TABLES:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            grade VARCHAR(50) NOT NULL,
+            end_date DATETIME NULL,
+            upload_link TEXT NOT NULL,
+            professor VARCHAR(255) NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP NULL ON UPDATE CURRENT_TIMESTAMP
+        )
+        """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS videos (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        title VARCHAR(255) NOT NULL,
+        description TEXT NULL,
+        grade VARCHAR(50) NOT NULL,
+        filename VARCHAR(255) NOT NULL,
+        file_size BIGINT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP NULL ON UPDATE CURRENT_TIMESTAMP
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS library (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        title VARCHAR(255) NOT NULL,
+        description TEXT NULL,
+        grade VARCHAR(50) NOT NULL,
+        pdf_filename VARCHAR(255) NOT NULL,
+        picture_filename VARCHAR(255) NULL,
+        file_size BIGINT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP NULL ON UPDATE CURRENT_TIMESTAMP
+    )
+    """)
+
+
+def _create_content_counts(cursor):
+    """Create the maintained per-table/per-grade counters and seed them once"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS content_counts (
+        table_name VARCHAR(50) NOT NULL,
+        grade VARCHAR(50) NOT NULL,
+        item_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (table_name, grade)
+    )
+    """)
+
+    cursor.execute("SELECT COUNT(*) FROM content_counts")
+    if cursor.fetchone()[0] == 0:
+        grouped_counts = " UNION ALL ".join(
+            f"SELECT '{table}', grade, COUNT(*) FROM {table} GROUP BY grade"
+            for table in CONTENT_TABLES
+        )
+        cursor.execute(f"INSERT INTO content_counts (table_name, grade, item_count) {grouped_counts}")
+
+
+def _index_exists(cursor, table, index_name):
+    if DB_BACKEND == 'sqlite':
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s",
+                       (table, index_name))
+        return cursor.fetchone() is not None
+    cursor.execute("""
+    SELECT 1 FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    LIMIT 1
+    """, (table, index_name))
+    return cursor.fetchone() is not None
+
+
+def _create_index(cursor, table, index_name, columns):
+    if not _index_exists(cursor, table, index_name):
+        cursor.execute(f"CREATE INDEX {index_name} ON {table} ({columns})")
+
+
+def _add_listing_indexes(cursor):
+    """Index the grade filter and created_at ordering used by every listing"""
+    for table in CONTENT_TABLES:
+        # InnoDB appends the primary key, so these also cover the (created_at, id) keyset order
+        _create_index(cursor, table, f"idx_{table}_grade_created", "grade, created_at")
+        _create_index(cursor, table, f"idx_{table}_created", "created_at")
+    for table in ASSIGNMENT_TABLES:
+        _create_index(cursor, table, f"idx_{table}_end_date", "end_date")
+
+
+def _add_assignment_feed_indexes(cursor):
+    """Index the grade filter plus end_date ordering of the student assignment feed"""
+    for table in ASSIGNMENT_TABLES:
+        _create_index(cursor, table, f"idx_{table}_grade_end_date", "grade, end_date")
+
+
+def _create_fts_table(cursor, table):
+    """SQLite stand-in for the FULLTEXT indexes: an FTS5 index of title and description, kept in sync by triggers"""
+    cursor.execute(f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts
+    USING fts5(title, description, content='{table}', content_rowid='id')
+    """)
+    old_row = f"INSERT INTO {table}_fts ({table}_fts, rowid, title, description) " \
+              f"VALUES ('delete', OLD.id, OLD.title, OLD.description);"
+    new_row = f"INSERT INTO {table}_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);"
+    for name, event, body in (('ai', 'INSERT', new_row), ('ad', 'DELETE', old_row),
+                              ('au', 'UPDATE OF title, description', old_row + ' ' + new_row)):
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_{name} AFTER {event} ON {table} "
+                       f"BEGIN {body} END")
+    cursor.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+
+
+def _add_fulltext_indexes(cursor):
+    """FULLTEXT indexes for ranked title/description search on videos and library"""
+    for table in ['videos', 'library']:
+        if DB_BACKEND == 'sqlite':
+            _create_fts_table(cursor, table)
+            continue
+        if not _index_exists(cursor, table, f"ft_{table}_title"):
+            cursor.execute(f"CREATE FULLTEXT INDEX ft_{table}_title ON {table} (title)")
+        if not _index_exists(cursor, table, f"ft_{table}_text"):
+            cursor.execute(f"CREATE FULLTEXT INDEX ft_{table}_text ON {table} (title, description)")
+
+
+def _column_exists(cursor, table, column):
+    if DB_BACKEND == 'sqlite':
+        cursor.execute("SELECT 1 FROM pragma_table_info(%s) WHERE name = %s", (table, column))
+        return cursor.fetchone() is not None
+    cursor.execute("""
+    SELECT 1 FROM information_schema.columns
+    WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    LIMIT 1
+    """, (table, column))
+    return cursor.fetchone() is not None
+
+
+def _add_column(cursor, table, column, definition):
+    if not _column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _add_library_asset_columns(cursor):
+    """Columns filled in by the background job that processes uploaded books"""
+    _add_column(cursor, 'library', 'page_count', "INT NULL")
+    _add_column(cursor, 'library', 'cover_thumb', "VARCHAR(255) NULL")
+    _add_column(cursor, 'library', 'cover_webp', "VARCHAR(255) NULL")
+    _add_column(cursor, 'library', 'cover_placeholder', "VARCHAR(1024) NULL")
+
+
+def _create_blobs(cursor):
+    """Reference counts for stored media files, seeded from the rows that use them"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS blobs (
+        kind VARCHAR(20) NOT NULL,
+        filename VARCHAR(255) NOT NULL,
+        size BIGINT NULL,
+        refcount INT NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (kind, filename)
+    )
+    """)
+
+    cursor.execute("SELECT COUNT(*) FROM blobs")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("""
+        INSERT INTO blobs (kind, filename, size, refcount)
+        SELECT 'videos', filename, MAX(file_size), COUNT(*) FROM videos GROUP BY filename
+        UNION ALL
+        SELECT 'pdfs', pdf_filename, MAX(file_size), COUNT(*) FROM library GROUP BY pdf_filename
+        UNION ALL
+        SELECT 'pictures', picture_filename, NULL, COUNT(*) FROM library
+        WHERE picture_filename IS NOT NULL GROUP BY picture_filename
+        """)
+
+
+def _create_trash(cursor):
+    """Deleted videos/books waiting for their files to be purged (and still restorable)"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS trash (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        table_name VARCHAR(20) NOT NULL,
+        item_id INT NOT NULL,
+        title VARCHAR(255) NULL,
+        row_data LONGTEXT NOT NULL,
+        files TEXT NOT NULL,
+        bytes BIGINT NOT NULL DEFAULT 0,
+        status VARCHAR(10) NOT NULL DEFAULT 'pending',
+        deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        purge_after DATETIME NOT NULL,
+        INDEX idx_trash_purge (status, purge_after)
+    )
+    """)
+
+
+# Ordered list of (version, description, step); append new steps, never reorder
+MIGRATIONS = [
+    (1, 'create content tables', _create_content_tables),
+    (2, 'create content_counts', _create_content_counts),
+    (3, 'add grade/created_at/end_date indexes', _add_listing_indexes),
+    (4, 'add fulltext search indexes', _add_fulltext_indexes),
+    (5, 'add library cover variant and page count columns', _add_library_asset_columns),
+    (6, 'create blobs reference counts', _create_blobs),
+    (7, 'create trash for deferred file deletion', _create_trash),
+    (8, 'add grade/end_date indexes for the assignment feed', _add_assignment_feed_indexes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ==================== RUNNER ====================
+def _connect():
+    """Connect to the portal database, creating it first if it does not exist"""
+    if DB_BACKEND == 'sqlite':
+        return sqlite_connect(**SQLITE_CONFIG)
+    try:
+        return mysql.connector.connect(**DB_CONFIG)
+    except Error as e:
+        if e.errno != errorcode.ER_BAD_DB_ERROR:
+            raise
+
+    server_config = {k: v for k, v in DB_CONFIG.items() if k != 'database'}
+    connection = mysql.connector.connect(**server_config)
+    cursor = connection.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_CONFIG['database']}")
+    cursor.execute(f"USE {DB_CONFIG['database']}")
+    cursor.close()
+    return connection
+
+
+def get_schema_version(cursor):
+    """Get the highest applied migration version (0 for a fresh database)"""
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+    except Error as e:
+        if e.errno == errorcode.ER_NO_SUCH_TABLE:
+            return 0
+        raise
+    except sqlite3.OperationalError as e:
+        if 'no such table' in str(e):
+            return 0
+        raise
+    return cursor.fetchone()[0] or 0
+
+
+def migrate():
+    """Apply any pending migrations; a current schema costs a single query"""
+    connection = None
+    try:
+        connection = _connect()
+        cursor = connection.cursor()
+
+        current = get_schema_version(cursor)
+        if current >= LATEST_VERSION:
+            return current
+
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+        for version, description, step in MIGRATIONS:
+            if version <= current:
+                continue
+            step(cursor)
+            cursor.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                           (version, description))
+            connection.commit()
+            print(f"Applied migration {version}: {description}")
+            current = version
+
+        return current
+
+    finally:
+        if connection and connection.is_connected():
+            connection.close()
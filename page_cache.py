@@ -0,0 +1,107 @@
+"""Whole-response cache for the public student pages and the JSON API.
+
+A page is cached under its path, its query string and the current
+listing_cache version of every table it shows. Content writes already bump
+those versions (listing_cache.invalidate), which makes the cached page
+unreachable, so no extra invalidation is needed. The ETag is derived from
+that same key: a browser revalidating an unchanged page gets a 304 straight
+from the cache, without a database query or template render.
+"""
+import hashlib
+import pickle
+import time
+from functools import wraps
+
+from flask import Response, make_response, request, session
+from werkzeug.http import http_date
+
+import listing_cache
+
+_stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'uncacheable': 0, 'evictions': 0}
+
+
+def _page_key(backend, tables, period):
+    query = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    versions = ','.join(f"{table}:{backend.get_version(table)}" for table in tables)
+    if period is not None:
+        versions += f",period:{period}"
+    # The path, not the endpoint: views with URL arguments (/api/v1/videos/<id>) serve many pages
+    return f"page:{request.path}?{query}|{versions}"
+
+
+def _last_modified(backend, tables, period_start=None):
+    times = [listing_cache.version_time(backend.get_version(table)) for table in tables] + [period_start]
+    known = [t for t in times if t is not None]
+    return max(known) if known else time.time()
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        # Weak comparison: the compression middleware weakens the ETag of compressed pages
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since:
+        return int(last_modified) <= request.if_modified_since.timestamp()
+    return False
+
+
+def _revalidate_headers(response, etag, last_modified):
+    response.set_etag(etag)
+    response.headers['Last-Modified'] = http_date(last_modified)
+    # Browsers and proxies may keep the page but must revalidate it on every use
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def cached_page(*tables, refresh_seconds=None):
+    """Cache a GET view's rendered response until one of tables changes.
+
+    Pages that also depend on the clock (e.g. only assignments not yet due)
+    pass refresh_seconds: they are then rendered again, with a new ETag, at
+    least that often.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            backend = listing_cache.get_backend()
+            if backend is None:
+                return view(*args, **kwargs)
+
+            period = int(time.time() // refresh_seconds) if refresh_seconds else None
+            period_start = period * refresh_seconds if refresh_seconds else None
+            key = _page_key(backend, tables, period)
+            etag = hashlib.sha1(key.encode()).hexdigest()
+
+            entry, hit = backend.get(key)
+            if hit:
+                last_modified, body, mimetype = entry
+                if _not_modified(etag, last_modified):
+                    _stats['not_modified'] += 1
+                    return _revalidate_headers(Response(status=304), etag, last_modified)
+                _stats['hits'] += 1
+                return _revalidate_headers(Response(body, mimetype=mimetype), etag, last_modified)
+
+            # The ETag only depends on the key, so a revalidation needs no render even after a miss
+            # (entry evicted, worker restarted, or cached by another worker)
+            last_modified = _last_modified(backend, tables, period_start)
+            if _not_modified(etag, last_modified):
+                _stats['not_modified'] += 1
+                return _revalidate_headers(Response(status=304), etag, last_modified)
+
+            _stats['misses'] += 1
+            response = make_response(view(*args, **kwargs))
+            # Errors flash a message into the session; such pages must not be shared
+            if response.status_code != 200 or session.modified or response.direct_passthrough:
+                _stats['uncacheable'] += 1
+                return response
+
+            entry = (last_modified, response.get_data(), response.mimetype)
+            _stats['evictions'] += backend.set(key, entry, len(pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)))
+            return _revalidate_headers(response, etag, last_modified)
+        return wrapper
+    return decorator
+
+
+def get_page_cache_stats():
+    """Page cache counters for this process"""
+    return dict(_stats)
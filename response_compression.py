@@ -0,0 +1,187 @@
+"""WSGI middleware that compresses text responses on the fly.
+
+HTML and JSON responses of at least COMPRESSION_CONFIG['min_size'] bytes
+are compressed with the best encoding the client accepts (brotli, zstd or
+gzip). The body is compressed chunk by chunk as the application yields it,
+so a large page is never held in memory a second time. Media (videos,
+PDFs, images) and responses that already have a Content-Encoding, such as
+the precompressed static assets, are passed through untouched.
+
+Brotli and zstd need the optional `brotli` and `zstandard` packages; without
+them only gzip is offered.
+"""
+import zlib
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+
+from config import COMPRESSION_CONFIG
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = {'text/html', 'text/plain', 'text/css', 'text/csv', 'text/xml', 'application/json',
+                      'application/javascript', 'text/javascript', 'application/xml', 'image/svg+xml'}
+
+
+# ==================== ENCODERS ====================
+class _GzipEncoder:
+    def __init__(self, config):
+        self._compressor = zlib.compressobj(config['gzip_level'], zlib.DEFLATED, 31)  # wbits 31: gzip wrapper
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self, config):
+        self._compressor = brotli.Compressor(quality=config['brotli_quality'])
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class _ZstdEncoder:
+    def __init__(self, config):
+        self._compressor = zstandard.ZstdCompressor(level=config['zstd_level']).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+ENCODERS = {'gzip': _GzipEncoder}
+if brotli is not None:
+    ENCODERS['br'] = _BrotliEncoder
+if zstandard is not None:
+    ENCODERS['zstd'] = _ZstdEncoder
+
+
+# ==================== MIDDLEWARE ====================
+class CompressionMiddleware:
+    """Wrap a WSGI app (app.wsgi_app) so eligible responses are compressed"""
+
+    def __init__(self, wsgi_app, config=None):
+        self.wsgi_app = wsgi_app
+        self.config = dict(COMPRESSION_CONFIG, **(config or {}))
+        self.encodings = [name for name in self.config['encodings'] if name in ENCODERS]
+
+    def _choose_encoding(self, environ):
+        if environ.get('REQUEST_METHOD') == 'HEAD' or not self.encodings:
+            return None
+        accepted = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING'))
+        return accepted.best_match(self.encodings)
+
+    def _eligible(self, status, headers):
+        """Whether a response may be compressed, judging by its status and headers alone"""
+        if not status.startswith('200') or 'Content-Encoding' in headers:
+            return False
+        if 'no-transform' in headers.get('Cache-Control', ''):
+            return False
+        mimetype = headers.get('Content-Type', '').split(';')[0].strip().lower()
+        return mimetype in COMPRESSIBLE_TYPES
+
+    def __call__(self, environ, start_response):
+        encoding = self.config['enabled'] and self._choose_encoding(environ)
+        if not encoding:
+            return self.wsgi_app(environ, start_response)
+
+        # Filled by the application's start_response call
+        response = {'writes': []}
+
+        def capture_start_response(status, headers, exc_info=None):
+            response.update(status=status, headers=Headers(headers), exc_info=exc_info)
+            return response['writes'].append
+
+        body = self.wsgi_app(environ, capture_start_response)
+        try:
+            return self._respond(body, response, encoding, start_response)
+        except BaseException:
+            if hasattr(body, 'close'):
+                body.close()
+            raise
+
+    def _respond(self, body, response, encoding, start_response):
+        min_size = self.config['min_size']
+        if 'status' in response and not response['writes']:
+            eligible = self._eligible(response['status'], response['headers'])
+            length = response['headers'].get('Content-Length', type=int)
+            if not eligible or (length is not None and length < min_size):
+                # Decided from the headers alone: the body (and any file wrapper) is passed on as is
+                self._start(start_response, response, eligible, None)
+                return body
+
+        iterator = iter(body)
+        pending = response['writes']
+        if 'status' not in response:
+            # start_response may be deferred until the first chunk exists (e.g. generator views)
+            pending.append(next(iterator, b''))
+        eligible = self._eligible(response['status'], response['headers'])
+
+        size = sum(map(len, pending))
+        length = response['headers'].get('Content-Length', type=int)
+        if eligible and length is None:
+            # Unknown length: buffer up to the threshold to find out whether it is reached
+            while size < min_size:
+                chunk = next(iterator, None)
+                if chunk is None:
+                    length = size
+                    break
+                pending.append(chunk)
+                size += len(chunk)
+
+        compress = eligible and (length is None or length >= min_size)
+        self._start(start_response, response, eligible, encoding if compress else None)
+        return self._stream(body, iterator, pending, ENCODERS[encoding](self.config) if compress else None)
+
+    @staticmethod
+    def _start(start_response, response, eligible, encoding):
+        headers = response['headers']
+        if encoding:
+            del headers['Content-Length']
+            del headers['Accept-Ranges']
+            headers['Content-Encoding'] = encoding
+            # The compressed body is a different representation of the same page
+            etag = headers.get('ETag')
+            if etag and not etag.startswith('W/'):
+                headers['ETag'] = f"W/{etag}"
+        if eligible:
+            vary = [value.strip() for value in headers.get('Vary', '').split(',') if value.strip()]
+            if 'accept-encoding' not in (value.lower() for value in vary):
+                headers['Vary'] = ', '.join(vary + ['Accept-Encoding'])
+        start_response(response['status'], headers.to_wsgi_list(), response['exc_info'])
+
+    @staticmethod
+    def _stream(body, iterator, pending, encoder):
+        try:
+            if encoder is None:
+                yield from pending
+                yield from iterator
+                return
+            for chunk in pending:
+                data = encoder.compress(chunk)
+                if data:
+                    yield data
+            for chunk in iterator:
+                data = encoder.compress(chunk)
+                if data:
+                    yield data
+            yield encoder.finish()
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
@@ -0,0 +1,183 @@
+"""Prefork production server for the portal.
+
+The master binds the listening socket, runs the migrations and the static
+asset build once, then forks SERVER_CONFIG['workers'] processes that all
+accept on that socket. Each worker imports the app itself (create_app), so
+its connection pool and compiled templates are its own. The listing and
+page caches must be shared for a write in one worker to invalidate them in
+the others, so CACHE_CONFIG mode 'local' is switched to 'shared' whenever
+there is more than one worker.
+
+    python server.py                   # serve on SERVER_CONFIG['host']:['port']
+    python server.py --workers 4 --port 8080
+
+Signals to the master:
+    HUP         graceful reload: start workers with fresh code and config, then retire the old ones
+    TERM, INT   graceful shutdown: workers finish in-flight requests (up to graceful_timeout)
+"""
+import argparse
+import importlib
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+import config
+
+WORKER_POLL_SECONDS = 1.0  # How often a worker checks whether it was asked to stop
+
+
+# ==================== WORKER ====================
+def _run_worker(listener):
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    from werkzeug.serving import make_server
+    from main import create_app
+
+    settings = config.SERVER_CONFIG
+    server = make_server(settings['host'], settings['port'], create_app(),
+                         threaded=settings['threaded'], fd=listener.fileno())
+    # Every worker is woken for each connection; the ones that lose the accept race must not block
+    server.socket.setblocking(False)
+    server.timeout = WORKER_POLL_SECONDS
+    # Track request threads so server_close() waits for them
+    server.daemon_threads = False
+
+    while not stopping:
+        server.handle_request()
+    server.server_close()
+
+
+def _spawn_worker(listener):
+    pid = os.fork()
+    if pid:
+        return pid
+    status = 0
+    try:
+        _run_worker(listener)
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        os._exit(status)
+
+
+def _prepare():
+    """Migrate the database and build the static assets, in a throwaway child.
+
+    The master never imports the app modules itself, so workers forked after
+    a reload import the current code instead of inheriting the old one.
+    """
+    pid = os.fork()
+    if pid == 0:
+        status = 0
+        try:
+            from database_functions import init_database
+            from static_assets import load_assets
+            init_database()
+            load_assets(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        finally:
+            os._exit(status)
+    return os.waitpid(pid, 0)[1] == 0
+
+
+# ==================== MASTER ====================
+def _worker_count(requested=None):
+    return requested or config.SERVER_CONFIG['workers'] or os.cpu_count() or 1
+
+
+def _share_cache(count):
+    """Switch a per-process ('local') cache to the 'shared' one when several workers serve the portal"""
+    if count > 1 and config.CACHE_CONFIG.get('mode') == 'local':
+        config.CACHE_CONFIG['mode'] = 'shared'
+        print("CACHE_CONFIG mode 'local' would not be invalidated across workers; using 'shared'")
+
+
+def _stop_workers(pids, timeout):
+    """SIGTERM the workers, then SIGKILL any still running after timeout"""
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.monotonic() + timeout
+    remaining = set(pids)
+    while remaining and time.monotonic() < deadline:
+        for pid in list(remaining):
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                remaining.discard(pid)
+        time.sleep(0.1)
+    for pid in remaining:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+
+def serve(host=None, port=None, workers=None):
+    """Run the master until TERM/INT; blocks"""
+    settings = config.SERVER_CONFIG
+    host = host or settings['host']
+    port = port or settings['port']
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+    listener.set_inheritable(True)
+
+    if not _prepare():
+        sys.exit('Startup tasks failed; not starting workers')
+
+    signals = []
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(signum, lambda signum, frame: signals.append(signum))
+
+    config.SERVER_CONFIG.update(host=host, port=port)
+    count = _worker_count(workers)
+    _share_cache(count)
+    pids = {_spawn_worker(listener) for _ in range(count)}
+    print(f"Serving on http://{host}:{port} with {count} workers (master pid {os.getpid()})")
+
+    while True:
+        while signals:
+            signum = signals.pop(0)
+            if signum == signal.SIGHUP:
+                print('Reloading workers')
+                importlib.reload(config)
+                config.SERVER_CONFIG.update(host=host, port=port)
+                if not _prepare():
+                    print('Startup tasks failed; keeping the current workers')
+                    continue
+                old_pids = pids
+                count = _worker_count(workers)
+                _share_cache(count)
+                pids = {_spawn_worker(listener) for _ in range(count)}
+                _stop_workers(old_pids, config.SERVER_CONFIG['graceful_timeout'])
+            else:
+                print('Shutting down')
+                _stop_workers(pids, config.SERVER_CONFIG['graceful_timeout'])
+                listener.close()
+                return
+
+        # Replace workers that died on their own
+        for pid in list(pids):
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                pids.discard(pid)
+                pids.add(_spawn_worker(listener))
+        time.sleep(0.5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--workers', type=int, help='defaults to SERVER_CONFIG, or one per CPU core')
+    args = parser.parse_args()
+    serve(host=args.host, port=args.port, workers=args.workers)
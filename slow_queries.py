@@ -0,0 +1,206 @@
+"""Slow-query log with EXPLAIN capture.
+
+Statements run through database_functions that take at least
+SLOW_QUERY_CONFIG['threshold_ms'] (timed by db_metrics, including reading
+the results) are written as JSON lines to a rotating log: the statement,
+its parameters, the route and method that ran it, duration and rows.
+
+Statements are grouped by shape - the SQL with literals and placeholders
+replaced by ?, and IN lists collapsed - so the same listing query with
+different arguments counts as one offender. The first time a process sees
+a slow SELECT of a new shape it runs EXPLAIN on it (EXPLAIN QUERY PLAN on
+SQLite) in the background, on a connection of its own, and logs the plan
+with a full_scan flag, e.g. for a title LIKE '%...%' that reads every row.
+
+top_offenders() (the /admin/slow_queries page) aggregates the log files,
+current and rotated, so it covers every worker process.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+
+from config import DB_BACKEND, SLOW_QUERY_CONFIG
+from db_pool import Error, get_pool
+
+# Slowest duration that is still fast; infinite when the log is off
+THRESHOLD_SECONDS = (SLOW_QUERY_CONFIG['threshold_ms'] / 1000 if SLOW_QUERY_CONFIG['enabled']
+                     else float('inf'))
+
+_logger = logging.getLogger('portal.slow_queries')
+_logger_lock = threading.Lock()
+_explained = set()  # shape fingerprints this process has already explained (or is explaining)
+
+
+def _get_logger():
+    if not _logger.handlers:
+        with _logger_lock:
+            if not _logger.handlers:
+                path = SLOW_QUERY_CONFIG['log_path']
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                handler = RotatingFileHandler(path, maxBytes=SLOW_QUERY_CONFIG['max_bytes'],
+                                              backupCount=SLOW_QUERY_CONFIG['backup_count'], encoding='utf-8')
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                _logger.addHandler(handler)
+                _logger.setLevel(logging.INFO)
+                _logger.propagate = False
+    return _logger
+
+
+def _write(entry):
+    entry = dict(entry, time=datetime.now().isoformat(timespec='milliseconds'), pid=os.getpid())
+    _get_logger().info(json.dumps(entry, default=str))
+
+
+# ==================== QUERY SHAPES ====================
+_SPACE = re.compile(r'\s+')
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\?(?:\s*,\s*\?)+\)')
+_EXPLAINABLE = re.compile(r'^\s*(SELECT|WITH)\b', re.I)
+
+
+@lru_cache(maxsize=1024)
+def query_shape(sql):
+    """(shape, fingerprint): the statement with its literals and argument lists normalized"""
+    shape = _SPACE.sub(' ', sql).strip()
+    shape = _STRING.sub('?', shape)
+    shape = _NUMBER.sub('?', shape)
+    shape = _PLACEHOLDER_LIST.sub('(?+)', shape.replace('%s', '?'))
+    return shape, hashlib.sha1(shape.encode()).hexdigest()[:16]
+
+
+def _loggable_params(params):
+    """Statement arguments for the log, long values cut to max_param_length"""
+    if params is None:
+        return None
+    limit = SLOW_QUERY_CONFIG['max_param_length']
+    if isinstance(params, dict):
+        params = list(params.values())
+    values = []
+    for value in list(params)[:50]:
+        if isinstance(value, (bytes, bytearray)):
+            value = f"<{len(value)} bytes>"
+        elif isinstance(value, str) and len(value) > limit:
+            value = value[:limit] + '...'
+        elif not isinstance(value, (int, float, type(None))):
+            value = str(value)[:limit]
+        values.append(value)
+    return values
+
+
+# ==================== EXPLAIN ====================
+def _full_scan(plan):
+    """Whether a plan reads a whole table instead of using an index"""
+    for step in plan:
+        if DB_BACKEND == 'sqlite':
+            detail = str(step.get('detail', ''))
+            if detail.startswith('SCAN ') and 'INDEX' not in detail:
+                return True
+        elif step.get('type') == 'ALL':
+            return True
+    return False
+
+
+def _explain(sql, params, shape, fingerprint):
+    prefix = 'EXPLAIN QUERY PLAN ' if DB_BACKEND == 'sqlite' else 'EXPLAIN '
+    connection = None
+    try:
+        connection = get_pool().get_connection()
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute(prefix + sql, params)
+            plan = cursor.fetchall()
+        finally:
+            cursor.close()
+        _write({'type': 'explain', 'fingerprint': fingerprint, 'shape': shape,
+                'plan': plan, 'full_scan': _full_scan(plan)})
+    except Error as e:
+        print(f"Error explaining slow query: {e}")
+        _explained.discard(fingerprint)
+    finally:
+        if connection and connection.is_connected():
+            connection.close()
+
+
+def record(sql, params, seconds, rows, route=None, method=None):
+    """Log one slow statement, and explain its shape if this process has not yet"""
+    shape, fingerprint = query_shape(sql)
+    _write({
+        'type': 'slow_query',
+        'ms': round(seconds * 1000, 3),
+        'rows': rows,
+        'route': route,
+        'method': method,
+        'fingerprint': fingerprint,
+        'shape': shape,
+        'sql': _SPACE.sub(' ', sql).strip(),
+        'params': _loggable_params(params)
+    })
+
+    if SLOW_QUERY_CONFIG['explain'] and fingerprint not in _explained and _EXPLAINABLE.match(sql):
+        _explained.add(fingerprint)
+        # Off the request thread: the caller's connection may still be streaming results
+        threading.Thread(target=_explain, args=(sql, params, shape, fingerprint), daemon=True).start()
+
+
+# ==================== REPORT ====================
+def _log_entries():
+    path = SLOW_QUERY_CONFIG['log_path']
+    paths = [f"{path}.{n}" for n in range(SLOW_QUERY_CONFIG['backup_count'], 0, -1)] + [path]
+    for log_path in paths:
+        try:
+            with open(log_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except OSError:
+            continue
+
+
+def top_offenders(limit=20):
+    """Query shapes ordered by total time spent in slow executions, with their latest plan"""
+    shapes = {}
+    plans = {}
+    for entry in _log_entries():
+        fingerprint = entry.get('fingerprint')
+        if entry.get('type') == 'explain':
+            plans[fingerprint] = entry
+            continue
+        if entry.get('type') != 'slow_query':
+            continue
+        shape = shapes.get(fingerprint)
+        if shape is None:
+            shape = shapes[fingerprint] = {
+                'fingerprint': fingerprint, 'shape': entry['shape'], 'count': 0, 'total_ms': 0.0,
+                'max_ms': 0.0, 'routes': {}
+            }
+        shape['count'] += 1
+        shape['total_ms'] += entry['ms']
+        if entry['ms'] >= shape['max_ms']:
+            shape['max_ms'] = entry['ms']
+            shape['slowest'] = {'time': entry['time'], 'route': entry.get('route'),
+                                'params': entry.get('params'), 'rows': entry.get('rows')}
+        shape['last_seen'] = entry['time']
+        route = entry.get('route') or '(no request)'
+        shape['routes'][route] = shape['routes'].get(route, 0) + 1
+
+    offenders = sorted(shapes.values(), key=lambda s: s['total_ms'], reverse=True)[:limit]
+    for shape in offenders:
+        shape['total_ms'] = round(shape['total_ms'], 3)
+        shape['avg_ms'] = round(shape['total_ms'] / shape['count'], 3)
+        plan = plans.get(shape['fingerprint'])
+        shape['plan'] = plan['plan'] if plan else None
+        shape['full_scan'] = plan['full_scan'] if plan else None
+    return {
+        'threshold_ms': SLOW_QUERY_CONFIG['threshold_ms'],
+        'shapes': len(shapes),
+        'offenders': offenders
+    }
@@ -0,0 +1,275 @@
+"""SQLite storage backend (config.DB_BACKEND = 'sqlite').
+
+Provides the small part of the mysql.connector API that database_functions
+and migrations use (cursor(dictionary=True), execute/executemany, rowcount,
+lastrowid, commit/rollback, is_connected/close), so the same helpers run on
+either backend. Statements written for MySQL are translated once per distinct
+SQL string:
+
+    %s                          -> ?
+    NOW(), CURRENT_TIMESTAMP    -> local time, as MySQL stores it
+    x + INTERVAL %s DAY         -> datetime(x, ? || ' days')
+    GREATEST / LEAST            -> MAX / MIN
+    ON DUPLICATE KEY UPDATE     -> ON CONFLICT DO UPDATE SET
+    INSERT IGNORE               -> INSERT OR IGNORE
+    SELECT ... FOR UPDATE       -> SELECT inside BEGIN IMMEDIATE
+
+and in CREATE TABLE: AUTO_INCREMENT, ON UPDATE CURRENT_TIMESTAMP (a trigger)
+and inline INDEX clauses. FULLTEXT indexes have no translation; migrations
+create FTS5 tables instead.
+
+Each thread gets its own connection. The database runs in WAL mode, so
+readers never block the (single) writer. Writes take the write lock when
+their transaction starts (BEGIN IMMEDIATE), which avoids the deadlock of
+two transactions that both read first and then try to write.
+"""
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+from config import SQLITE_CONFIG
+
+_NOW = "datetime('now', 'localtime')"
+
+
+# ==================== TYPES ====================
+# DATETIME/TIMESTAMP columns come back as datetime objects, like mysql.connector returns them
+def _adapt_datetime(value):
+    return value.isoformat(' ')
+
+
+def _convert_datetime(value):
+    text = value.decode()
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return text
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_converter('DATETIME', _convert_datetime)
+sqlite3.register_converter('TIMESTAMP', _convert_datetime)
+
+
+def _params(params):
+    # datetimes go through _adapt_datetime; strings are stored as they are, even ones that look like dates
+    return tuple(params) if params else ()
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+# ==================== SQL TRANSLATION ====================
+_INTERVAL = re.compile(r"(NOW\(\)|\w+)\s*\+\s*INTERVAL\s+%s\s+(SECOND|MINUTE|HOUR|DAY)\b", re.I)
+_REPLACEMENTS = [
+    (re.compile(r'\bNOW\(\)|\bCURRENT_TIMESTAMP\b', re.I), _NOW),
+    (re.compile(r'\bGREATEST\(', re.I), 'MAX('),
+    (re.compile(r'\bLEAST\(', re.I), 'MIN('),
+    (re.compile(r'\bON DUPLICATE KEY UPDATE\b', re.I), 'ON CONFLICT DO UPDATE SET'),
+    (re.compile(r'\bVALUES\((\w+)\)', re.I), r'excluded.\1'),
+    (re.compile(r'\bINSERT IGNORE\b', re.I), 'INSERT OR IGNORE'),
+    (re.compile(r'\s+FOR UPDATE\b', re.I), ''),
+    (re.compile(r'%s'), '?'),
+]
+_WRITE_STATEMENT = re.compile(r'^\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|ALTER|DROP)\b', re.I)
+_LOCKING_READ = re.compile(r'\bFOR UPDATE\b', re.I)
+
+_CREATE_TABLE = re.compile(r'^\s*CREATE TABLE (?:IF NOT EXISTS )?(\w+)', re.I)
+_INLINE_INDEX = re.compile(r',\s*INDEX (\w+) \(([^)]*)\)', re.I)
+_ON_UPDATE = re.compile(r'(\w+)([^,]*?)\s+ON UPDATE CURRENT_TIMESTAMP', re.I)
+
+
+def _interval(match):
+    base = _NOW if match.group(1).upper() == 'NOW()' else match.group(1)
+    return f"datetime({base}, %s || ' {match.group(2).lower()}s')"
+
+
+def _translate_create_table(sql, table):
+    """One MySQL CREATE TABLE -> the SQLite CREATE TABLE plus its indexes and triggers"""
+    extra = []
+    for index, columns in _INLINE_INDEX.findall(sql):
+        extra.append(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({columns})")
+    sql = _INLINE_INDEX.sub('', sql)
+
+    for column in [match[0] for match in _ON_UPDATE.findall(sql)]:
+        extra.append(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_{column}_on_update AFTER UPDATE ON {table}
+        FOR EACH ROW WHEN NEW.{column} IS OLD.{column}
+        BEGIN UPDATE {table} SET {column} = {_NOW} WHERE id = NEW.id; END
+        """)
+    sql = _ON_UPDATE.sub(r'\1\2', sql)
+
+    sql = re.sub(r'\bINT AUTO_INCREMENT PRIMARY KEY\b', 'INTEGER PRIMARY KEY AUTOINCREMENT', sql, flags=re.I)
+    sql = re.sub(r'\bDEFAULT CURRENT_TIMESTAMP\b', f'DEFAULT ({_NOW})', sql, flags=re.I)
+    return [sql] + extra
+
+
+@lru_cache(maxsize=1024)
+def translate(sql):
+    """MySQL statement -> (SQLite statements, whether it needs the write lock)"""
+    writes = bool(_WRITE_STATEMENT.match(sql) or _LOCKING_READ.search(sql))
+    table = _CREATE_TABLE.match(sql)
+    if table:
+        return tuple(_translate_create_table(sql, table.group(1))), writes
+
+    sql = _INTERVAL.sub(_interval, sql)
+    for pattern, replacement in _REPLACEMENTS:
+        sql = pattern.sub(replacement, sql)
+    return (sql,), writes
+
+
+# ==================== CONNECTIONS ====================
+class SQLiteCursor:
+    """mysql.connector-style cursor over a sqlite3 cursor"""
+
+    def __init__(self, connection, dictionary=False):
+        self._connection = connection
+        self._cursor = connection._raw.cursor()
+        if dictionary:
+            self._cursor.row_factory = _dict_row
+
+    def execute(self, sql, params=None):
+        statements, writes = translate(sql)
+        if writes:
+            self._connection._begin()
+        self._cursor.execute(statements[0], _params(params))
+        # Indexes and triggers split off a CREATE TABLE take no parameters
+        for statement in statements[1:]:
+            self._cursor.execute(statement)
+
+    def executemany(self, sql, seq_params):
+        statements, writes = translate(sql)
+        if writes:
+            self._connection._begin()
+        self._cursor.executemany(statements[0], (_params(params) for params in seq_params))
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """mysql.connector-style connection; close() hands it back to its pool (or closes it if unpooled)"""
+
+    def __init__(self, raw_connection, pool=None):
+        self._raw = raw_connection
+        self._pool = pool
+        self._checked_out = pool is None
+
+    def cursor(self, dictionary=False, **_):
+        return SQLiteCursor(self, dictionary)
+
+    def _begin(self):
+        if not self._raw.in_transaction:
+            self._raw.execute('BEGIN IMMEDIATE')
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def is_connected(self):
+        return self._checked_out
+
+    def close(self):
+        if self._pool is not None:
+            if self._checked_out:
+                self._pool.release(self)
+        elif self._checked_out:
+            self._checked_out = False
+            self._raw.close()
+
+
+def connect(path=None, busy_timeout=5.0, synchronous='NORMAL', cache_size_kb=65536, mmap_size=0, pool=None):
+    """Open a tuned WAL-mode connection to the database file (created if missing)"""
+    path = path or SQLITE_CONFIG['path']
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Autocommit mode: transactions are begun explicitly by SQLiteConnection._begin()
+    raw = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None,
+                          detect_types=sqlite3.PARSE_DECLTYPES)
+    raw.execute('PRAGMA journal_mode = WAL')
+    raw.execute(f'PRAGMA synchronous = {synchronous}')
+    raw.execute(f'PRAGMA cache_size = -{int(cache_size_kb)}')
+    raw.execute(f'PRAGMA mmap_size = {int(mmap_size)}')
+    raw.execute('PRAGMA temp_store = MEMORY')
+    return SQLiteConnection(raw, pool)
+
+
+class SQLitePool:
+    """One connection per thread, reused across that thread's requests; same interface as ConnectionPool"""
+
+    def __init__(self, **options):
+        self.options = options
+        self.pid = os.getpid()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._checkouts = 0
+
+    def get_connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or connection._checked_out:
+            fresh = connect(pool=self, **self.options)
+            with self._lock:
+                self._created += 1
+            # A nested checkout on the same thread gets a connection of its own, closed on release
+            if connection is None:
+                self._local.connection = fresh
+            connection = fresh
+        connection._checked_out = True
+        with self._lock:
+            self._checkouts += 1
+        return connection
+
+    def release(self, connection):
+        """End any open transaction and keep the connection for the thread's next checkout"""
+        connection._checked_out = False
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except sqlite3.Error:
+            pass
+        if getattr(self._local, 'connection', None) is not connection:
+            connection._raw.close()
+
+    def close_all(self):
+        """Close the calling thread's connection (other threads' close with the thread)"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and not connection._checked_out:
+            connection._raw.close()
+            self._local.connection = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'sqlite',
+                'path': self.options.get('path'),
+                'created': self._created,
+                'checkouts': self._checkouts,
+            }
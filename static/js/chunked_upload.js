@@ -0,0 +1,108 @@
+// Resumable chunked uploads against the /uploads endpoints.
+// Chunks are sent in parallel with a SHA-256 checksum each; if the page is
+// reloaded or the connection drops, picking the same file again resumes
+// from the chunks the server already has.
+
+async function sha256Base64(buffer) {
+    if (!window.crypto || !window.crypto.subtle) {
+        return null;  // Only available on https:// or localhost
+    }
+    const digest = await window.crypto.subtle.digest('SHA-256', buffer);
+    let binary = '';
+    new Uint8Array(digest).forEach(function(b) { binary += String.fromCharCode(b); });
+    return btoa(binary);
+}
+
+async function fetchJson(url, options) {
+    const response = await fetch(url, Object.assign({credentials: 'same-origin'}, options));
+    const body = response.status === 204 ? {} : await response.json().catch(function() { return {}; });
+    if (!response.ok) {
+        const error = new Error(body.error || ('Upload failed (' + response.status + ')'));
+        error.status = response.status;
+        throw error;
+    }
+    return body;
+}
+
+async function startOrResumeUpload(file, kind) {
+    const storageKey = 'upload:' + kind + ':' + file.name + ':' + file.size + ':' + file.lastModified;
+    const savedId = localStorage.getItem(storageKey);
+
+    if (savedId) {
+        try {
+            const status = await fetchJson('/uploads/' + savedId);
+            return {storageKey: storageKey, id: savedId, chunkSize: status.chunk_size, missing: status.missing};
+        } catch (e) {
+            localStorage.removeItem(storageKey);  // Expired or already committed
+        }
+    }
+
+    const created = await fetchJson('/uploads', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({kind: kind, filename: file.name, size: file.size})
+    });
+    localStorage.setItem(storageKey, created.upload_id);
+    return {storageKey: storageKey, id: created.upload_id, chunkSize: created.chunk_size, missing: [[0, file.size]]};
+}
+
+async function sendChunk(uploadId, file, start, end) {
+    const buffer = await file.slice(start, end).arrayBuffer();
+    const headers = {'Content-Type': 'application/offset+octet-stream', 'Upload-Offset': String(start)};
+    const checksum = await sha256Base64(buffer);
+    if (checksum) {
+        headers['Upload-Checksum'] = 'sha256 ' + checksum;
+    }
+
+    for (let attempt = 0; ; attempt++) {
+        try {
+            return await fetchJson('/uploads/' + uploadId, {method: 'PATCH', headers: headers, body: buffer});
+        } catch (e) {
+            // Client errors will not fix themselves; retry network and server errors
+            if (attempt >= 5 || (e.status && e.status < 500 && e.status !== 460)) {
+                throw e;
+            }
+            await new Promise(function(resolve) { setTimeout(resolve, 1000 * Math.pow(2, attempt)); });
+        }
+    }
+}
+
+async function uploadInChunks(options) {
+    const file = options.file;
+    const upload = await startOrResumeUpload(file, options.kind);
+
+    const chunks = [];
+    let remaining = 0;
+    upload.missing.forEach(function(range) {
+        for (let start = range[0]; start < range[1]; start += upload.chunkSize) {
+            chunks.push([start, Math.min(start + upload.chunkSize, range[1])]);
+            remaining += Math.min(start + upload.chunkSize, range[1]) - start;
+        }
+    });
+
+    let sent = file.size - remaining;
+    const report = function() {
+        if (options.onProgress) {
+            options.onProgress(sent, file.size);
+        }
+    };
+    report();
+
+    const worker = async function() {
+        while (chunks.length) {
+            const chunk = chunks.shift();
+            await sendChunk(upload.id, file, chunk[0], chunk[1]);
+            sent += chunk[1] - chunk[0];
+            report();
+        }
+    };
+    const workers = [];
+    for (let i = 0; i < (options.concurrency || 3); i++) {
+        workers.push(worker());
+    }
+    await Promise.all(workers);
+
+    const result = await fetchJson('/uploads/' + upload.id + '/commit', {method: 'POST', body: options.formData});
+    localStorage.removeItem(upload.storageKey);
+    return result;
+}
@@ -0,0 +1,219 @@
+"""Fingerprinted, precompressed static assets.
+
+At startup (or with `python static_assets.py`) the CSS, JS and images under
+static/ are minified (CSS), copied to STATIC_CONFIG['build_dir'] under a
+content-hashed name such as css/index.3f2a9c01b4d5.css, and stored next to
+.gz and .br variants. url_for('static', ...) is rewritten to the hashed
+names, which are served with immutable caching and the best precompressed
+variant the client accepts; nothing is compressed per request.
+
+Brotli variants need the optional `brotli` package; without it only gzip
+variants are built.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sys
+
+from flask import current_app, request, send_file
+
+from config import STATIC_CONFIG
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ASSET_DIRS = ['css', 'js', 'images']  # Under the static folder; uploaded media is never fingerprinted
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt'}
+MIN_COMPRESS_SIZE = 256  # Smaller files are not worth a compressed variant
+MANIFEST_NAME = 'manifest.json'
+
+# Served (fingerprinted) name -> {'mimetype', 'encodings'}; filled by load_assets()
+_assets = {}
+# Original name -> fingerprinted name
+_fingerprints = {}
+
+
+# ==================== BUILD ====================
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+_CSS_STRING = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+
+
+def minify_css(css):
+    """Strip comments and redundant whitespace, leaving string literals untouched"""
+    parts = _CSS_STRING.split(css)
+    for i in range(0, len(parts), 2):
+        text = _CSS_COMMENT.sub('', parts[i])
+        text = re.sub(r'\s+', ' ', text)
+        text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+        parts[i] = text.replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def rewrite_css_urls(css, css_name, manifest_assets):
+    """Point relative url(...) references at the fingerprinted files they were built into"""
+    base = os.path.dirname(css_name)
+
+    def replace(match):
+        quote, target = match.groups()
+        if re.match(r'^([a-z]+:|/|#)', target):
+            return match.group(0)  # data:, absolute and fragment URLs are left alone
+        # Any ?v= cache buster is dropped; the fingerprint replaces it
+        path = target.partition('?')[0]
+        name = os.path.normpath(os.path.join(base, path)).replace(os.sep, '/')
+        asset = manifest_assets.get(name)
+        if asset is None:
+            return match.group(0)
+        relative = os.path.relpath(asset['path'], base or '.').replace(os.sep, '/')
+        return f"url({quote}{relative}{quote})"
+
+    return _CSS_URL.sub(replace, css)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _source_files(static_folder):
+    for directory in ASSET_DIRS:
+        for root, _, files in os.walk(os.path.join(static_folder, directory)):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, static_folder).replace(os.sep, '/'), path
+
+
+def _source_signature(static_folder):
+    """Names, sizes and mtimes of all sources; a change means the build is stale"""
+    digest = hashlib.sha256()
+    for name, path in _source_files(static_folder):
+        stat = os.stat(path)
+        digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def build_assets(static_folder='static'):
+    """Fingerprint, minify and precompress every asset; returns the manifest"""
+    build_dir = os.path.join(static_folder, STATIC_CONFIG['build_dir'])
+    manifest = {'signature': _source_signature(static_folder), 'assets': {}}
+
+    # CSS last, so its url(...) references to images can use their fingerprinted names
+    sources = sorted(_source_files(static_folder), key=lambda source: source[0].endswith('.css'))
+    for name, path in sources:
+        with open(path, 'rb') as f:
+            data = f.read()
+        stem, ext = os.path.splitext(name)
+        if ext == '.css':
+            css = rewrite_css_urls(data.decode('utf-8'), name, manifest['assets'])
+            data = minify_css(css).encode('utf-8')
+
+        fingerprinted = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        target = os.path.join(build_dir, fingerprinted)
+        _write(target, data)
+
+        encodings = []
+        if ext in COMPRESSIBLE_EXTENSIONS and len(data) >= MIN_COMPRESS_SIZE:
+            if brotli is not None:
+                _write(target + '.br', brotli.compress(data, quality=11))
+                encodings.append('br')
+            # mtime=0 keeps the .gz byte-identical between builds
+            _write(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            encodings.append('gzip')
+
+        manifest['assets'][name] = {'path': fingerprinted, 'encodings': encodings}
+
+    _write(os.path.join(build_dir, MANIFEST_NAME), json.dumps(manifest, indent=2).encode())
+    _prune(build_dir, manifest)
+    return manifest
+
+
+def _prune(build_dir, manifest):
+    """Remove fingerprinted files of older builds"""
+    keep = {MANIFEST_NAME}
+    for asset in manifest['assets'].values():
+        keep.add(asset['path'])
+        keep.update(f"{asset['path']}.{suffix}" for suffix in ('br', 'gz'))
+    for root, _, files in os.walk(build_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.relpath(path, build_dir).replace(os.sep, '/') not in keep:
+                os.remove(path)
+
+
+def load_assets(static_folder='static', rebuild=True):
+    """Load the manifest, rebuilding it first if any source changed"""
+    build_dir = os.path.join(static_folder, STATIC_CONFIG['build_dir'])
+    try:
+        with open(os.path.join(build_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+
+    if rebuild and (manifest is None or manifest.get('signature') != _source_signature(static_folder)):
+        manifest = build_assets(static_folder)
+
+    _assets.clear()
+    _fingerprints.clear()
+    prefix = STATIC_CONFIG['build_dir'].strip('/')
+    for name, asset in (manifest or {}).get('assets', {}).items():
+        served_name = f"{prefix}/{asset['path']}"
+        _fingerprints[name] = served_name
+        _assets[served_name] = {
+            'mimetype': mimetypes.guess_type(name)[0] or 'application/octet-stream',
+            'encodings': asset['encodings']
+        }
+    return manifest
+
+
+# ==================== SERVING ====================
+def fingerprint_static_urls(endpoint, values):
+    """url_defaults hook: point url_for('static', filename=...) at the fingerprinted file"""
+    if endpoint == 'static' and values.get('filename') in _fingerprints:
+        values['filename'] = _fingerprints[values['filename']]
+
+
+def serve_static(filename):
+    """Static view: fingerprinted files get immutable caching and a precompressed variant"""
+    asset = _assets.get(filename)
+    if asset is None:
+        return current_app.send_static_file(filename)
+
+    encoding = None
+    if asset['encodings']:
+        encoding = request.accept_encodings.best_match(asset['encodings'])
+    path = os.path.join(current_app.static_folder, filename)
+    if encoding:
+        path += '.br' if encoding == 'br' else '.gz'
+
+    response = send_file(path, mimetype=asset['mimetype'], conditional=True,
+                         max_age=STATIC_CONFIG['cache_seconds'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if asset['encodings']:
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_static_assets(app):
+    """Build (if stale) and load the assets, then hook them into url_for and the static route"""
+    if not STATIC_CONFIG['fingerprint']:
+        return
+    load_assets(app.static_folder)
+    app.url_defaults(fingerprint_static_urls)
+    app.view_functions['static'] = serve_static
+
+
+if __name__ == "__main__":
+    result = build_assets(sys.argv[1] if len(sys.argv) > 1 else 'static')
+    for source, built in sorted(result['assets'].items()):
+        print(f"{source} -> {built['path']} {' '.join(built['encodings'])}")
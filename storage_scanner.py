@@ -0,0 +1,213 @@
+"""Cross-check media files on disk against the videos and library rows.
+
+Reports orphaned files (on disk, referenced by nothing), missing files
+(referenced, not on disk) and size mismatches, and can repair them:
+
+    python storage_scanner.py             # report only
+    python storage_scanner.py --verify    # also re-hash content-addressed files that are new or changed
+    python storage_scanner.py --repair    # trash orphans and fix the rows (see repair_media_rows)
+
+Runs are incremental: the listing of every directory is kept in a manifest
+with the directory's mtime, and a directory whose mtime has not changed is
+not read again. Media files are never rewritten in place (new content gets
+a new name), so an unchanged directory mtime means unchanged files.
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from blob_store import BLOB_FOLDERS, COPY_BLOCK_SIZE, blob_sha256
+from config import SCANNER_CONFIG
+from database_functions import get_media_references, repair_media_rows, trash_orphan_files
+
+
+# ==================== MANIFEST ====================
+def _load_manifest():
+    try:
+        with open(SCANNER_CONFIG['manifest_path']) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {'dirs': {}, 'verified': {}}
+    manifest.setdefault('dirs', {})
+    manifest.setdefault('verified', {})
+    return manifest
+
+
+def _save_manifest(manifest):
+    path = SCANNER_CONFIG['manifest_path']
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, path)
+
+
+# ==================== DIRECTORY WALK ====================
+def _list_dir(kind, relative_dir, old_dirs):
+    """One directory's {mtime_ns, files: {name: [size, mtime_ns]}, subdirs}, from the manifest if unchanged.
+
+    Returns (listing, reused), or (None, False) if the directory is gone.
+    """
+    path = os.path.join(BLOB_FOLDERS[kind], relative_dir)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None, False
+
+    cached = old_dirs.get(f"{kind}:{relative_dir}")
+    if cached and cached['mtime_ns'] == mtime_ns:
+        return cached, True
+
+    listing = {'mtime_ns': mtime_ns, 'files': {}, 'subdirs': []}
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                listing['subdirs'].append(entry.name)
+            elif entry.is_file(follow_symlinks=False):
+                stat = entry.stat()
+                listing['files'][entry.name] = [stat.st_size, stat.st_mtime_ns]
+    return listing, False
+
+
+def _walk(kind, relative_dir, old_dirs):
+    """Walk a directory tree; returns (files {relative path: [size, mtime_ns]}, dirs, reused count)"""
+    files = {}
+    dirs = {}
+    reused = 0
+    pending = [relative_dir]
+    while pending:
+        current = pending.pop()
+        listing, was_reused = _list_dir(kind, current, old_dirs)
+        if listing is None:
+            continue
+        dirs[f"{kind}:{current}"] = listing
+        reused += was_reused
+        for name, info in listing['files'].items():
+            files[f"{current}/{name}" if current else name] = info
+        pending.extend(f"{current}/{name}" if current else name for name in listing['subdirs'])
+    return files, dirs, reused
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(COPY_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ==================== SCAN ====================
+def scan(verify=False, workers=None):
+    """Compare the media folders with the database; returns a report dict"""
+    started = time.monotonic()
+    workers = workers or SCANNER_CONFIG['workers']
+    manifest = _load_manifest()
+    references = get_media_references()
+    if references is None:
+        raise RuntimeError('Could not read media references from the database')
+
+    disk = {}  # (kind, filename) -> [size, mtime_ns]
+    dirs = {}
+    reused = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Each top-level shard directory ("ab/") is walked on its own thread
+        futures = []
+        for kind in BLOB_FOLDERS:
+            root, was_reused = _list_dir(kind, '', manifest['dirs'])
+            if root is None:
+                continue
+            dirs[f"{kind}:"] = root
+            reused += was_reused
+            for name, info in root['files'].items():
+                disk[(kind, name)] = info
+            futures += [(kind, pool.submit(_walk, kind, name, manifest['dirs'])) for name in root['subdirs']]
+
+        for kind, future in futures:
+            files, walked_dirs, walked_reused = future.result()
+            disk.update(((kind, name), info) for name, info in files.items())
+            dirs.update(walked_dirs)
+            reused += walked_reused
+
+        # Content-addressed names can be checked against the bytes; only new or changed files are hashed
+        verified = {}
+        corrupt = []
+        if verify:
+            to_hash = []
+            for (kind, filename), (size, mtime_ns) in disk.items():
+                key = f"{kind}:{filename}"
+                if blob_sha256(filename) is None:
+                    continue
+                if manifest['verified'].get(key) == [size, mtime_ns]:
+                    verified[key] = [size, mtime_ns]
+                else:
+                    to_hash.append((kind, filename, size, mtime_ns))
+            digests = pool.map(lambda item: _sha256_file(os.path.join(BLOB_FOLDERS[item[0]], item[1])), to_hash)
+            for (kind, filename, size, mtime_ns), digest in zip(to_hash, digests):
+                if digest == blob_sha256(filename):
+                    verified[f"{kind}:{filename}"] = [size, mtime_ns]
+                else:
+                    corrupt.append({'kind': kind, 'filename': filename, 'size': size})
+        else:
+            verified = {key: value for key, value in manifest['verified'].items()
+                        if tuple(key.split(':', 1)) in disk}
+
+    referenced = {(ref['kind'], ref['filename']) for ref in references['rows']}
+    referenced.update(tuple(item) for item in references['trashed'])
+
+    missing = []
+    size_mismatches = []
+    for ref in references['rows']:
+        found = disk.get((ref['kind'], ref['filename']))
+        if found is None:
+            missing.append(ref)
+        elif ref['size'] is not None and ref['size'] != found[0]:
+            size_mismatches.append(dict(ref, actual=found[0]))
+
+    # Recent files may belong to an upload whose row is not committed yet
+    grace_ns = (time.time() - SCANNER_CONFIG['grace_seconds']) * 1e9
+    orphans = [{'kind': kind, 'filename': filename, 'size': size}
+               for (kind, filename), (size, mtime_ns) in sorted(disk.items())
+               if (kind, filename) not in referenced and mtime_ns < grace_ns]
+
+    _save_manifest({'dirs': dirs, 'verified': verified})
+
+    return {
+        'files': len(disk),
+        'bytes': sum(size for size, _ in disk.values()),
+        'dirs': len(dirs),
+        'dirs_reused': reused,
+        'orphans': orphans,
+        'orphan_bytes': sum(orphan['size'] for orphan in orphans),
+        'missing': missing,
+        'size_mismatches': size_mismatches,
+        'corrupt': corrupt,
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 1)
+    }
+
+
+def repair(report):
+    """Trash the orphans and fix the rows found by scan(); corrupt files are only reported"""
+    repaired = repair_media_rows(report['missing'], report['size_mismatches']) or {}
+    orphans = [(orphan['kind'], orphan['filename'], orphan['size']) for orphan in report['orphans']]
+    repaired['orphans_trashed'] = len(orphans) if orphans and trash_orphan_files(orphans) else 0
+    return repaired
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--verify', action='store_true', help='re-hash new or changed content-addressed files')
+    parser.add_argument('--repair', action='store_true', help='trash orphans and fix rows')
+    parser.add_argument('--workers', type=int, help='threads used for walking and hashing')
+    args = parser.parse_args()
+
+    report = scan(verify=args.verify, workers=args.workers)
+    if args.repair:
+        report['repaired'] = repair(report)
+    print(json.dumps(report, indent=2, default=str))
@@ -0,0 +1,69 @@
+"""Run the portal against a throwaway SQLite database in a temporary directory.
+
+The portal modules copy settings from config when they are imported, so
+config is pointed at the test directory here, before any test imports them.
+Relative paths in config (media folders, uploads, jobs, caches) then
+resolve inside that directory as well.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='ntvhs-tests-')
+
+sys.path.insert(0, REPO_ROOT)
+os.chdir(WORKDIR)
+
+import config  # noqa: E402
+
+config.DB_BACKEND = 'sqlite'
+config.SQLITE_CONFIG['path'] = os.path.join(WORKDIR, 'portal.sqlite3')
+config.SERVER_CONFIG['jinja_cache_dir'] = os.path.join(WORKDIR, '.cache', 'jinja')
+
+
+@pytest.fixture(scope='session', autouse=True)
+def database():
+    from database_functions import init_database
+    init_database()
+    yield
+    os.chdir(REPO_ROOT)
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture
+def app():
+    from main import create_app
+    return create_app({'TESTING': True})
+
+
+@pytest.fixture
+def query():
+    """Run one statement on a connection of its own and commit it; returns the rows it produced"""
+    from database_functions import get_db_connection
+
+    def run(sql, params=()):
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall() if cursor.description else []
+            connection.commit()
+            return rows
+        finally:
+            cursor.close()
+            connection.close()
+    return run
+
+
+@pytest.fixture
+def admin(app):
+    """Test client logged in as the admin"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+        session['username'] = config.ADMIN_USERNAME
+    return client
@@ -0,0 +1,62 @@
+import time
+from datetime import datetime, timedelta
+
+from database_functions import FEED_REFRESH_SECONDS, add_item_to_db, get_assignment_feed
+
+
+def _add(table_name, name, grade, days=None):
+    end_date = (datetime.now() + timedelta(days=days)).strftime('%Y-%m-%dT%H:%M') if days is not None else ''
+    assert add_item_to_db(table_name, {'name': name, 'grade': grade, 'end_date': end_date,
+                                       'upload_link': 'https://example.com/a', 'professor': ''})
+
+
+def _names(grade, **kwargs):
+    return [item.name for item in get_assignment_feed(grade=grade, **kwargs)[0]]
+
+
+def test_feed_lists_nearest_deadline_first_then_undated():
+    _add('quizzes', 'Quiz in three days', 'ALS 9', days=3)
+    _add('activities', 'Activity without deadline', 'ALS 9')
+    _add('worksheets', 'Worksheet tomorrow', 'ALS 9', days=1)
+    _add('quizzes', 'Quiz past due', 'ALS 9', days=-1)
+    _add('worksheets', 'Other grade', 'ALS 10', days=1)
+
+    assert _names('ALS 9') == ['Worksheet tomorrow', 'Quiz in three days', 'Activity without deadline']
+    assert _names('ALS 9', due_within=2) == ['Worksheet tomorrow']
+
+
+def test_feed_pages_follow_the_cursor():
+    for i, table_name in enumerate(('quizzes', 'activities', 'worksheets', 'quizzes', 'activities')):
+        _add(table_name, f"Dated {i}", 'ALS 12', days=i + 1)
+        _add(table_name, f"Undated {i}", 'ALS 12')
+    expected = _names('ALS 12')
+    assert len(expected) == 10
+
+    names, cursor = [], None
+    while True:
+        items, cursor = get_assignment_feed(grade='ALS 12', cursor=cursor, page_size=3)
+        names.extend(item.name for item in items)
+        if not cursor:
+            break
+    assert names == expected
+
+
+def test_past_due_assignment_leaves_the_cached_feed(app, query, monkeypatch):
+    end_date = (datetime.now() + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M')
+    assert add_item_to_db('worksheets', {'name': 'Due in a moment', 'grade': 'ALS 11', 'end_date': end_date,
+                                         'upload_link': 'https://example.com/w', 'professor': ''})
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now)
+    client = app.test_client()
+    assert b'Due in a moment' in client.get('/api/v1/assignments?grade=ALS 11&fields=name').data
+    assert b'Due in a moment' in client.get('/student/assignments?grade=ALS 11').data
+
+    # The deadline passes without a write through the portal, so no table version changes
+    past = datetime.now() - timedelta(minutes=1)
+    query("UPDATE worksheets SET end_date = %s WHERE name = %s", (past, 'Due in a moment'))
+    assert b'Due in a moment' in client.get('/student/assignments?grade=ALS 11').data
+
+    # Once the next refresh period starts, the feed is read again
+    monkeypatch.setattr(time, 'time', lambda: now + FEED_REFRESH_SECONDS)
+    assert b'Due in a moment' not in client.get('/api/v1/assignments?grade=ALS 11&fields=name').data
+    assert b'Due in a moment' not in client.get('/student/assignments?grade=ALS 11').data
@@ -0,0 +1,56 @@
+import io
+import os
+from datetime import datetime, timedelta
+
+import trash_reaper
+from blob_store import blob_path, save_stream
+from database_functions import add_video_to_db, delete_video_from_db, release_blob
+
+
+def _refcount(query, kind, filename):
+    rows = query("SELECT refcount FROM blobs WHERE kind = %s AND filename = %s", (kind, filename))
+    return rows[0][0] if rows else None
+
+
+def _add_video(query, data, title):
+    filename, size, _ = save_stream(io.BytesIO(data), 'videos', 'clip.mp4')
+    assert add_video_to_db({'title': title, 'description': '', 'grade': 'Grade 10',
+                            'filename': filename, 'file_size': size})
+    return filename, query("SELECT id FROM videos WHERE title = %s", (title,))[0][0]
+
+
+def test_reupload_during_purge_keeps_the_file(query, monkeypatch):
+    data = os.urandom(2048)
+    filename, video_id = _add_video(query, data, 'Purged then uploaded again')
+    assert delete_video_from_db(video_id)
+    query("UPDATE trash SET purge_after = %s", (datetime.now() - timedelta(minutes=1),))
+
+    claim_due_trash = trash_reaper.claim_due_trash
+
+    def claim_then_reupload(limit):
+        claimed = claim_due_trash(limit)
+        # The same content arrives after the reaper claimed the file, before it is unlinked
+        assert save_stream(io.BytesIO(data), 'videos', 'clip.mp4')[:2] == (filename, len(data))
+        return claimed
+
+    monkeypatch.setattr(trash_reaper, 'claim_due_trash', claim_then_reupload)
+    trash_reaper.purge_due()
+
+    assert os.path.exists(blob_path('videos', filename))
+    assert _refcount(query, 'videos', filename) == 1
+
+
+def test_release_keeps_a_file_another_upload_uses(query):
+    data = os.urandom(2048)
+    filename, _ = _add_video(query, data, 'Shared content')
+
+    # A second, identical upload whose row is never created
+    assert save_stream(io.BytesIO(data), 'videos', 'copy.mp4')[0] == filename
+    assert release_blob('videos', filename)
+    assert os.path.exists(blob_path('videos', filename))
+    assert _refcount(query, 'videos', filename) == 1
+
+    # The last reference takes the file with it
+    other = save_stream(io.BytesIO(os.urandom(2048)), 'videos', 'other.mp4')[0]
+    assert release_blob('videos', other)
+    assert not os.path.exists(blob_path('videos', other))
@@ -0,0 +1,102 @@
+import base64
+import hashlib
+import io
+import os
+
+import pytest
+
+import main
+from blob_store import blob_name, blob_path, save_stream
+from chunked_upload import UploadError, complete_upload, create_upload, upload_status, write_chunk
+from database_functions import get_items_page
+
+
+def _checksum(data):
+    return 'sha256 ' + base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+def test_chunks_can_arrive_in_any_order(tmp_path):
+    data = os.urandom(3000)
+    upload_id = create_upload('video', 'lesson.mp4', len(data))['upload_id']
+
+    assert write_chunk(upload_id, 2000, data[2000:], _checksum(data[2000:])) == 0
+    assert write_chunk(upload_id, 0, data[:1000], _checksum(data[:1000])) == 1000
+    status = upload_status(upload_id)
+    assert status['offset'] == 1000
+    assert status['missing'] == [[1000, 2000]]
+
+    assert write_chunk(upload_id, 1000, data[1000:2000], _checksum(data[1000:2000])) == len(data)
+    info, path = complete_upload(upload_id, str(tmp_path), 'lesson.mp4')
+    assert info['filename'] == 'lesson.mp4'
+    with open(path, 'rb') as f:
+        assert f.read() == data
+
+
+def test_corrupted_chunk_is_rejected():
+    upload_id = create_upload('book', 'notes.pdf', 100)['upload_id']
+    with pytest.raises(UploadError) as error:
+        write_chunk(upload_id, 0, b'x' * 100, _checksum(b'y' * 100))
+    assert error.value.status == 460
+    assert upload_status(upload_id)['missing'] == [[0, 100]]
+
+
+def test_incomplete_upload_cannot_be_completed(tmp_path):
+    upload_id = create_upload('video', 'lesson.mp4', 100)['upload_id']
+    write_chunk(upload_id, 0, b'x' * 50, _checksum(b'x' * 50))
+    with pytest.raises(UploadError) as error:
+        complete_upload(upload_id, str(tmp_path), 'lesson.mp4')
+    assert error.value.status == 409
+
+
+def _upload(admin, data, filename='lesson.mp4'):
+    upload = admin.post('/uploads', json={'kind': 'video', 'filename': filename, 'size': len(data)}).get_json()
+    response = admin.patch(f"/uploads/{upload['upload_id']}", data=data, headers={'Upload-Offset': '0'})
+    assert response.status_code == 204
+    return upload['upload_id']
+
+
+def _commit(admin, upload_id, title):
+    return admin.post(f"/uploads/{upload_id}/commit", data={'title': title, 'description': '', 'grade': 'Grade 9'})
+
+
+def _titles():
+    return [video.title for video in get_items_page('videos', grade='Grade 9')[0]]
+
+
+def test_failed_commit_keeps_the_upload(admin, monkeypatch):
+    upload_id = _upload(admin, os.urandom(4096))
+
+    monkeypatch.setattr(main, 'add_video_to_db', lambda video_data: False)
+    assert _commit(admin, upload_id, 'Retried upload').status_code == 500
+    monkeypatch.undo()
+
+    assert _commit(admin, upload_id, 'Retried upload').status_code == 200
+    assert 'Retried upload' in _titles()
+
+
+def test_repeated_commit_is_a_conflict(admin):
+    upload_id = _upload(admin, os.urandom(4096))
+    assert _commit(admin, upload_id, 'Committed once').status_code == 200
+
+    response = _commit(admin, upload_id, 'Committed once')
+    assert response.status_code == 409
+    assert _titles().count('Committed once') == 1
+    # The data went into the media store; later chunks must not reach it
+    assert admin.patch(f"/uploads/{upload_id}", data=b'x', headers={'Upload-Offset': '0'}).status_code == 409
+
+
+def test_chunks_after_a_failed_commit_leave_the_stored_file_alone(admin, monkeypatch):
+    data = os.urandom(4096)
+    upload_id = _upload(admin, data)
+
+    def identical_upload_meanwhile(video_data):
+        # Another request references the same content, so the stored file outlives this failed row
+        save_stream(io.BytesIO(data), 'videos', 'copy.mp4')
+        return False
+
+    monkeypatch.setattr(main, 'add_video_to_db', identical_upload_meanwhile)
+    assert _commit(admin, upload_id, 'Failed upload').status_code == 500
+
+    assert admin.patch(f"/uploads/{upload_id}", data=b'x' * 16, headers={'Upload-Offset': '0'}).status_code == 204
+    with open(blob_path('videos', blob_name(hashlib.sha256(data).hexdigest(), 'lesson.mp4')), 'rb') as f:
+        assert f.read() == data
@@ -0,0 +1,30 @@
+import json
+import os
+import subprocess
+import sys
+
+import db_metrics
+
+
+def _exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_snapshots_of_exited_workers_are_folded(tmp_path, monkeypatch):
+    monkeypatch.setitem(db_metrics.METRICS_CONFIG, 'shared_dir', str(tmp_path))
+    monkeypatch.setattr(db_metrics, '_snapshot', {'pid': None, 'path': None, 'flushed_at': 0.0})
+    series = {'portal_db_rows_total': {json.dumps(['retired_table', 'select']): [5]}}
+    for name in (f"{_exited_pid()}-0a1b2c3d.json", f"{_exited_pid()}-4e5f6a7b.json"):
+        (tmp_path / name).write_text(json.dumps(series))
+
+    expected = 'portal_db_rows_total{table="retired_table",operation="select"} 10'
+    assert expected in db_metrics.render_metrics()
+    assert sorted(os.listdir(tmp_path)) == sorted([db_metrics.RETIRED_SNAPSHOT,
+                                                   os.path.basename(db_metrics._snapshot_path())])
+
+    # A later worker that exits is added to the retired totals, not in place of them
+    (tmp_path / f"{_exited_pid()}-8c9d0e1f.json").write_text(json.dumps(series))
+    assert 'portal_db_rows_total{table="retired_table",operation="select"} 15' in db_metrics.render_metrics()
+    assert len(os.listdir(tmp_path)) == 2
@@ -0,0 +1,26 @@
+from config import JOB_QUEUE_CONFIG
+from job_queue import _claim_next, _connect, _finish, enqueue
+
+
+def test_failing_job_runs_max_attempts_times():
+    job_id = enqueue('process_book_assets', {'book_id': 1, 'pdf_filename': 'missing.pdf'})
+    connection = _connect()
+    try:
+        runs = 0
+        while True:
+            # Skip the backoff delay
+            connection.execute("UPDATE jobs SET run_after = 0 WHERE id = ?", (job_id,))
+            job = _claim_next(connection, 'test:1')
+            if job is None:
+                break
+            assert job['id'] == job_id
+            runs += 1
+            assert job['attempts'] == runs
+            _finish(connection, job, error='RuntimeError: always fails')
+
+        status, attempts = connection.execute("SELECT status, attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        connection.close()
+
+    assert runs == JOB_QUEUE_CONFIG['max_attempts']
+    assert (status, attempts) == ('failed', runs)
@@ -0,0 +1,14 @@
+import listing_cache
+
+
+def test_revalidation_after_a_miss_is_not_modified(app):
+    client = app.test_client()
+    response = client.get('/api/v1/quizzes')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    # The entry is gone (evicted, or cached by another worker) but nothing changed
+    listing_cache.get_backend().clear()
+    response = client.get('/api/v1/quizzes', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
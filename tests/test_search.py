@@ -0,0 +1,14 @@
+from config import MAX_PAGE_SIZE
+from database_functions import add_video_to_db, search_videos_by_title
+
+
+def test_title_search_returns_every_match():
+    total = MAX_PAGE_SIZE + 20
+    for i in range(total):
+        assert add_video_to_db({'title': f"Photosynthesis part {i}", 'description': 'Plant cells',
+                                'grade': 'Grade 7', 'filename': f"photosynthesis-{i}.mp4", 'file_size': 10})
+
+    videos = search_videos_by_title('photosynthesis')
+    assert len(videos) == total
+    assert len({video.id for video in videos}) == total
+    assert len(search_videos_by_title('photosynthesis', grade='Grade 8')) == 0
@@ -0,0 +1,84 @@
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode
+
+import pytest
+
+from conftest import REPO_ROOT
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason='server.py forks its workers')
+
+BOOTSTRAP = """
+import os, sys
+sys.path.insert(0, {root!r})
+os.chdir({workdir!r})
+import config
+config.DB_BACKEND = 'sqlite'
+config.SQLITE_CONFIG['path'] = 'portal.sqlite3'
+config.SERVER_CONFIG['jinja_cache_dir'] = '.cache/jinja'
+import server
+server.serve(host='127.0.0.1', port={port}, workers=2)
+"""
+
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def _request(port, method, path, body=None, headers=None):
+    # A new connection per request, so requests are spread over the workers
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, response.getheader('Set-Cookie'), response.read()
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def server_port(tmp_path):
+    port = _free_port()
+    code = BOOTSTRAP.format(root=REPO_ROOT, workdir=str(tmp_path), port=port)
+    process = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if _request(port, 'GET', '/')[0] == 200:
+                    break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+        yield port
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+
+
+def test_write_in_one_worker_invalidates_the_others(server_port):
+    def quiz_names():
+        return [_request(server_port, 'GET', '/api/v1/quizzes?fields=name')[2] for _ in range(30)]
+
+    # Every worker caches the (empty) listing
+    assert all(b'New quiz' not in body for body in quiz_names())
+
+    form = {'username': 'admin', 'password': 'admin'}
+    status, cookie, _ = _request(server_port, 'POST', '/login', urlencode(form),
+                                 {'Content-Type': 'application/x-www-form-urlencoded'})
+    assert status == 302
+    quiz = {'name': 'New quiz', 'grade': 'Grade 7', 'end_date': '', 'upload_link': 'https://example.com/q',
+            'professor': ''}
+    status, _, _ = _request(server_port, 'POST', '/add_quiz', urlencode(quiz),
+                            {'Content-Type': 'application/x-www-form-urlencoded',
+                             'Cookie': cookie.split(';')[0]})
+    assert status == 302
+
+    assert all(b'New quiz' in body for body in quiz_names())
@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from database_functions import (add_item_to_db, add_library_book_to_db, add_video_to_db, get_content_counts,
+                                get_item_by_id, search_items)
+from sqlite_backend import translate
+
+
+def test_mysql_statements_are_translated():
+    (sql,), writes = translate("SELECT id FROM trash WHERE purge_after <= NOW() + INTERVAL %s DAY FOR UPDATE")
+    assert writes
+    assert 'FOR UPDATE' not in sql and '%s' not in sql
+    assert "? || ' days'" in sql
+
+    (sql,), writes = translate("INSERT INTO content_counts (table_name, grade, item_count) VALUES (%s, %s, 1) "
+                               "ON DUPLICATE KEY UPDATE item_count = item_count + VALUES(item_count)")
+    assert writes
+    assert 'ON CONFLICT DO UPDATE SET item_count = item_count + excluded.item_count' in sql
+
+
+def test_new_book_id_survives_the_counter_upsert(query):
+    ids = [add_library_book_to_db({'title': title, 'description': '', 'grade': 'Grade 6',
+                                   'pdf_filename': f"{title}.pdf", 'file_size': 1})
+           for title in ('First reader', 'Second reader')]
+    assert query("SELECT title FROM library WHERE id = %s", (ids[1],)) == [('Second reader',)]
+    assert get_content_counts(grade='Grade 6')['books'] == 2
+
+
+def test_title_matches_rank_first():
+    for title, description in (('Landforms', 'Volcano formation and erosion'), ('Volcano', 'How eruptions work')):
+        assert add_video_to_db({'title': title, 'description': description, 'grade': 'Grade 6',
+                                'filename': f"{title}.mp4", 'file_size': 1})
+    items, _ = search_items('videos', 'volcano', grade='Grade 6')
+    assert [item.title for item in items] == ['Volcano', 'Landforms']
+
+
+def test_date_like_text_is_stored_unchanged(query):
+    title = "2024-05-01 10:00"
+    description = "2024-05-01T10:00"
+    assert add_video_to_db({'title': title, 'description': description, 'grade': 'Grade 12',
+                            'filename': 'legacy.mp4', 'file_size': 1})
+    assert query("SELECT description FROM videos WHERE title = %s", (title,)) == [(description,)]
+
+
+def test_form_end_date_is_stored_as_a_datetime(query):
+    assert add_item_to_db('quizzes', {'name': 'Dated quiz', 'grade': 'Grade 12', 'end_date': '2030-05-01T14:30',
+                                      'upload_link': 'https://example.com/q', 'professor': ''})
+    [(quiz_id, end_date)] = query("SELECT id, end_date FROM quizzes WHERE name = %s", ('Dated quiz',))
+    assert end_date == datetime(2030, 5, 1, 14, 30)
+    assert get_item_by_id('quizzes', quiz_id)['end_date'] == '2030-05-01T14:30'
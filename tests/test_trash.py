@@ -0,0 +1,61 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import trash_reaper
+from blob_store import blob_path, save_stream
+from database_functions import add_video_to_db, delete_video_from_db
+
+
+class _RecordingLimiter:
+    """Stands in for RateLimiter: records the bytes charged instead of sleeping"""
+
+    def __init__(self):
+        self.spent = []
+
+    def spend(self, nbytes):
+        self.spent.append(nbytes)
+
+
+def test_big_files_are_shrunk_in_steps_before_unlink(tmp_path, monkeypatch):
+    monkeypatch.setitem(trash_reaper.TRASH_CONFIG, 'truncate_step', 1024)
+    path = tmp_path / 'lesson.mp4'
+    path.write_bytes(os.urandom(3 * 1024 + 100))
+    limiter = _RecordingLimiter()
+
+    assert trash_reaper._unlink_gradually(str(path), limiter) == 3 * 1024 + 100
+    assert not path.exists()
+    assert limiter.spent == [1024, 1024, 1024, 100]
+
+
+def test_missing_file_frees_nothing(tmp_path):
+    assert trash_reaper._unlink_gradually(str(tmp_path / 'gone.mp4'), _RecordingLimiter()) == 0
+
+
+def test_rate_limiter_sleeps_off_a_burst(monkeypatch):
+    slept = []
+    monkeypatch.setattr(trash_reaper.time, 'sleep', slept.append)
+
+    trash_reaper.RateLimiter(1000).spend(500)
+    assert len(slept) == 1 and 0.4 < slept[0] <= 0.5
+
+    trash_reaper.RateLimiter(0).spend(10 ** 9)
+    assert len(slept) == 1
+
+
+def test_concurrent_deletes_release_shared_file_once(query):
+    data = os.urandom(2048)
+    for title in ('Shared clip A', 'Shared clip B'):
+        filename, size, _ = save_stream(io.BytesIO(data), 'videos', 'shared.mp4')
+        assert add_video_to_db({'title': title, 'description': '', 'grade': 'Grade 11',
+                                'filename': filename, 'file_size': size})
+    video_id = query("SELECT id FROM videos WHERE title = %s", ('Shared clip A',))[0][0]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: delete_video_from_db(video_id), range(4)))
+
+    assert results.count(True) == 1
+    assert len(query("SELECT id FROM trash WHERE table_name = 'videos' AND item_id = %s", (video_id,))) == 1
+    # Clip B still uses the file
+    assert query("SELECT refcount FROM blobs WHERE kind = 'videos' AND filename = %s", (filename,))[0][0] == 1
+    assert os.path.exists(blob_path('videos', filename))